@@ -5,7 +5,10 @@ Code wroten to download Sentinel-1 scenes via geographical search using the
 Alaska Satellite Facility module.
     Inputs: Excel sheet with point samples (geographic coordinates) and
     searching parameters;
-    Output: Selected Sentinel-1 scenes.
+    Output: Selected Sentinel-1 scenes (downloaded concurrently, resuming
+    interrupted transfers and checking each file, see granule_download.py):
+    the granules covering each sampling point within some days of its
+    sampling date (see granule_matching.py).
 
 WARNING 1:
     The first part of this script only deal with Excel files containing
@@ -18,7 +21,7 @@ WARNING 2:
     download won't work properly, because "download" is not a list property.
     
 Created on Wed Jul 13, 2022
-Last updated on: Wed Aug 17, 2022
+Last updated on: Sun Oct 18, 2026
 
 This code is part of the Erli's Ph.D. thesis
 
@@ -40,6 +43,12 @@ import asf_search as asf
 # For dealing with geospatial data (including geo data frames)
 import geopandas as gpd
 from shapely.geometry import MultiPoint, shape
+# Concurrent and resumable downloads, with MD5 checks:
+from granule_download import download_granules, granule_downloads
+# Local catalog of the granules found (searches not sent again):
+from granule_catalog import GranuleCatalog
+# Granules covering each sampling point close to its sampling date:
+from granule_matching import match_granules, sample_points
 
 #%% USING PANDAS TO IMPORT THE DATASET CONTAINING SAMPLING POINTS:
 
@@ -77,20 +86,57 @@ aoi = aoi.convex_hull
 
 #%% SEARCHING SENTINEL-1 IMAGES WHICH INTERSECTS THE AOI POLYGON
 
-# Setting searching options:
+# Days between the sampling date of a point and the acquisition of the
+# granules matched to it (+/-):
+match_days = 6
+
+# Setting searching options (the sampling dates, plus the matching days):
 opts = {
     'platform': asf.PLATFORM.SENTINEL1,
-    'start': '2017-11-01T00:00:00Z',
-    'end': '2017-12-01T23:59:59Z',
+    'start': (myPandasDF['DATA'].min() - pd.Timedelta(days = match_days)
+              ).strftime('%Y-%m-%dT00:00:00Z'), #'2017-11-01T00:00:00Z',
+    'end': (myPandasDF['DATA'].max() + pd.Timedelta(days = match_days)
+            ).strftime('%Y-%m-%dT23:59:59Z'), #'2017-12-01T23:59:59Z',
     'relativeOrbit': 126, #24,#
     'processingLevel':  'GRD_HD' #'SLC' 
 }
 
-# Doing the geographical search:
-results = asf.geo_search(intersectsWith = str(aoi[0]), **opts)
+# Local catalog of the granules (an SQLite file, see granule_catalog.py): ASF
+# is only searched for the dates not searched yet with the same options (and
+# AOI), and the results are queried from the catalog, offline:
+catalog = GranuleCatalog(r'J:/path_to/your-granule-catalog/granules.sqlite')
+
+search_options = {key: value for key, value in opts.items()
+                  if key not in ('start', 'end')}
+
+# Doing the geographical search (the new dates only):
+catalog.sync(asf.geo_search, opts['start'], opts['end'],
+             intersectsWith = str(aoi[0]), **search_options)
+
+results = catalog.query(aoi = str(aoi[0]), start = opts['start'],
+                        end = opts['end'],
+                        relative_orbit = opts['relativeOrbit'],
+                        processing_level = opts['processingLevel'])
+
+# Former search, sent to ASF each time:
+#results = asf.geo_search(intersectsWith = str(aoi[0]), **opts)
 
 print(f'{len(results)} results found')
 
+#%% MATCHING THE SAMPLING POINTS TO THE GRANULES FOUND
+
+# The granules over the convex hull mostly cover no point at its sampling
+# date: each point is matched to the granules whose footprint contains it,
+# acquired within "match_days" of its sampling date, and only a small set of
+# granules covering all the points is kept:
+matched, matches = match_granules(sample_points(myPandasDF), results,
+                                  days = match_days)
+
+# Granule matched to each point (None if no granule covers it in time):
+myPandasDF['granule'] = [None if granule is None
+                         else granule.properties['sceneName']
+                         for granule in matches]
+
 #%% VISUALIZING BOTH A SELECTED IMAGE FOOTPRINT AND THE SEARCH POLYGON
 
 # Set a index for selecting a item in the results object:
@@ -129,18 +175,30 @@ else:
 # Directory to save the image:
 outpath = r'J:/path_to/your-GRD_Level_1-images'
 
-results[results_index].download(path = str(outpath), session = user_pass_session)
+download_granules(granule_downloads([results[results_index]]), str(outpath),
+                  session = user_pass_session)
 
 listdir(outpath)
 
 #%% USE THIS CHUNK TO DOWNLOAD MULTIPLE PRODUCTS
 
-# WARNING: If you are using a Python 3.6 environment, it is probable that this
-# chunk won't work properly, because "download" is not a list property.
+# The granules are downloaded by up to "transfers" concurrent transfers (more
+# are opened only while they raise the download rate). An interrupted
+# download is resumed from its '.part' file the next time this chunk is run,
+# the files already complete are skipped, and each file is checked against
+# the MD5 checksum of its search result. "max_rate" (bytes/s, None for no
+# limit) leaves some bandwidth to other users of the link:
 
 # Directory to save the image:
 outpath = r'J:/path_to/your-GRD_Level_1-images'
 
-results[4:8].download(path = str(outpath), session = user_pass_session)
+# The granules matched to the sampling points (or a slice of the results,
+# e.g. results[4:8]):
+reports = download_granules(granule_downloads(matched), str(outpath),
+                            session = user_pass_session, transfers = 4,
+                            max_rate = None)
+
+# Former sequential download (no resuming nor checking):
+#results[4:8].download(path = str(outpath), session = user_pass_session)
 
 listdir(outpath)
@@ -4,7 +4,7 @@
 Code wroten to read and view Sentinel-1 products.
 
 Created on Mon Jul 18, 2022
-Last updated on: Wed Aug 17, 2022
+Last updated on: Sun Oct 18, 2026
 
 This code is part of the Erli's Ph.D. thesis
 
@@ -23,6 +23,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 # snappy module to import and export SNAP file formats:
 from snappy import ProductIO
+# Band statistics cached next to each product (for vmin and vmax):
+from band_statistics import band_nodata, get_band_stats
 
 #%% READING MULTIPLE PRODUCTS ('.zip') WITH GLOB LOOPING
 
@@ -43,17 +45,34 @@ print(files)
 
 product = ProductIO.readProduct(str(files[0]))
 
+# Preprocessed products in BEAM-DIMAP format ('.dim') can also be read without
+# snappy (bands memory-mapped with NumPy, same getBand/readPixels methods):
+#from dimap_io import open_product
+#product = open_product(r'J:/path_to/your-GRD_Level_2-processed-image.dim')
+
 # Getting band names:
 print(list(product.getBandNames()))
 
 #%% DEFINING FUNCTION TO PLOT BAND
 
-# Function to visualize bands from products:
-def plotBand(product, band, vmin, vmax):
+# Function to visualize bands from products. If vmin or vmax are not given,
+# the 2nd and 98th percentiles of the band are used, no-data pixels (e.g. the
+# terrain-correction border) left out (from the statistics cache next to the
+# product, computed at the first time only; products without a file, e.g.
+# GPF results, are not cached):
+def plotBand(product, band, vmin = None, vmax = None):
+    band_name = band
     band = product.getBand(band)
     w = band.getRasterWidth()
     h = band.getRasterHeight()
     print(w, h)
+    if vmin is None or vmax is None:
+        location = product.getFileLocation()
+        stats = get_band_stats(band, w, h,
+                               None if location is None else str(location),
+                               band_name, nodata = band_nodata(band))
+        vmin = stats['percentiles']['2'] if vmin is None else vmin
+        vmax = stats['percentiles']['98'] if vmax is None else vmax
     band_data = np.zeros(w * h, np.float32)
     band.readPixels(0, 0, w, h, band_data)
     band_data.shape = h, w
@@ -66,3 +85,6 @@ def plotBand(product, band, vmin, vmax):
 #%% VISUALIZING BAND:
     
 plotBand(product, 'Amplitude_VH', 0, 150)
+
+# Or let the band percentiles set the display range:
+#plotBand(product, 'Amplitude_VH')
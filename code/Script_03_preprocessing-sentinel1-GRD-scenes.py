@@ -6,8 +6,20 @@ Code wroten to perform pre-processing of Sentinel-1 scenes. The goal is to do:
     Calibrate products > perform Speckle Noise Filtering > Radiometric
     Terrain Flattening > and to Terrain Correction (with an optional resampling).
 
+The time, CPU, I/O and memory of each stage of each scene are written to a
+trace in the output directory ("stage-trace.jsonl", see stage_telemetry.py),
+and summarized at the end. SNAP computes the whole chain as the product is
+written, so the 'write' stage holds most of the processing time.
+
+In pipeline mode (--pipeline), the chain goes on in memory: the scene is
+cropped to the AOI (Script 04) and the SAR vegetation indices are computed
+(Script 05), and only the final product (Sigma0 and index bands) is written
+(see sar_vi_pipeline.py). Intermediate products are written only with
+--debug-intermediates. With --native-speckle, the speckle is filtered there
+with NumPy (see speckle_filters.py) instead of SNAP's operator.
+
 Created on Mon Jul 18, 2022
-Last updated on: Tue Apr 11, 2023
+Last updated on: Sun Oct 18, 2026
 
 This code is part of the Erli's Ph.D. thesis
 
@@ -26,12 +38,24 @@ import time
 import os, gc
 # To deal with date formats
 import datetime
+# For reading the command line options (pipeline mode):
+import argparse
 # snappy module to create products:
 from snappy import GPF
 # snappy module to feed functions with parameters:
 from snappy import HashMap
 # snappy module to import and export SNAP file formats:
 from snappy import ProductIO
+# Stage telemetry (time, CPU, I/O and memory of each processing stage):
+from stage_telemetry import StageTrace
+# Tiled block engine defaults (tile size and threads of the pipeline mode):
+from sar_vi_engine import THREADS, TILE_HEIGHT, TILE_WIDTH
+# Preprocessing, cropping and indices chained in memory (pipeline mode):
+from sar_vi_pipeline import write_and_read, write_final_product
+# Area of Interest of the pipeline mode:
+from aoi_windows import read_aoi
+# Local catalog of the granules (to pick the scenes to process):
+from granule_catalog import GranuleCatalog
 
 #%% READING MULTIPLE PRODUCTS ('.zip') WITH GLOB LOOPING
 
@@ -47,6 +71,21 @@ files = glob.glob(inpath + '**/*.zip')
 
 files = list(filter(lambda k: product_type in k, files))
 
+# The granule catalog of Script 01 (see granule_catalog.py) can pick the
+# scenes to process among the files found: those of the query below (AOI as
+# WKT, GeoJSON or shapefile; dates; relative orbit; ...), answered offline.
+# Set the catalog path to use it:
+catalog_path = None
+
+catalog_query = dict(aoi = None, start = '2017-11-01T00:00:00Z',
+                     end = '2017-12-01T23:59:59Z', relative_orbit = 126,
+                     processing_level = 'GRD_HD')
+
+if catalog_path is not None:
+    catalog = GranuleCatalog(catalog_path)
+    files = catalog.select_files(files, **catalog_query)
+    catalog.close()
+
 # Printing all found files:
 print(files)
 
@@ -81,13 +120,14 @@ def do_grd_border_noise_removal(source):
     output = GPF.createProduct('Remove-GRD-Border-Noise', parameters, source)
     return output
 
-def do_calibration(source, polarization, pols):
+def do_calibration(source, polarization, pols, sigma = False):
     print('\tCalibration...')
     parameters = HashMap()
     # I'm changing the output to beta naught, the original code generates an
-    # output in sigma as follows:
-    parameters.put('outputSigmaBand', 'false')
-    parameters.put('outputBetaBand', 'true')
+    # output in sigma as follows (sigma = True, as the SAR vegetation indices
+    # of the pipeline mode need Sigma0 bands):
+    parameters.put('outputSigmaBand', 'true' if sigma else 'false')
+    parameters.put('outputBetaBand', 'false' if sigma else 'true')
     parameters.put('outputGammaBand', 'false')
     if polarization == 'DH':
         parameters.put('sourceBands', 'Intensity_HH,Intensity_HV')
@@ -154,9 +194,19 @@ def do_terrain_correction(source, proj, downsample):
 # String to add to product name once the processing is finished:
 processing_steps = '_Orb_NR_Brd_Cal_Spk_TC'
 
-# Setting main function:
-
-def main(_outpath_):
+# Setting main function. With pipeline = True, the terrain-corrected scene is
+# not written: it is cropped to the AOI, if any, and the SAR vegetation
+# indices are computed from it in memory, to write only the final product
+# ("<name>_Orb_NR_Brd_Cal_Spk_TC[_sub].dim", as Script 05 writes when
+# merging). With debug = True, the intermediate products are written too (and
+# read back, as in the former flow), the terrain-corrected one in the
+# "intermediates" directory. With native_speckle ('Lee Sigma' or 'Refined
+# Lee'), SNAP's speckle filtering is skipped and the terrain-corrected Sigma0
+# bands are filtered with NumPy as the indices read them:
+
+def main(_outpath_, pipeline = False, aoi = None, debug = False,
+         vv_max_param = 3, tile_height = TILE_HEIGHT, tile_width = TILE_WIDTH,
+         threads = THREADS, native_speckle = None):
     
     # If the output directory does not exist, make it:
     if not os.path.exists(_outpath_):
@@ -165,10 +215,19 @@ def main(_outpath_):
     ## UTM projection parameters (above defined):
     proj = projection
     
+    # AOI of the pipeline mode, read once:
+    if aoi is not None:
+        aoi = read_aoi(aoi)
+    
+    # Trace of the stages of each scene:
+    trace = StageTrace(os.path.join(_outpath_, 'stage-trace.jsonl'),
+                       'Script_03')
+    
     for i in files:
         gc.enable()
         gc.collect()
-        sentinel_1 = ProductIO.readProduct(str(i))
+        with trace.stage(i, 'read'):
+            sentinel_1 = ProductIO.readProduct(str(i))
         product_name = sentinel_1.getName()
         print(sentinel_1)
 
@@ -194,52 +253,118 @@ def main(_outpath_):
             print("Polarization error!")
 
         ## Start preprocessing:
-        applyorbit = do_apply_orbit_file(sentinel_1)
-        thermaremoved = do_thermal_noise_removal(applyorbit)
+        with trace.stage(i, 'orbit'):
+            applyorbit = do_apply_orbit_file(sentinel_1)
+        with trace.stage(i, 'thermal noise removal'):
+            thermaremoved = do_thermal_noise_removal(applyorbit)
         
         del applyorbit
         gc.collect()
         
-        borderRemoved = do_grd_border_noise_removal(thermaremoved)
+        with trace.stage(i, 'border noise removal'):
+            borderRemoved = do_grd_border_noise_removal(thermaremoved)
         
         del thermaremoved
         gc.collect()
         
-        calibrated = do_calibration(borderRemoved, polarization, pols)
+        with trace.stage(i, 'calibration'):
+            calibrated = do_calibration(borderRemoved, polarization, pols,
+                                        sigma = pipeline)
         
         del borderRemoved
         gc.collect()
         
-        down_filtered = do_speckle_filtering(calibrated)
+        if pipeline and native_speckle:
+            down_filtered = calibrated
+        else:
+            with trace.stage(i, 'speckle filtering'):
+                down_filtered = do_speckle_filtering(calibrated)
         
         del calibrated
         gc.collect()
         
-        #terrain_flattened = do_radiometric_terrain_flattening(down_filtered)
+        #with trace.stage(i, 'terrain flattening'):
+        #    terrain_flattened = do_radiometric_terrain_flattening(down_filtered)
         
         #del down_filtered
         #gc.collect()
         
-        tercorrected = do_terrain_correction(down_filtered, proj, 0)
+        with trace.stage(i, 'terrain correction'):
+            tercorrected = do_terrain_correction(down_filtered, proj, 0)
         
         #del terrain_flattened
         #gc.collect()
         
-        print("Writing...")
-        ProductIO.writeProduct(tercorrected, _outpath_ + '\\' + product_name + processing_steps,
-                               'BEAM-DIMAP')
+        if pipeline:
+            output_name = product_name + processing_steps
+            if debug:
+                print("Writing the terrain-corrected product (debug)...")
+                debug_path = _outpath_ + '\\intermediates'
+                if not os.path.exists(debug_path):
+                    os.makedirs(debug_path)
+                with trace.stage(i, 'write (debug)',
+                                 tercorrected.getSceneRasterWidth() *
+                                 tercorrected.getSceneRasterHeight()):
+                    tercorrected = write_and_read(
+                        tercorrected, debug_path + '\\' + output_name)
+            if aoi is not None:
+                output_name += '_sub'
+            write_final_product(tercorrected, _outpath_ + '\\' + output_name,
+                                vv_max_param = vv_max_param, aoi = aoi,
+                                tile_height = tile_height,
+                                tile_width = tile_width, threads = threads,
+                                debug = debug, trace = trace, scene = i,
+                                speckle_filter = native_speckle)
+            tercorrected.dispose()
+        else:
+            print("Writing...")
+            with trace.stage(i, 'write', tercorrected.getSceneRasterWidth() *
+                             tercorrected.getSceneRasterHeight()):
+                ProductIO.writeProduct(tercorrected, _outpath_ + '\\' + product_name + processing_steps,
+                                       'BEAM-DIMAP')
         
         print('Done.')
         sentinel_1.dispose()
         sentinel_1.closeIO()
         
         print("--- %s seconds ---" % (time.time() - start_time))
+    
+    trace.print_summary()
 
 #%% DOING PREPROCESSING
 
 # Define your output directory (where the preprocessed scenes shall be saved):
 outpath = r'C:\Users\erlis\OneDrive\Área de Trabalho\S1-GRD-Level_2-Algodao'
 
+# Pipeline mode, from the command line: python Script_03_...py --pipeline
+# --aoi path_to/MyAOIshapefile.shp (the AOI as in Script 05: WKT, GeoJSON, or
+# a file of them or a shapefile; without it, the whole scene), --native-speckle
+# "Lee Sigma" to filter the speckle with NumPy, and --debug-intermediates to
+# write the intermediate products too:
 if __name__== "__main__":
-    main(outpath)
+    
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pipeline', action = 'store_true',
+                        help = "crop and compute the SAR vegetation indices "
+                               "in memory, writing only the final product")
+    parser.add_argument('--aoi', default = None,
+                        help = "AOI (WKT, GeoJSON, or a file of them or a "
+                               "shapefile) to crop the scenes to")
+    parser.add_argument('--debug-intermediates', action = 'store_true',
+                        help = "write the intermediate products too")
+    parser.add_argument('--native-speckle', default = None,
+                        choices = ('Lee Sigma', 'Refined Lee'),
+                        help = "filter the speckle with NumPy in the "
+                               "pipeline, instead of SNAP's operator")
+    parser.add_argument('--threads', type = int, default = THREADS)
+    parser.add_argument('--tile-height', type = int, default = TILE_HEIGHT)
+    options = parser.parse_known_args()[0]
+    if options.native_speckle and not options.pipeline:
+        parser.error("--native-speckle needs --pipeline: without it, the "
+                     "speckle is filtered by SNAP's operator")
+    
+    main(outpath, pipeline = options.pipeline, aoi = options.aoi,
+         debug = options.debug_intermediates, threads = options.threads,
+         tile_height = options.tile_height,
+         native_speckle = options.native_speckle)
 
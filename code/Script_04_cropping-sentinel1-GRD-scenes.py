@@ -5,10 +5,13 @@ Code wroten to perform cropping of Sentinel-1 scenes.
     Inputs: Sentinel-1 GRD preprocessed scenes in BEAM-DIMAP format; shapefile
     with Area of Interest (with datum: WGS84 and not projected (decimal degree
     coordinate system));
-    Outputs: Sentinel-1 GRD preprocessed cropped scenes.
+    Outputs: Sentinel-1 GRD preprocessed cropped scenes (one per polygon of
+    the shapefile and scene, see "crop_all_aois"), written as copies or as
+    virtual subsets (see "virtual_subsets"), and the trace of the stages of
+    each scene ("stage-trace.jsonl", see stage_telemetry.py).
 
 Created on Thu Aug 09, 2022
-Last updated on: Tue Apr 11, 2022
+Last updated on: Sun Oct 18, 2026
 
 This code is part of the Erli Pinto dos Santos' Ph.D. thesis
 
@@ -37,6 +40,15 @@ import snappy
 # snappy module to import/export SNAP file formats, and to set
 # WKT (Well-Known-Text) Area of Interest (AOI):
 from snappy import ProductIO, WKTReader
+# Stage telemetry (time, CPU, I/O and memory of each processing stage):
+from stage_telemetry import StageTrace
+# All the AOIs of a shapefile, cropped in a single read pass per scene:
+from aoi_windows import grid_key, read_aois
+from aoi_batch import BatchCropper
+# Cache of the AOI pixel windows and masks of each grid (kept between runs):
+from window_cache import WindowCache
+# BEAM-DIMAP products read with NumPy (cropping without snappy):
+from dimap_io import open_product
 
 #%% READING MULTIPLE PRODUCTS ('.dim') WITH GLOB LOOPING
 
@@ -63,6 +75,18 @@ print(files)
 # Directory where the aoi shapefile is located:
 shapefile_path =r'J:\path_to\your-vectorial-data'
 
+# Cropping every polygon of the shapefile (True), each one to its own product,
+# or only the first one with SNAP's SubsetOp (False):
+crop_all_aois = False
+
+# Attribute of the shapefile identifying the polygons in the names of the
+# cropped products (None: their position in the shapefile):
+id_field = None
+
+# All the polygons of the shapefile (AOI id and polygons):
+aois = read_aois(shapefile_path + '\\MyAOIshapefile.shp', id_field)
+print(len(aois), "AOI(s) in the shapefile.")
+
 # Importing aoi shapefile as a geopandas object:
 aoi = gpd.read_file(shapefile_path + '\\MyAOIshapefile.shp')
 # Casting the aoi from geopandas to a gpd.Series object:
@@ -72,25 +96,86 @@ aoi = aoi[0]
 
 #%% SUBSETTING SCENES WITH LOOPING
 
+# If the cropped scenes are only needed to compute the SAR vegetation indices,
+# this step can be skipped: Script 05 reads the AOI window of each scene
+# directly (the same WKT, given with --aoi), without writing cropped products.
+
 # Directory to save the cropped products:
 outpath = r'J:/path_to/your-GRD_Level_2-processed-and-subset-images'
 
 if not os.path.exists(outpath):
     os.makedirs(outpath)
 
+# Trace of the stages of each scene (the subset is computed as it is written):
+trace = StageTrace(os.path.join(outpath, 'stage-trace.jsonl'), 'Script_04')
+
+# Backend reading the scenes when cropping all the AOIs: 'snappy' (ProductIO)
+# or 'numpy' ("dimap_io.py", BEAM-DIMAP only, without the Java Virtual
+# Machine):
+backend = 'snappy'
+
+# Lines of the strips read from each scene (all the AOI windows crossing a
+# strip are written from it):
+tile_height = 512
+
+# Directory of the cache of the AOI pixel windows: the scenes terrain
+# corrected to the same grid (the UTM projection of Script 03) put the
+# polygons on it only once, even across runs. The least recently used
+# windows are deleted beyond 4096 windows or 512 MB:
+window_cache = WindowCache(os.path.join(outpath, 'aoi-window-cache'))
+
+# Writing virtual subsets (True) instead of cropped copies (False), when all
+# the AOIs are cropped: a small '.vdim' file per AOI and scene, pointing to
+# the AOI window of the scene (see "dimap_io.py"). Nothing is read nor copied,
+# and Script 05 reads them as windows of the scenes (memory-mapped with
+# --backend numpy), but SNAP itself (and Script 06) cannot open them, and the
+# scenes must be kept:
+virtual_subsets = False
+
+# Cropping all the AOIs, reading each scene once (their pixel windows are
+# computed for the first scene of each grid only):
+cropper = BatchCropper(aois, tile_height = tile_height, trace = trace,
+                       cache = window_cache)
+
+for i in files if crop_all_aois else []:
+
+    gc.collect()
+
+    print("Reading...")
+
+    with trace.stage(i, 'read'):
+        if backend == 'numpy':
+            sentinel_1 = open_product(str(i))
+        else:
+            sentinel_1 = ProductIO.readProduct(str(i))
+    print("Product:", sentinel_1.getName())
+
+    start_time = time.time()
+
+    outputs = cropper.crop(sentinel_1, outpath, scene = i,
+                           virtual = virtual_subsets)
+    print("Done:", len(outputs), "cropped product(s).")
+
+    sentinel_1.dispose()
+    del sentinel_1
+
+    print("--- %s seconds ---" % (time.time() - start_time))
+
 # Getting the subset operator:
 SubsetOp = snappy.jpy.get_type('org.esa.snap.core.gpf.common.SubsetOp')
+Rectangle = snappy.jpy.get_type('java.awt.Rectangle')
 geom = WKTReader().read(aoi)
 
-# Applying subset operator:
-for i in files:
+# Applying subset operator (first AOI only):
+for i in files if not crop_all_aois else []:
     
     gc.enable()
     gc.collect()
     
     print("Reading...")
     
-    sentinel_1 = ProductIO.readProduct(str(i))
+    with trace.stage(i, 'read'):
+        sentinel_1 = ProductIO.readProduct(str(i))
     product_name = sentinel_1.getName()
     print("Product:", product_name)
 
@@ -98,17 +183,31 @@ for i in files:
     print('Start time:', loopstarttime)
     start_time = time.time()
 
-    ## Start subsetting:
-    op = SubsetOp()
-    op.setSourceProduct(sentinel_1)
-    op.setGeoRegion(geom)
-    op.setCopyMetadata(True)
-    
-    sub_product = op.getTargetProduct()
+    ## Start subsetting (the pixel region of the AOI comes from the window
+    ## cache when a scene of the same grid was already cropped; SNAP's
+    ## geographic region is only used for scenes without a map geocoding):
+    with trace.stage(i, 'subset'):
+        op = SubsetOp()
+        op.setSourceProduct(sentinel_1)
+        window, _ = window_cache.window(sentinel_1, aois[0][1])
+        if window is None:
+            print("AOI out of the scene, nothing to write.")
+            sentinel_1.dispose()
+            continue
+        if grid_key(sentinel_1) is None:
+            op.setGeoRegion(geom)
+        else:
+            op.setRegion(Rectangle(*window))
+        op.setCopyMetadata(True)
+        
+        sub_product = op.getTargetProduct()
 
     print("Writing...")
-    ProductIO.writeProduct(sub_product, outpath + '\\' + product_name + "_sub",
-                           "BEAM-DIMAP")
+    with trace.stage(i, 'write', sub_product.getSceneRasterWidth() *
+                     sub_product.getSceneRasterHeight()):
+        ProductIO.writeProduct(sub_product,
+                               outpath + '\\' + product_name + "_sub",
+                               "BEAM-DIMAP")
     print("Done.")    
     
     sentinel_1.dispose()
@@ -121,10 +220,13 @@ for i in files:
     gc.collect()
     
     print("--- %s seconds ---" % (time.time() - start_time))
+
+trace.print_summary()
     
 #%% REMOVING JUNKERIE
 
 # As the crop and export were already applied, the following command will
-# delete the original files (the preprocessed scenes). Please uncomment
+# delete the original files (the preprocessed scenes). Never do it with
+# virtual subsets: they read the pixels of these scenes. Please uncomment
 # the following line:
 #shutil.rmtree(inpath)
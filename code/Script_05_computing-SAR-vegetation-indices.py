@@ -3,7 +3,7 @@
 Code written to compute SAR Vegetation Indices using Sentinel-1 GRD post-
 processed products.
 Created on Thu Jul 21, 2022
-Last updated on: Tue Apr 11, 2023
+Last updated on: Sun Oct 18, 2026
 This code is part of the Erli's Ph.D. thesis
 Author: Erli Pinto dos Santos
 Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
@@ -18,18 +18,54 @@ import gc
 import shutil
 # For listing files within a directory matching name patterns:
 import glob
+# For reading the command line options (number of jobs):
+import argparse
+# To known processing time, and the dates of the scenes:
+import time
+import datetime
 # Fast arrays computation:
 import numpy as np
-# snappy module to create products:
-from snappy import GPF
-# snappy module to feed functions with parameters:
-from snappy import HashMap
-# snappy module to get product metadata:
-from snappy import Product
-# snappy module to import and export SNAP file formats:
-from snappy import ProductIO
-# snappy module to get product metadata:
-from snappy import ProductData, ProductUtils
+# snappy modules, not needed by the 'numpy' backend (which reads and writes
+# BEAM-DIMAP products with "dimap_io.py", without the Java Virtual Machine):
+try:
+    # snappy module to create products:
+    from snappy import GPF
+    # snappy module to feed functions with parameters:
+    from snappy import HashMap
+    # snappy module to get product metadata:
+    from snappy import Product
+    # snappy module to import and export SNAP file formats:
+    from snappy import ProductIO
+    # snappy module to get product metadata:
+    from snappy import ProductData, ProductUtils
+except ImportError:
+    GPF = HashMap = Product = ProductIO = ProductData = ProductUtils = None
+# Tiled block engine (reads and writes many lines at once):
+from sar_vi_engine import (FILL_VALUE, THREADS, TILE_HEIGHT, TILE_WIDTH,
+                           iter_tiles, process_tiles, tile_height_for_memory)
+# Index of the tiles with data (no-data tiles are not computed):
+from tile_validity import get_validity_index
+# Band statistics computed tile by tile and cached next to each product:
+from band_statistics import get_vv_max
+# Index formulas and their planner (shared sub-expressions computed once):
+from sar_vi_formulas import (INDEX_BANDS, index_bands, make_kernel,
+                             required_parameters, scratch_count)
+# Batch of scenes, optionally spread among worker processes:
+from batch_processing import WORKER_MEMORY_MB, run_scenes
+# BEAM-DIMAP products memory-mapped with NumPy (the 'numpy' backend):
+from dimap_io import (DimapProduct, create_product, is_virtual_subset,
+                      open_product, read_virtual_subset)
+# Manifest of the indices computed for each scene (skips up-to-date ones):
+from run_manifest import RunManifest
+# Area of Interest windows (indices computed within the AOI only):
+from aoi_windows import aoi_hash, aoi_window, crop_product, read_aoi
+# Stage telemetry (time, CPU, I/O and memory of each processing stage):
+from stage_telemetry import StageTrace, trace_stage
+# Time-series stacks of the indices (memory-mapped cubes and aggregates):
+from index_stack import (CHUNK, PERCENTILES, CubeBand, IndexCube,
+                         aggregate_names, temporal_aggregates)
+# Seasonal statistics updated scene by scene (Welford accumulator state):
+from temporal_accumulator import TemporalAccumulator
 
 #%% SETTING WORK DIRECTORY AND READING FILES
 
@@ -41,8 +77,9 @@ inpath = r'C:\Users\erlis\OneDrive\Área de Trabalho\S1-GRD-Level_2-Algodao'
 product_type = 'GRD'
 
 # Using glob to read files with '.tif' extension. If data are in '.dim',
-# chanche it:
-files = glob.glob(inpath + '**/*.dim')
+# chanche it. Virtual subsets written by Script 04 ('.vdim', windows of the
+# preprocessed scenes) are read too:
+files = glob.glob(inpath + '**/*.dim') + glob.glob(inpath + '**/*.vdim')
 
 # Reading and storing found files:
 files = list(filter(lambda k: product_type in k, files))
@@ -51,407 +88,556 @@ print(files)
 
 #%% DEFINING FUNCTIONS
 
-# Function to compute the CR (Cross-Ratio, Frison et al. (2018)) index,
-# using Sigma0 (in dB). If the data is calibrated to Sigma0, change the band name.
-def do_cr(source, outpath_):
+# Function to read a product with the given backend: 'snappy' (ProductIO, any
+# SNAP format) or 'numpy' ("dimap_io.py", BEAM-DIMAP only, no JVM). A virtual
+# subset ('.vdim', see "dimap_io.py") is read as the window of its parent
+# product, so only the window pixels are read:
+def read_product(path, backend = 'snappy'):
+    if backend == 'numpy':
+        return open_product(str(path))
+    if is_virtual_subset(path):
+        subset = read_virtual_subset(path)
+        return crop_product(ProductIO.readProduct(subset['parent']),
+                            subset['window'], subset['name'])
+    return ProductIO.readProduct(str(path))
+
+# Function to get the file of a product read from disk (None for products
+# built in memory):
+def product_file(product):
+    location = product.getFileLocation()
+    return None if location is None else str(location)
+
+# Function to compute a list of indices (names in INDEX_BANDS, from the
+# "sar_vi_formulas.py" module) in a single pass over the scene, and to write
+# them as bands of a product stored at "outpath\<source name><suffix>.dim".
+# Sigma0 data are/must be in linear power units (dB is computed when needed).
+# A source read by "dimap_io" (the 'numpy' backend) is written by it too and,
+# with append = True, the index bands are added to the source product itself
+# (new '.img' files in its '.data' directory; Sigma0 bands are not rewritten).
+# With skip_nodata = True, pixels where VV or VH have no data (NaN or the
+# Sigma0 no-data value) are not computed and written as NaN, the index no-data
+# value. Given an AOI (see "read_aoi" in "aoi_windows.py"), only the window of
+# the scene covering it is read and computed, and written as
+# "<source name>_sub<suffix>.dim" (the name of the product Script 04 would
+# crop); with mask_aoi = True, pixels outside the AOI polygons are not
+# computed either (NaN). It returns the path of the product holding the index
+# bands (None if the AOI is out of the scene):
+def do_indices(source, outpath_, indices, suffix, vv_max_param = "null",
+               tile_height = TILE_HEIGHT, tile_width = TILE_WIDTH,
+               threads = THREADS, append = False, skip_nodata = True,
+               aoi = None, mask_aoi = False):
     
     outpath = str(outpath_)
 
     if not os.path.exists(outpath):
         os.makedirs(outpath)
-        
-    VH = source.getBand('Sigma0_VH')
-    VV = source.getBand('Sigma0_VV')
     
-    w = source.getSceneRasterWidth()
-    h = source.getSceneRasterHeight()
+    region = None
+    if aoi is not None:
+        if append:
+            raise ValueError("Indices of an AOI window cannot be appended to "
+                             "the scene product")
+        window, region = aoi_window(source, aoi)
+        if window is None:
+            print("AOI out of the scene, nothing to compute.")
+            return None
+        print("AOI window: %d x %d pixels at x = %d, y = %d"
+              % (window[2], window[3], window[0], window[1]))
+        source = crop_product(source, window)
+        if not mask_aoi:
+            region = None
     
-    cr_product = Product('CR', 'CR', w, h)
-    cr_band = cr_product.addBand("CR", ProductData.TYPE_FLOAT32)
-    writer = ProductIO.getProductWriter('BEAM-DIMAP')
-
-    ProductUtils.copyGeoCoding(source, cr_product)
-
-    cr_product.setProductWriter(writer)
-    cr_product.writeHeader(outpath + '\\' + str(source.getName()) + '_CR.dim')
-
-    VH_i = np.zeros(w, dtype = np.float32)
-    VV_i = np.zeros(w, dtype = np.float32)
-
-    print("Writing CR band...")
-
-    for y in range(h):
-        #print("Processing line ", y, " of ", h)
-        VH_i = VH.readPixels(0, y, w, 1, VH_i)
-        VV_i = VV.readPixels(0, y, w, 1, VV_i)
-        
-        cr = np.divide(np.multiply(10, np.log10(VV_i)),
-                       np.multiply(10, np.log10(VH_i)))
-        
-        cr_band.writePixels(0, y, w, 1, cr)
-
-    cr_product.closeIO()
-
-    print("Done.")
-
-# Function to compute the DpRVIc (Dual-polarization Radar Vegetation Index,
-# Bhogapurapu et al.(2022)) (data are/must be in linear power units):
-def do_dprvic(source, outpath_):
-    
-    outpath = str(outpath_)
-
-    if not os.path.exists(outpath):
-        os.makedirs(outpath)
-        
     VH = source.getBand('Sigma0_VH')
     VV = source.getBand('Sigma0_VV')
     
     w = source.getSceneRasterWidth()
     h = source.getSceneRasterHeight()
-
-    dprvic_product = Product('DPRVIC', 'DPRVIC', w, h)
-    dprvic_band = dprvic_product.addBand("DPRVIC", ProductData.TYPE_FLOAT32)
-    writer = ProductIO.getProductWriter('BEAM-DIMAP')
-
-    ProductUtils.copyGeoCoding(source, dprvic_product)
-
-    dprvic_product.setProductWriter(writer)
-    dprvic_product.writeHeader(outpath + '\\' + str(source.getName()) + '_DPRVIC.dim')
-
-    VH_i = np.zeros(w, dtype = np.float32)
-    VV_i = np.zeros(w, dtype = np.float32)
-    
-    print("Writing DPRVIC band...")
     
-    for y in range(h):
-        #print("Processing line ", y, " of ", h)
-        VH_i = VH.readPixels(0, y, w, 1, VH_i)
-        VV_i = VV.readPixels(0, y, w, 1, VV_i)
-        q = np.divide(VH_i,VV_i)
-        q[q>=1]=1
-        dprvic = np.divide(
-            np.multiply(q,q+3),
-            np.multiply(q+1,q+1))
-        
-        dprvic_band.writePixels(0, y, w, 1, dprvic)
-
-    dprvic_product.closeIO()
+    band_names = index_bands(indices)
+    
+    parameters = {}
+    if 'VV_max' in required_parameters(band_names):
+        parameters['VV_max'] = get_vv_max(VV, w, h, vv_max_param,
+                                          product_file(source))
+    
+    kernel = make_kernel(band_names, ('VH', 'VV'), parameters)
+    
+    validity = None
+    if skip_nodata or region is not None:
+        nodata = VV.getNoDataValue() \
+            if skip_nodata and VV.isNoDataValueUsed() else None
+        validity = get_validity_index((VH, VV), w, h, product_file(source),
+                                      nodata = nodata, region = region)
+        summary = validity.summary(list(iter_tiles(w, h, tile_height,
+                                                   tile_width)))
+        print("Tiles: %d empty (not read), %d partial, %d full; "
+              "%.1f %% of the pixels skipped (no data or out of the AOI)."
+              % (summary['empty'], summary['partial'], summary['full'],
+                 100 * summary['skipped_fraction']))
+
+    vis_path = outpath + '\\' + str(source.getName()) + suffix + '.dim'
+    
+    if isinstance(source, DimapProduct) and append:
+        vis_product = source
+        vis_bands = [source.add_band(band_name, overwrite = True,
+                                     no_data_value = FILL_VALUE)
+                     for band_name in band_names]
+    elif isinstance(source, DimapProduct):
+        # 'numpy' backend: bands memory-mapped in the new product's '.data':
+        vis_product = create_product(vis_path, source)
+        vis_bands = [vis_product.add_band(band_name,
+                                          no_data_value = FILL_VALUE)
+                     for band_name in band_names]
+    else:
+        product_name = suffix.strip('_')
+        vis_product = Product(product_name, product_name, w, h)
+        vis_bands = [vis_product.addBand(band_name, ProductData.TYPE_FLOAT32)
+                     for band_name in band_names]
+        for band in vis_bands:
+            band.setNoDataValue(FILL_VALUE)
+            band.setNoDataValueUsed(True)
+        writer = ProductIO.getProductWriter('BEAM-DIMAP')
+
+        ProductUtils.copyGeoCoding(source, vis_product)
+
+        vis_product.setProductWriter(writer)
+        vis_product.writeHeader(vis_path)
+
+    print("Writing %s band(s)..." % (', '.join(band_names)))
+
+    process_tiles((VH, VV), vis_bands, kernel, w, h, tile_height, tile_width,
+                  threads, validity)
+
+    if vis_product is source:
+        source.save()
+        vis_path = product_file(source)
+    elif isinstance(vis_product, DimapProduct):
+        vis_product.save()
+        vis_product.dispose()
+    else:
+        vis_product.closeIO()
     
-    # del VV_max
     gc.collect()
-    
-    print("Done.")
-
-
-# Function to compute the dual-pol descriptors (co-pol purity (m_c), pseudo entropy (H_c), pseudo scattering-type (Theta_c)
-# Bhogapurapu et al.(2021)) (data are/must be in linear power units):
-def do_desc(source, outpath_):
-    
-    outpath = str(outpath_)
-
-    if not os.path.exists(outpath):
-        os.makedirs(outpath)
-        
-    VH = source.getBand('Sigma0_VH')
-    VV = source.getBand('Sigma0_VV')
-    
-    w = source.getSceneRasterWidth()
-    h = source.getSceneRasterHeight()
-
-    desc_product = Product('DPRVIC', 'DPRVIC', w, h)
-    mc_band = desc_product.addBand("m_c", ProductData.TYPE_FLOAT32)
-    hc_band = desc_product.addBand("H_c", ProductData.TYPE_FLOAT32)
-    tc_band = desc_product.addBand("Theta_c", ProductData.TYPE_FLOAT32)
 
-
-    writer = ProductIO.getProductWriter('BEAM-DIMAP')
-
-    ProductUtils.copyGeoCoding(source, desc_product)
-
-    desc_product.setProductWriter(writer)
-    desc_product.writeHeader(outpath + '\\' + str(source.getName()) + '_desc.dim')
-
-    VH_i = np.zeros(w, dtype = np.float32)
-    VV_i = np.zeros(w, dtype = np.float32)
+    print("Done.")
     
-    print("Writing descriptors...")
+    return vis_path
+
+# Function to compute a single index, written as its own product
+# ("<source name>_<index>.dim"):
+def do_index(source, outpath_, index, vv_max_param = "null",
+             tile_height = TILE_HEIGHT, tile_width = TILE_WIDTH,
+             threads = THREADS, append = False, skip_nodata = True,
+             aoi = None, mask_aoi = False):
+    return do_indices(source, outpath_, (index,), '_' + index, vv_max_param,
+                      tile_height, tile_width, threads, append, skip_nodata,
+                      aoi, mask_aoi)
+
+# Indices computed by default (the same ones applied by "do_sar_vi"):
+FUSED_INDICES = ('CR', 'DPRVIC', 'DPSVI', 'DPSVIm', 'Pol', 'RVIm')
+
+# Function to compute any subset of the indices in INDEX_BANDS in a single
+# pass: VV and VH are read once per tile, and every selected index is written
+# as a band of one product ("<product name>_VIs.dim"):
+def do_fused(source, outpath_, indices = FUSED_INDICES, vv_max_param = "null",
+             tile_height = TILE_HEIGHT, tile_width = TILE_WIDTH,
+             threads = THREADS, append = False, skip_nodata = True,
+             aoi = None, mask_aoi = False):
+    return do_indices(source, outpath_, indices, '_VIs', vv_max_param,
+                      tile_height, tile_width, threads, append, skip_nodata,
+                      aoi, mask_aoi)
+
+# Functions to compute each index as its own product, as formerly done:
+
+# CR (Cross-Ratio, Frison et al. (2018)), using Sigma0 in dB:
+def do_cr(source, outpath_, **tiles):
+    do_index(source, outpath_, 'CR', **tiles)
+
+# DpRVIc (Dual-polarization Radar Vegetation Index, Bhogapurapu et al. (2022)):
+def do_dprvic(source, outpath_, **tiles):
+    do_index(source, outpath_, 'DPRVIC', **tiles)
+
+# Dual-pol descriptors: co-pol purity (m_c), pseudo entropy (H_c) and pseudo
+# scattering-type (Theta_c) (Bhogapurapu et al. (2021)):
+def do_desc(source, outpath_, **tiles):
+    do_index(source, outpath_, 'desc', **tiles)
+
+# DPSVI (Dual-polarization SAR Vegetation Index, Periasamy (2018)):
+def do_dpsvi(source, outpath_, vv_max_param = "null", **tiles):
+    do_index(source, outpath_, 'DPSVI', vv_max_param, **tiles)
+
+# DPSVIm (modified Dual-polarization SAR Vegetation Index, dos Santos et al.
+# (2021)):
+def do_dpsvim(source, outpath_, **tiles):
+    do_index(source, outpath_, 'DPSVIm', **tiles)
+
+# Pol (normalized polarization, Hird et al. (2017)), using Sigma0 in dB:
+def do_pol(source, outpath_, **tiles):
+    do_index(source, outpath_, 'Pol', **tiles)
+
+# RVIm (modified Radar Vegetation Index, Nasirzadehdizaji et al. (2019)),
+# using Sigma0 in dB:
+def do_rvim(source, outpath_, **tiles):
+    do_index(source, outpath_, 'RVIm', **tiles)
+
+# The following function reads a scene and applies the previous functions
+# (those ones that computes SAR indices) to it. With fused = True, the
+# selected indices are computed in a single pass by "do_fused" (one "_VIs.dim"
+# product per scene). See "get_vv_max" (band_statistics.py) for the DPSVI
+# vv_max_param options (e.g. "p99" for the VV 99th percentile). The tile
+# size (lines and columns read at once) can be reduced if memory is short, or
+# capped by the memory (MB) given to each worker. With threads > 1, the tiles of the scene are
+# computed by that many threads. See "read_product" for the backend options;
+# with the 'numpy' backend and append = True, the indices are added to the
+# scene product itself (no merging needed afterwards).
+# Indices already computed from the same Sigma0 rasters, with the same
+# formulas and parameters, are skipped (see "run_manifest.py"), unless
+# force = True. A fused product is written as a whole, so all its indices are
+# computed again when one of them is outdated (unless appended to the scene).
+# Given an AOI, indices are computed within its window only (see
+# "do_indices"). Given a stage trace ("stage_telemetry.py"), the reading and
+# each index (or the fused indices) are recorded as stages of the scene. The
+# computed indices are returned:
+def do_sar_vi_scene(path, outpath, fused = False, indices = FUSED_INDICES,
+                    vv_max_param = 3, tile_height = TILE_HEIGHT,
+                    tile_width = TILE_WIDTH, threads = THREADS,
+                    worker_memory_mb = None, backend = 'snappy',
+                    append = False, force = False, skip_nodata = True,
+                    aoi = None, mask_aoi = False, trace = None):
+    
+    # The AOI is a parameter of every output:
+    if aoi is not None:
+        aoi = read_aoi(aoi)
+    options = recipe_options(aoi, mask_aoi)
+    
+    manifest = RunManifest(outpath, path)
+    requested = list(indices)
+    todo = requested if force else manifest.stale(requested, vv_max_param,
+                                                  options)
+    
+    if not todo:
+        print("Up to date: %s" % os.path.basename(str(path)))
+        return []
+    if fused and not append:
+        todo = requested
     
-    for y in range(h):
-        #print("Processing line ", y, " of ", h)
-        VH_i = VH.readPixels(0, y, w, 1, VH_i)
-        VV_i = VV.readPixels(0, y, w, 1, VV_i)
-        q = np.divide(VH_i,VV_i)
-        q[q>=1]=1
-        mc = np.divide((1-q),(1+q))
-        p1 = np.divide(1,(1+q))
-        p2 = np.divide(q,(1+q))
-        Hc = -1*(np.multiply(p1,np.log2(p1))+np.multiply(p2,np.log2(p2)))
-        thetac = np.arctan(((1-q)**2)/(1-q+q**2)) * (180/np.pi)
-
-        
-        mc_band.writePixels(0, y, w, 1, mc)
-        tc_band.writePixels(0, y, w, 1, Hc)
-        hc_band.writePixels(0, y, w, 1, thetac)
-
-    desc_product.closeIO()
-    
-    # del VV_max
+    gc.collect()
+    print("Reading...")
+    
+    with trace_stage(trace, path, 'read'):
+        product = read_product(path, backend)
+    
+    w = product.getSceneRasterWidth()
+    h = product.getSceneRasterHeight()
+
+    name = product.getName()
+    description = product.getDescription()
+    band_names = product.getBandNames()
+    
+    # Pixels computed by each index (unknown before the AOI window is):
+    pixels = w * h if aoi is None else None
+
+    print("Product:     %s, %s" % (name, description))
+    print("Raster size: %d x %d pixels" % (w, h))
+    print("Start time:  " + str(product.getStartTime()))
+    print("End time:    " + str(product.getEndTime()))
+    print("Bands:       %s" % (list(band_names)))
+    
+    if worker_memory_mb is not None:
+        # VV, VH and the index bands are held per tile in flight, and the
+        # scratch buffers of the formulas per thread:
+        bands = index_bands(todo)
+        n_arrays = (2 + len(bands)) * (2 * threads if threads > 1 else 1)
+        n_arrays += threads * scratch_count(bands)
+        tile_height = min(tile_height or h,
+                          tile_height_for_memory(tile_width or w, n_arrays,
+                                                 worker_memory_mb))
+    
+    tiles = dict(tile_height = tile_height, tile_width = tile_width,
+                 threads = threads, append = append,
+                 skip_nodata = skip_nodata, aoi = aoi, mask_aoi = mask_aoi)
+    
+    # Each output is recorded in the manifest once written (nothing is
+    # written for an AOI out of the scene):
+    if fused:
+        start_time = time.time()
+        with trace_stage(trace, path, 'fused', pixels, indices = todo):
+            vis_path = do_fused(product, outpath, todo, vv_max_param,
+                                **tiles)
+        for index in todo if vis_path else ():
+            manifest.record(index, vis_path, vv_max_param,
+                            time.time() - start_time, options)
+    else:
+        # Each index as its own product (e.g. 'desc' added to the default
+        # FUSED_INDICES):
+        for index in todo:
+            start_time = time.time()
+            with trace_stage(trace, path, index, pixels):
+                vis_path = do_index(product, outpath, index, vv_max_param,
+                                    **tiles)
+            if vis_path:
+                manifest.record(index, vis_path, vv_max_param,
+                                time.time() - start_time, options)
+            gc.collect()
+    
+    product.dispose()
     gc.collect()
     
-    print("Done.")
+    return todo
+
+# Function to get the recipe options of the outputs computed within an AOI
+# (recorded with each index in the run manifest), None for whole scenes:
+def recipe_options(aoi = None, mask_aoi = False):
+    if aoi is None:
+        return None
+    return {'aoi': aoi_hash(read_aoi(aoi)), 'mask_aoi': bool(mask_aoi)}
 
-# Function to compute the DPSVI (Dual-polarization SAR Vegetation Index,
-# Periasamy (2018)) (data are/must be in linear power units):
+# The following function applies "do_sar_vi_scene" over all files, define an
+# output folder to store the computed data. Remember in changing the outpath
+# variable:
     
-def do_dpsvi(source, outpath_, vv_max_param = "null"):
+################# REMMEMBER IN CHECKING THE OUTPUT DIRECTORY #################
+# If the output directory does not exist, os will create it. With jobs > 1,
+# scenes are spread among worker processes (as many as fit in the memory
+# budget, in MB); a failed scene does not stop the others. The scene reports
+# are returned:
+def do_sar_vi(_outpath_, fused = False, indices = FUSED_INDICES,
+              vv_max_param = 3, tile_height = TILE_HEIGHT,
+              tile_width = TILE_WIDTH, threads = THREADS, jobs = 1,
+              memory_budget_mb = None, worker_memory_mb = WORKER_MEMORY_MB,
+              backend = 'snappy', append = False, force = False,
+              skip_nodata = True, aoi = None, mask_aoi = False, trace = None):
     
-    outpath = str(outpath_)
-
+    outpath = _outpath_
     if not os.path.exists(outpath):
         os.makedirs(outpath)
     
-    VH = source.getBand('Sigma0_VH')
-    VV = source.getBand('Sigma0_VV')
-    
-    w = source.getSceneRasterWidth()
-    h = source.getSceneRasterHeight()
-
-    dpsvi_product = Product('DPSVI', 'DPSVI', w, h)
-    dpsvi_band = dpsvi_product.addBand("DPSVI", ProductData.TYPE_FLOAT32)
-    writer = ProductIO.getProductWriter('BEAM-DIMAP')
-
-    ProductUtils.copyGeoCoding(source, dpsvi_product)
-
-    dpsvi_product.setProductWriter(writer)
-    dpsvi_product.writeHeader(outpath + '\\' + str(source.getName()) + '_DPSVI.dim')
-
-    VH_i = np.zeros(w, dtype = np.float32)
-    VV_i = np.zeros(w, dtype = np.float32)
+    options = dict(fused = fused, indices = indices,
+                   vv_max_param = vv_max_param, tile_height = tile_height,
+                   tile_width = tile_width, threads = threads,
+                   worker_memory_mb = worker_memory_mb if jobs > 1 else None,
+                   backend = backend, append = append, force = force,
+                   skip_nodata = skip_nodata,
+                   aoi = None if aoi is None else read_aoi(aoi),
+                   mask_aoi = mask_aoi, trace = trace)
+    
+    return run_scenes(do_sar_vi_scene, files, (outpath,), options, jobs,
+                      memory_budget_mb, worker_memory_mb)
+
+# Function to get the start time of a product (as written by SNAP, e.g.
+# "18-OCT-2026 09:01:02.123456"):
+def start_time(product):
+    return datetime.datetime.strptime(str(product.getStartTime()).strip(),
+                                      '%d-%b-%Y %H:%M:%S.%f')
+
+# The following function stacks the indices of co-registered scenes (on the
+# same grid, e.g. Script 03 products terrain corrected to the same pixel
+# spacing and cropped by Script 04 to the same AOI): each index band is
+# written into a (time, y, x) cube, memory-mapped and chunked
+# ("<band>.cube.npy" in stack_path, see "index_stack.py"), the scenes in time
+# order. The indices of a scene are computed tile by tile as by "do_indices"
+# (its own VV max for DPSVI), straight into the cubes. Then the temporal
+# aggregates of each pixel (mean, median, percentiles and count of valid
+# observations) are computed chunk by chunk, and written as bands of
+# "temporal-statistics.dim" in stack_path. Neither the stack nor a whole
+# scene is held in memory. The paths of the cubes are returned:
+def do_sar_vi_stack(files, stack_path, indices = FUSED_INDICES,
+                    vv_max_param = 3, tile_height = TILE_HEIGHT,
+                    tile_width = TILE_WIDTH, threads = THREADS,
+                    backend = 'snappy', skip_nodata = True, chunk = CHUNK,
+                    percentiles = PERCENTILES, trace = None):
+    
+    outpath = str(stack_path)
+    if not os.path.exists(outpath):
+        os.makedirs(outpath)
     
-    # Getting non-NaN max value from VV band:
-    VV_get = np.zeros((w, h), dtype = np.float32)
-    VV_get = VV.readPixels(0, 0, w-1, h-1, VV_get)
-    VV_max = np.nanmax(VV_get)
-    print("Max non-NaN in VV band: ", VV_max, "...")
+    # Dates and grid of the scenes, read from their '.dim' headers only:
+    scenes = []
+    for path in files:
+        header = open_product(str(path))
+        scenes.append((start_time(header), str(path),
+                       (header.getSceneRasterWidth(),
+                        header.getSceneRasterHeight()),
+                       header.image_to_model()))
+        header.dispose()
+    scenes.sort(key = lambda scene: scene[0])
+    
+    if not scenes:
+        print("No scenes to stack.")
+        return []
+    
+    w, h = scenes[0][2]
+    transform = scenes[0][3]
+    for date, path, size, scene_transform in scenes:
+        if size != (w, h) or (transform is not None and not
+                              np.allclose(scene_transform, transform)):
+            raise ValueError("%s is not on the grid of %s (a stack needs "
+                             "co-registered scenes)"
+                             % (path, scenes[0][1]))
+    
+    band_names = index_bands(indices)
+    dates = [scene[0].isoformat() for scene in scenes]
+    names = [os.path.basename(scene[1]) for scene in scenes]
+    
+    print("Stacking %d scenes of %d x %d pixels: %s"
+          % (len(scenes), w, h, ', '.join(band_names)))
+    
+    cubes = [IndexCube.create(os.path.join(outpath, band_name + '.cube.npy'),
+                              band_name, dates, w, h, chunk, names)
+             for band_name in band_names]
+    
+    for t, (date, path, size, scene_transform) in enumerate(scenes):
+        
+        print("Date %d of %d: %s" % (t + 1, len(scenes), names[t]))
+        
+        with trace_stage(trace, path, 'read'):
+            product = read_product(path, backend)
+        
+        VH = product.getBand('Sigma0_VH')
+        VV = product.getBand('Sigma0_VV')
+        
+        parameters = {}
+        if 'VV_max' in required_parameters(band_names):
+            parameters['VV_max'] = get_vv_max(VV, w, h, vv_max_param,
+                                              product_file(product))
+        
+        kernel = make_kernel(band_names, ('VH', 'VV'), parameters)
+        
+        validity = None
+        if skip_nodata:
+            nodata = VV.getNoDataValue() if VV.isNoDataValueUsed() else None
+            validity = get_validity_index((VH, VV), w, h,
+                                          product_file(product),
+                                          nodata = nodata)
+        
+        with trace_stage(trace, path, 'stack', w * h,
+                         indices = list(indices)):
+            process_tiles((VH, VV), [CubeBand(cube, t) for cube in cubes],
+                          kernel, w, h, tile_height, tile_width, threads,
+                          validity)
+        
+        product.dispose()
+        gc.collect()
     
-    if (type(vv_max_param) == int) or (type(vv_max_param) == float):
-        VV_max = float(vv_max_param)
-        print("But the code is using VV max by analyst = ", VV_max)
-    else:
-        print("and the code is employing it.")
-        return float(VV_max)
+    for cube in cubes:
+        cube.flush()
     
-    del VV_get
-    gc.collect()
+    # Temporal aggregates, on the grid of the first scene:
+    print("Computing the temporal aggregates...")
     
-    print("Writing DPSVI band...")
+    template = open_product(scenes[0][1])
+    statistics = create_product(os.path.join(outpath,
+                                             'temporal-statistics.dim'),
+                                template)
+    template.dispose()
     
-    for y in range(h):
-        #print("Processing line ", y, " of ", h)
-        VH_i = VH.readPixels(0, y, w, 1, VH_i)
-        VV_i = VV.readPixels(0, y, w, 1, VV_i)
-        
-        dpsvi = np.multiply(
-            np.multiply(
-                # IDPDD:
-                np.divide(np.add(np.subtract(VV_max, VV_i), VH_i), np.sqrt(2)),
-                # VDDPI
-                np.divide(np.add(VV_i, VH_i), VV_i)),
-                # VH band
-                VH_i)
-        
-        dpsvi_band.writePixels(0, y, w, 1, dpsvi)
-
-    dpsvi_product.closeIO()
+    for cube in cubes:
+        targets = [statistics.add_band(band_name, no_data_value = FILL_VALUE)
+                   for band_name in aggregate_names(cube.band, percentiles)]
+        with trace_stage(trace, outpath, 'temporal aggregates',
+                         w * h * len(scenes), band = cube.band):
+            temporal_aggregates(cube, targets, percentiles)
     
-    del VV_max
+    statistics.save()
+    statistics.dispose()
     gc.collect()
     
     print("Done.")
-
-# Function to compute the DPSVIm (modified Dual-polarization SAR Vegetation
-# Index, dos Santos et al. (2021)) (data are/must be in linear power units):
-def do_dpsvim(source, outpath_):
-    
-    outpath = str(outpath_)
-
-    if not os.path.exists(outpath):
-        os.makedirs(outpath)
-        
-    VH = source.getBand('Sigma0_VH')
-    VV = source.getBand('Sigma0_VV')
     
-    w = source.getSceneRasterWidth()
-    h = source.getSceneRasterHeight()
-
-    dpsvim_product = Product('DPSVIm', 'DPSVIm', w, h)
-    dpsvim_band = dpsvim_product.addBand("DPSVIm", ProductData.TYPE_FLOAT32)
-    writer = ProductIO.getProductWriter('BEAM-DIMAP')
-
-    ProductUtils.copyGeoCoding(source, dpsvim_product)
-
-    dpsvim_product.setProductWriter(writer)
-    dpsvim_product.writeHeader(outpath + '\\' + str(source.getName()) + '_DPSVIm.dim')
-
-    VH_i = np.zeros(w, dtype = np.float32)
-    VV_i = np.zeros(w, dtype = np.float32)
+    return [cube.path for cube in cubes]
 
-    print("Writing DPSVIm band...")
+# Indices of the seasonal statistics (see "do_accumulate"):
+ACCUMULATED_INDICES = ('DPSVIm', 'DPRVIC')
 
-    for y in range(h):
-        #print("Processing line ", y, " of ", h)
-        VH_i = VH.readPixels(0, y, w, 1, VH_i)
-        VV_i = VV.readPixels(0, y, w, 1, VV_i)
-        
-        dpsvim = np.divide(np.add(np.square(VV_i),
-                                  np.multiply(VV_i, VH_i)),
-                           np.sqrt(2))
-        
-        dpsvim_band.writePixels(0, y, w, 1, dpsvim)
-
-    dpsvim_product.closeIO()
-
-    print("Done.")
-
-# Function to compute the normalized polarization (Pol index, Hird et al. (2017))
-# (in dB):
-def do_pol(source, outpath_):
-    
-    outpath = str(outpath_)
-
-    if not os.path.exists(outpath):
-        os.makedirs(outpath)
-        
-    VH = source.getBand('Sigma0_VH')
-    VV = source.getBand('Sigma0_VV')
-    
-    w = source.getSceneRasterWidth()
-    h = source.getSceneRasterHeight()
-
-    pol_product = Product('Pol', 'Pol', w, h)
-    pol_band = pol_product.addBand("Pol", ProductData.TYPE_FLOAT32)
-    writer = ProductIO.getProductWriter('BEAM-DIMAP')
-
-    ProductUtils.copyGeoCoding(source, pol_product)
-
-    pol_product.setProductWriter(writer)
-    pol_product.writeHeader(outpath + '\\' + str(source.getName()) + '_Pol.dim')
-
-    VH_i = np.zeros(w, dtype = np.float32)
-    VV_i = np.zeros(w, dtype = np.float32)
-
-    print("Writing Pol band...")
-
-    for y in range(h):
-        #print("Processing line ", y, " of ", h)
-        VH_i = VH.readPixels(0, y, w, 1, VH_i)
-        VV_i = VV.readPixels(0, y, w, 1, VV_i)
-        
-        pol = np.divide(
-            np.subtract(np.multiply(10, np.log10(VH_i)), np.multiply(10, np.log10(VV_i))),
-            np.add(np.multiply(10, np.log10(VH_i)), np.multiply(10, np.log10(VV_i))))
-        
-        pol_band.writePixels(0, y, w, 1, pol)
-
-    pol_product.closeIO()
-
-    print("Done.")
-
-# Function to compute a modified version of the Radar Vegetation Index (the
-# RVIm, modified by Nazi et al. (2019) (data in dB)):
-def do_rvim(source, outpath_):
+# The following function keeps seasonal statistics of the index bands up to
+# date (count, mean, variance, minimum and maximum of each pixel, see
+# "temporal_accumulator.py"): the indices of each scene computed by
+# "do_sar_vi" (up to date in its run manifest) and not accumulated yet are
+# added to the accumulator state ("season-statistics.dim" in sar_vi_path),
+# reading the index bands of that scene only. Give the AOI (and mask_aoi)
+# given to "do_sar_vi", so the indices of its windows are the ones read. With
+# rebuild = True, the state is built again from every scene. The scenes added
+# are returned:
+def do_accumulate(_sar_vi_path_, indices = ACCUMULATED_INDICES,
+                  vv_max_param = 3, tile_height = TILE_HEIGHT,
+                  rebuild = False, aoi = None, mask_aoi = False,
+                  trace = None):
     
-    outpath = str(outpath_)
-
-    if not os.path.exists(outpath):
-        os.makedirs(outpath)
-        
-    VH = source.getBand('Sigma0_VH')
-    VV = source.getBand('Sigma0_VV')
+    sar_vi_path = str(_sar_vi_path_)
+    state_path = os.path.join(sar_vi_path, 'season-statistics.dim')
+    band_names = index_bands(indices)
     
-    w = source.getSceneRasterWidth()
-    h = source.getSceneRasterHeight()
-
-    rvim_product = Product('RVIm', 'RVIm', w, h)
-    rvim_band = rvim_product.addBand("RVIm", ProductData.TYPE_FLOAT32)
-    writer = ProductIO.getProductWriter('BEAM-DIMAP')
-
-    ProductUtils.copyGeoCoding(source, rvim_product)
-
-    rvim_product.setProductWriter(writer)
-    rvim_product.writeHeader(outpath + '\\' + str(source.getName()) + '_RVIm.dim')
-
-    VH_i = np.zeros(w, dtype = np.float32)
-    VV_i = np.zeros(w, dtype = np.float32)
-
-    print("Writing RVIm band...")
-
-    for y in range(h):
-        #print("Processing line ", y, " of ", h)
-        VH_i = VH.readPixels(0, y, w, 1, VH_i)
-        VV_i = VV.readPixels(0, y, w, 1, VV_i)
-        
-        rvim = np.divide(np.multiply(4, np.multiply(10, np.log10(VH_i))),
-                         np.add(np.multiply(10, np.log10(VV_i)),
-                                np.multiply(10, np.log10(VH_i))))
-        
-        rvim_band.writePixels(0, y, w, 1, rvim)
-
-    rvim_product.closeIO()
-
-    print("Done.")
-
-# The following function collect the previous (those ones that computes SAR
-# indices), define an output folder to store the computed data, and apply each
-# function. Remember in changing the outpath variable:
+    options = recipe_options(aoi, mask_aoi)
     
-################# REMMEMBER IN CHECKING THE OUTPUT DIRECTORY #################
-# If the output directory does not exist, os will create it.
-def do_sar_vi(_outpath_):
+    accumulator = None
+    added = []
     
-    outpath = _outpath_
-    if not os.path.exists(outpath):
-        os.makedirs(outpath)
+    for path in files:
         
-    for i in files:
+        manifest = RunManifest(sar_vi_path, path)
+        if manifest.stale(indices, vv_max_param, options):
+            print("Indices not computed (or outdated, or of another AOI), "
+                  "not accumulated: %s" % os.path.basename(path))
+            continue
         
-        gc.collect()
-        print("Reading...")
+        scene = os.path.basename(path)
+        if accumulator is not None and accumulator.has(scene):
+            continue
         
-        product = ProductIO.readProduct(str(i))
+        outputs = {}
+        for index in indices:
+            output = manifest.records[index]['output']
+            for band_name in output['bands']:
+                outputs[band_name] = output['path']
+        products = {output_path: open_product(output_path)
+                    for output_path in set(outputs.values())}
         
+        product = products[outputs[band_names[0]]]
         w = product.getSceneRasterWidth()
         h = product.getSceneRasterHeight()
-
-        name = product.getName()
-        description = product.getDescription()
-        band_names = product.getBandNames()
-
-        print("Product:     %s, %s" % (name, description))
-        print("Raster size: %d x %d pixels" % (w, h))
-        print("Start time:  " + str(product.getStartTime()))
-        print("End time:    " + str(product.getEndTime()))
-        print("Bands:       %s" % (list(band_names)))
         
-        do_cr(product, outpath)
-        gc.collect()
-        #do_desc(product, outpath)
-        #gc.collect()
-        do_dprvic(product, outpath)
-        gc.collect()
-        do_dpsvi(product, outpath, vv_max_param = 3)
-        gc.collect()
-        do_dpsvim(product, outpath)
-        gc.collect()
-        do_pol(product, outpath)
-        gc.collect()
-        do_rvim(product, outpath)
+        # The state is created on the grid of the first index product:
+        if accumulator is None:
+            accumulator = TemporalAccumulator(state_path, band_names,
+                                              product, rebuild = rebuild)
+        
+        if not accumulator.has(scene):
+            print("Accumulating %s..." % scene)
+            with trace_stage(trace, path, 'accumulate', w * h):
+                accumulator.add_scene(
+                    scene, {band_name: products[outputs[band_name]]
+                            .getBand(band_name) for band_name in band_names},
+                    date = product.getStartTime(),
+                    recipes = {index: manifest.records[index]['recipe']
+                               for index in indices},
+                    tile_height = tile_height)
+            added.append(scene)
+        
+        for product in products.values():
+            product.dispose()
         gc.collect()
+    
+    if accumulator is not None:
+        print("%d scene(s) added, %d in the seasonal statistics."
+              % (len(added), len(accumulator.scenes)))
+        accumulator.dispose()
+    
+    return added
 
 # The following function read the outpath folder, created by the function 
 # "do_sar_vi" and merge the files within it folder with its respective original
-# product (the Pre-processed Sentinel-1 GRD image):
-def do_merge(source, path_):
+# product (the Pre-processed Sentinel-1 GRD image). With fused = True, the
+# single "_VIs.dim" product is merged (no BandMerge needed):
+def do_merge(source, path_, fused = False):
+    
+    parameters = HashMap()
+    sourceProducts = HashMap()
+    sourceProducts.put('masterProduct', source)
+    
+    if fused:
+        vis = ProductIO.readProduct(str(str(path_) + '\\' + source.getName() + "_VIs.dim"))
+        sourceProducts.put('sourceProduct', vis)
+        return GPF.createProduct('Merge', parameters, sourceProducts)
     
     cr = ProductIO.readProduct(str(str(path_) + '\\' + source.getName() + "_CR.dim"))
     dprvic = ProductIO.readProduct(str(str(path_) + '\\' + source.getName() + "_DPRVIC.dim"))
@@ -461,7 +647,6 @@ def do_merge(source, path_):
     pol =  ProductIO.readProduct(str(str(path_) + '\\' + source.getName() + "_Pol.dim"))
     rvim = ProductIO.readProduct(str(str(path_) + '\\' + source.getName() + "_RVIm.dim"))
  
-    parameters = HashMap()
     merged_bands = GPF.createProduct('BandMerge', parameters,
                                      (cr, dprvic, #desc,
                                       dpsvi, dpsvim, pol, rvim))
@@ -481,61 +666,126 @@ def do_merge(source, path_):
     del rvim
     gc.collect()
     
-    sourceProducts = HashMap()
-    sourceProducts.put('masterProduct', source)
     sourceProducts.put('sourceProduct', merged_bands)
 
     productMerged = GPF.createProduct('Merge', parameters, sourceProducts)
 
     return productMerged
 
-# The function "do_merge_and_write" really apply the function "do_merge". It
-# works with both an input and output directories. It reads the path where SAR
-# Indices are stored (so the Input directory), merge them with its respective
-# original product (the Pre-processed Sentinel-1 GRD image); an creates a new
-# folder to store the merged files (in BEAM-DIMAP format, which is more fast),
-# so the Ouput directory.
+# The function "do_merge_and_write_scene" really apply the function
+# "do_merge" to a scene. It reads the path where SAR Indices are stored (so the
+# Input directory), merge them with its respective original product (the
+# Pre-processed Sentinel-1 GRD image), and writes the merged product (in
+# BEAM-DIMAP format, which is more fast) in the Output directory. The merge
+# and the writing are recorded as stages of the scene in the trace, if any:
+def do_merge_and_write_scene(path, sar_vi_path, outpath, fused = False,
+                             trace = None):
+    
+    gc.collect()
+    print("Reading...")
+    
+    with trace_stage(trace, path, 'read'):
+        product = read_product(path)
+
+    name = product.getName()
+    description = product.getDescription()
+    band_names = product.getBandNames()
+
+    print("Product:     %s, %s" % (name, description))
+    print("Start time:  " + str(product.getStartTime()))
+    print("End time:    " + str(product.getEndTime()))
+    print("Bands:       %s" % (list(band_names)))
+    
+    print("Merging...")
+    with trace_stage(trace, path, 'merge'):
+        merged_product = do_merge(product, sar_vi_path, fused)
+    
+    print("New product bands:       %s" % (list(merged_product.getBandNames())))
+    print("Done!")
+    with trace_stage(trace, path, 'write',
+                     merged_product.getSceneRasterWidth() *
+                     merged_product.getSceneRasterHeight()):
+        ProductIO.writeProduct(merged_product, outpath + '\\' + name,
+                               'BEAM-DIMAP')
+    
+    product.dispose()
+    product.closeIO()
+    
+    del merged_product
+    gc.collect()
+
+# The function "do_append_scene" is the append mode of the previous one: the
+# index bands of the products stored in the Input directory are moved into the
+# '.data' directory of the original product (a BEAM-DIMAP product), and its
+# '.dim' band list is patched. The Sigma0 bands are never rewritten, and no
+# new product is written (the temporary index products are removed, and the
+# scene manifest points to the original product). It is recorded as the
+# 'merge' stage of the scene in the trace, if any:
+def do_append_scene(path, sar_vi_path, fused = False, trace = None):
+    
+    with trace_stage(trace, path, 'merge'):
+        append_scene(path, sar_vi_path, fused)
+
+# Function doing the appending of "do_append_scene":
+def append_scene(path, sar_vi_path, fused):
+    
+    product = open_product(path)
+    name = product.getName()
+    manifest = RunManifest(sar_vi_path, path)
+    
+    suffixes = ('_VIs',) if fused else tuple('_' + k for k in INDEX_BANDS)
+    
+    print("Appending to %s..." % name)
+    for suffix in suffixes:
+        vis_path = str(sar_vi_path) + '\\' + name + suffix + '.dim'
+        if not os.path.exists(vis_path):
+            # Up to date (not computed again) or appended already:
+            continue
+        vis = open_product(vis_path)
+        for band_name in vis.getBandNames():
+            product.append_band(vis.getBand(band_name), move = True)
+        vis.dispose()
+        os.remove(vis_path)
+        shutil.rmtree(os.path.splitext(vis_path)[0] + '.data',
+                      ignore_errors = True)
+        manifest.relocate(os.path.abspath(vis_path), product_file(product))
+    
+    product.save()
+    
+    print("New product bands:       %s" % (product.getBandNames()))
+    print("Done!")
+    
+    product.dispose()
+
+# The function "do_merge_and_write" applies "do_merge_and_write_scene" over
+# all files. It works with both an input and output directories, and creates a
+# new folder to store the merged files (so the Ouput directory).
 
 #### REMMEMBER IN CHECKING THE DIRECTORIES (INPUT AND OUTPUT DIRECTORIES) ####
-# If the output directory does not exist, os will create it.
-def do_merge_and_write(_sar_vi_path_, _outpath_):
+# If the output directory does not exist, os will create it. Use the same
+# "fused" option given to "do_sar_vi". The "jobs" and memory options are the
+# same as in "do_sar_vi". With append = True, "do_append_scene" is applied
+# instead (indices added to the original products, no Output directory):
+def do_merge_and_write(_sar_vi_path_, _outpath_, fused = False, jobs = 1,
+                       memory_budget_mb = None,
+                       worker_memory_mb = WORKER_MEMORY_MB, append = False,
+                       trace = None):
     
     sar_vi_path = _sar_vi_path_
     
+    if append:
+        return run_scenes(do_append_scene, files, (sar_vi_path,),
+                          dict(fused = fused, trace = trace), jobs,
+                          memory_budget_mb, worker_memory_mb)
+    
     outpath = _outpath_
     
     if not os.path.exists(outpath):
         os.makedirs(outpath)
-        
-    for i in files:
-        
-        gc.collect()
-        print("Reading...")
-        
-        product = ProductIO.readProduct(str(i))
-
-        name = product.getName()
-        description = product.getDescription()
-        band_names = product.getBandNames()
-
-        print("Product:     %s, %s" % (name, description))
-        print("Start time:  " + str(product.getStartTime()))
-        print("End time:    " + str(product.getEndTime()))
-        print("Bands:       %s" % (list(band_names)))
-        
-        print("Merging...")
-        merged_product = do_merge(product, sar_vi_path)
-        
-        print("New product bands:       %s" % (list(merged_product.getBandNames())))
-        print("Done!")
-        ProductIO.writeProduct(merged_product, outpath + '\\' + name,
-                               'BEAM-DIMAP')
-        
-        product.dispose()
-        product.closeIO()
-        
-        del merged_product
-        gc.collect()
+    
+    return run_scenes(do_merge_and_write_scene, files, (sar_vi_path, outpath),
+                      dict(fused = fused, trace = trace), jobs,
+                      memory_budget_mb, worker_memory_mb)
 
 #%% APPLYING OPERATORS
 
@@ -546,9 +796,118 @@ sar_vi_path = r'C:\Users\erlis\OneDrive\Área de Trabalho\S1-temporary-bands'
 # and its derived SAR Vegetation Indices:
 outpath = r'C:\Users\erlis\OneDrive\Área de Trabalho\S1-GRD-Level_2-Algodao-VIs'
 
-# Applying operators:
-do_sar_vi(sar_vi_path)
-do_merge_and_write(sar_vi_path, outpath)
+# Set fused = True (or give --fused) to read VV/VH once and write all indices
+# as bands of a single product per scene (FUSED_INDICES, add 'desc' for the
+# descriptors), instead of a product per index:
+fused = False
+
+# Directory where the program will store the time-series stack of the indices
+# (--stack):
+stack_path = r'C:\Users\erlis\OneDrive\Área de Trabalho\S1-GRD-Level_2-Algodao-VI-stack'
+
+# Number of scenes processed at the same time (worker processes) and the
+# memory budget (MB) of all workers together. They are given in the command
+# line: python Script_05_...py --jobs 8 --memory-budget 64000 (as well as
+# the tile size, the threads computing the tiles of each scene, --threads,
+# the backend reading the scenes, --backend numpy, --fused for the single
+# pass (see "fused" above), and --append to add the indices to the original
+# products instead of writing merged copies; indices up to date are skipped,
+# unless --force is given). With --aoi (the AOI as
+# WKT, GeoJSON, or a file of them or a shapefile), the indices are computed
+# within the AOI window of each scene only, with no need to crop the scenes
+# with Script 04 (add --mask-aoi to leave the pixels out of the polygons as
+# no-data); the "_sub_VIs" products are then the final ones (not merged).
+# The stages of each scene are traced in "stage-trace.jsonl" (in the
+# directory of the SAR vegetation indices, or the file given with --trace),
+# and summarized at the end. With --stack, the scenes (co-registered, on the
+# same grid) are stacked instead into time-series cubes of the indices, with
+# their temporal aggregates, in stack_path (see "do_sar_vi_stack"). With
+# --accumulate, the seasonal statistics of ACCUMULATED_INDICES are updated
+# with the new scenes (see "do_accumulate")
+# Workers import this script again, so only the main process applies the
+# operators:
+if __name__ == "__main__":
+    
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type = int, default = 1)
+    parser.add_argument('--threads', type = int, default = THREADS,
+                        help = "threads computing the tiles of each scene")
+    parser.add_argument('--tile-height', type = int, default = TILE_HEIGHT)
+    parser.add_argument('--tile-width', type = int, default = TILE_WIDTH)
+    parser.add_argument('--memory-budget', type = float, default = None,
+                        help = "MB for all workers together")
+    parser.add_argument('--worker-memory', type = float,
+                        default = WORKER_MEMORY_MB,
+                        help = "MB of arrays per worker (besides its JVM)")
+    parser.add_argument('--backend', choices = ('snappy', 'numpy'),
+                        default = 'snappy',
+                        help = "'numpy' reads and writes BEAM-DIMAP products "
+                               "without snappy")
+    parser.add_argument('--fused', action = 'store_true',
+                        help = "compute the indices in a single pass, as "
+                               "bands of one product per scene")
+    parser.add_argument('--append', action = 'store_true',
+                        help = "add the indices to the original products "
+                               "instead of writing merged copies")
+    parser.add_argument('--force', action = 'store_true',
+                        help = "compute every index again, even if up to "
+                               "date in the run manifest")
+    parser.add_argument('--no-skip-nodata', action = 'store_true',
+                        help = "compute the no-data pixels too")
+    parser.add_argument('--aoi', default = None,
+                        help = "AOI (WKT, GeoJSON, or a file of them or a "
+                               "shapefile) to compute the indices within")
+    parser.add_argument('--mask-aoi', action = 'store_true',
+                        help = "leave the pixels out of the AOI polygons as "
+                               "no-data")
+    parser.add_argument('--trace', default = os.path.join(sar_vi_path,
+                                                          'stage-trace.jsonl'),
+                        help = "JSON-lines trace of the stages of each scene")
+    parser.add_argument('--stack', action = 'store_true',
+                        help = "stack the indices of the (co-registered) "
+                               "scenes into time-series cubes, with their "
+                               "temporal aggregates")
+    parser.add_argument('--accumulate', action = 'store_true',
+                        help = "update the seasonal statistics with the "
+                               "indices of the new scenes")
+    options = parser.parse_known_args()[0]
+    fused = fused or options.fused
+    if options.append and options.aoi is not None:
+        parser.error("--append cannot be used with --aoi: the indices of an "
+                     "AOI window are not appended to the scene product")
+    
+    batch = dict(jobs = options.jobs,
+                 memory_budget_mb = options.memory_budget,
+                 worker_memory_mb = options.worker_memory,
+                 trace = StageTrace(options.trace, 'Script_05'))
+    
+    # Applying operators (stacking the scenes, with --stack):
+    if options.stack:
+        do_sar_vi_stack(files, stack_path, threads = options.threads,
+                        tile_height = options.tile_height,
+                        tile_width = options.tile_width,
+                        backend = options.backend,
+                        skip_nodata = not options.no_skip_nodata,
+                        trace = batch['trace'])
+    else:
+        do_sar_vi(sar_vi_path, fused = fused, threads = options.threads,
+                  tile_height = options.tile_height,
+                  tile_width = options.tile_width, backend = options.backend,
+                  append = options.append, force = options.force,
+                  skip_nodata = not options.no_skip_nodata, aoi = options.aoi,
+                  mask_aoi = options.mask_aoi, **batch)
+        if options.accumulate:
+            do_accumulate(sar_vi_path, tile_height = options.tile_height,
+                          aoi = options.aoi, mask_aoi = options.mask_aoi,
+                          trace = batch['trace'])
+        # With the 'numpy' backend, appended indices are already in the
+        # products, and AOI windows are not merged with the whole scenes:
+        if not (options.append and options.backend == 'numpy') and \
+                options.aoi is None:
+            do_merge_and_write(sar_vi_path, outpath, fused = fused,
+                               append = options.append, **batch)
+    
+    batch['trace'].print_summary()
 
 gc.collect()
 
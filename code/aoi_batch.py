@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to crop many Areas of Interest (AOIs, e.g. the farm polygons of a
+shapefile) from each Sentinel-1 scene at once (Script 04).
+    Inputs: the AOIs (see "read_aois" in aoi_windows.py) and the preprocessed
+    scenes (snappy products, or BEAM-DIMAP products read by dimap_io.py);
+    Outputs: a cropped product per AOI and scene ("<scene name>_sub_<AOI
+    id>.dim"), holding the bands of the scene within the AOI window, or a
+    virtual subset ("<scene name>_sub_<AOI id>.vdim", see dimap_io.py)
+    pointing to the window of the scene, without copying it.
+
+The pixel windows of the AOIs are computed once per grid (see "grid_key" in
+aoi_windows.py): scenes terrain corrected to the same grid reuse them, so the
+polygons are put on the grid only for the first one. With a window cache (see
+window_cache.py), they are kept on disk for the next runs too. Each scene is
+then read once, in strips of lines: a strip of each band is read over the
+columns of the AOI windows it crosses, and the part of each window within the
+strip is written to the product of that AOI. Overlapping windows share the
+pixels read, and strips crossing no window are not read at all.
+
+Optionally (mask_aoi = True), the pixels of a window outside its polygons are
+written as no-data (the no-data value of the band, or NaN).
+
+Virtual subsets (virtual = True) are only written, the scene is not read at
+all: cropping costs the computing of the windows, and the AOIs of a scene
+share its rasters on disk. They are read (e.g. by Script 05) as windows of the
+scene, so the scene must be kept (and cannot be masked).
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+# Fast arrays computation:
+import numpy as np
+# Tiles of the rasters (read and written as the tiled block engine does):
+from sar_vi_engine import TILE_HEIGHT, read_tile, write_tile
+# BEAM-DIMAP products memory-mapped with NumPy:
+from dimap_io import DimapProduct, create_product, write_virtual_subset
+# Area of Interest windows and masks:
+from aoi_windows import (crop_product, grid_key, pixel_polygons,
+                         window_and_mask)
+# Stage telemetry (time, CPU, I/O and memory of each processing stage):
+from stage_telemetry import trace_stage
+
+#%% DEFINING FUNCTIONS
+
+# Function to get the windows of the AOIs (a list of (id, polygons), see
+# "read_aois") on the grid of a product: a list of (id, window, mask) for the
+# AOIs within the scene (window (x, y, w, h) and mask as "aoi_window", from
+# the window cache if given):
+def grid_windows(product, aois, margin = 0, cache = None):
+
+    w = product.getSceneRasterWidth()
+    h = product.getSceneRasterHeight()
+
+    windows = []
+    for aoi_id, polygons in aois:
+        try:
+            if cache is not None:
+                window, mask = cache.window(product, polygons, margin)
+            else:
+                window, mask = window_and_mask(
+                    pixel_polygons(product, polygons), w, h, margin)
+        except ValueError:
+            # Vertices out of the geocoding, so out of the scene:
+            continue
+        if window is not None:
+            windows.append((aoi_id, window, mask))
+
+    return windows
+
+# Function to create the product of an AOI window of a scene ("path", '.dim'
+# added), with an empty float32 band per band of the scene, written with
+# the backend of the scene. It returns the product and its bands:
+def create_window_product(product, window, path, name, band_names):
+
+    if isinstance(product, DimapProduct):
+        target = create_product(path + '.dim', product.subset(*window), name)
+        bands = []
+        for band_name in band_names:
+            band = product.getBand(band_name)
+            bands.append(target.add_band(
+                band_name, unit = band.info.get('PHYSICAL_UNIT'),
+                description = band.info.get('BAND_DESCRIPTION'),
+                no_data_value = band.no_data_value))
+        return target, bands
+
+    from snappy import ProductIO, Product, ProductData, ProductUtils
+
+    subset = crop_product(product, window, name)
+    target = Product(name, product.getProductType(), window[2], window[3])
+    ProductUtils.copyMetadata(product, target)
+    ProductUtils.copyGeoCoding(subset, target)
+    target.setStartTime(product.getStartTime())
+    target.setEndTime(product.getEndTime())
+
+    bands = []
+    for band_name in band_names:
+        band = product.getBand(band_name)
+        new_band = target.addBand(band_name, ProductData.TYPE_FLOAT32)
+        new_band.setUnit(band.getUnit())
+        new_band.setNoDataValue(band.getNoDataValue())
+        new_band.setNoDataValueUsed(band.isNoDataValueUsed())
+        bands.append(new_band)
+
+    target.setProductWriter(ProductIO.getProductWriter('BEAM-DIMAP'))
+    target.writeHeader(path + '.dim')
+    subset.dispose()
+
+    return target, bands
+
+# Function to write and close the product of an AOI window:
+def close_window_product(product):
+    if isinstance(product, DimapProduct):
+        product.save()
+        product.dispose()
+    else:
+        product.closeIO()
+        product.dispose()
+
+# The following class crops many AOIs from each scene, in a single read pass
+# per scene (see the module notes). The windows of each grid are kept, so
+# the scenes of a grid only compute them once:
+class BatchCropper:
+
+    def __init__(self, aois, margin = 0, mask_aoi = False,
+                 tile_height = TILE_HEIGHT, trace = None, cache = None):
+
+        self.aois = list(aois)
+        self.margin = margin
+        self.mask_aoi = mask_aoi
+        self.tile_height = tile_height
+        self.trace = trace
+        self.cache = cache
+        self.grids = {}
+
+    # Function to get the windows of the AOIs on the grid of a product (see
+    # "grid_windows"), computed for the first product of each grid only:
+    def windows(self, product, scene = None):
+
+        key = grid_key(product)
+        if key is not None and key in self.grids:
+            return self.grids[key]
+
+        with trace_stage(self.trace, scene or product.getName(), 'windows'):
+            windows = grid_windows(product, self.aois, self.margin,
+                                   self.cache)
+        if key is not None:
+            self.grids[key] = windows
+
+        return windows
+
+    # Function to crop the AOIs from a product (all its bands by default),
+    # writing the window of each one to "outpath\<product name>_sub_<AOI
+    # id>.dim" or, with virtual = True, a virtual subset of the product read
+    # from disk ("<product name>_sub_<AOI id>.vdim"). It returns the paths
+    # of the products written, by AOI id (AOIs out of the scene have none):
+    def crop(self, product, outpath, band_names = None, scene = None,
+             virtual = False):
+
+        outpath = str(outpath)
+        scene = scene or product.getName()
+        band_names = list(band_names or product.getBandNames())
+
+        parent = product.getFileLocation()
+        if virtual and (parent is None or self.mask_aoi):
+            raise ValueError("Virtual subsets need a product read from disk "
+                             "and cannot be masked")
+
+        windows = self.windows(product, scene)
+        if not windows:
+            print("No AOI within the scene, nothing to write.")
+            return {}
+
+        if not os.path.exists(outpath):
+            os.makedirs(outpath)
+
+        if virtual:
+            paths = {}
+            with trace_stage(self.trace, scene, 'virtual subsets'):
+                for aoi_id, window, _ in windows:
+                    name = '%s_sub_%s' % (product.getName(), aoi_id)
+                    paths[aoi_id] = write_virtual_subset(
+                        outpath + '\\' + name + '.vdim', str(parent), window,
+                        name, aoi = aoi_id)
+            return paths
+
+        crops = []
+        for aoi_id, window, mask in windows:
+            name = '%s_sub_%s' % (product.getName(), aoi_id)
+            path = outpath + '\\' + name
+            target, bands = create_window_product(product, window, path,
+                                                  name, band_names)
+            crops.append((aoi_id, window, mask, path + '.dim', target, bands))
+
+        sources = [product.getBand(band_name) for band_name in band_names]
+        fills = [band.getNoDataValue() if band.isNoDataValueUsed()
+                 else np.nan for band in sources]
+
+        pixels = sum(window[2] * window[3] for _, window, _ in windows)
+        print("Cropping %d AOI(s), %d pixels per band..." % (len(crops),
+                                                            pixels))
+
+        with trace_stage(self.trace, scene, 'crop', pixels * len(sources)):
+            self.copy_windows(sources, fills, crops)
+
+        for crop in crops:
+            close_window_product(crop[4])
+
+        return {aoi_id: path for aoi_id, _, _, path, _, _ in crops}
+
+    # Function to copy the windows of the sources to the AOI products, strip
+    # by strip of tile_height lines, each strip read once per band:
+    def copy_windows(self, sources, fills, crops):
+
+        top = min(window[1] for _, window, _, _, _, _ in crops)
+        bottom = max(window[1] + window[3] for _, window, _, _, _, _ in crops)
+        strip_height = min(self.tile_height or bottom - top, bottom - top)
+        buffer = None
+
+        for y in range(top, bottom, strip_height):
+            th = min(strip_height, bottom - y)
+            crossing = [crop for crop in crops
+                        if crop[1][1] < y + th and crop[1][1] + crop[1][3] > y]
+            if not crossing:
+                continue
+
+            x0 = min(crop[1][0] for crop in crossing)
+            x1 = max(crop[1][0] + crop[1][2] for crop in crossing)
+            if buffer is None or buffer.size < (x1 - x0) * th:
+                buffer = np.empty((x1 - x0) * th, dtype = np.float32)
+
+            # Lines of each crossing window within the strip, and their mask:
+            parts = []
+            for aoi_id, (wx, wy, ww, wh), mask, _, _, bands in crossing:
+                first, last = max(y, wy), min(y + th, wy + wh)
+                outside = None
+                if self.mask_aoi:
+                    outside = ~mask.rasterize(0, first - wy, ww, last - first)
+                parts.append((wx - x0, first - y, last - first, ww,
+                              first - wy, outside, bands))
+
+            for b, band in enumerate(sources):
+                strip = read_tile(band, x0, y, x1 - x0, th, buffer)
+                for left, row, lines, ww, target_row, outside, bands in parts:
+                    block = strip[row:row + lines, left:left + ww]
+                    if outside is not None and outside.any():
+                        block = block.copy()
+                        block[outside] = fills[b]
+                    write_tile(bands[b], 0, target_row, block)
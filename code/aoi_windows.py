@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to compute the SAR vegetation indices only within an Area of
+Interest (AOI), without cropping the scenes first (Script 04).
+    Inputs: the AOI, as the WKT (Well-Known-Text) built by Script 04 from the
+    shapefile, a GeoJSON (text, dictionary or '.geojson' file) or any geometry
+    with a "__geo_interface__" (shapely, geopandas), in WGS84 decimal degrees;
+    and a product (snappy or dimap_io);
+    Outputs: the pixel window of the product covering the AOI, the window
+    itself (a lazy subset of the product: only its pixels are read) and a
+    mask of the AOI polygons over the window.
+
+The AOI vertices are put on the product grid through its geocoding (snappy's
+getPixelPos, or the map transform of a BEAM-DIMAP product), so the window is
+the one SubsetOp would crop. The mask is rasterized tile by tile (pixel
+centers inside the polygons, holes excluded), so it never takes the memory of
+a whole band.
+
+Only polygons (and multi-polygons) are supported.
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+import re
+# For reading GeoJSON and hashing the AOI:
+import json
+import hashlib
+# Fast arrays computation:
+import numpy as np
+# BEAM-DIMAP products (and their windows) read with NumPy:
+from dimap_io import DimapProduct
+
+#%% READING THE AOI
+
+# Function to get the polygons of a WKT POLYGON or MULTIPOLYGON: a list of
+# polygons, each one a list of rings (the exterior one, then the holes) as
+# (n, 2) arrays of longitude and latitude:
+def wkt_polygons(wkt):
+
+    text = wkt.strip()
+    kind = re.match(r'(MULTIPOLYGON|POLYGON)\b', text, re.IGNORECASE)
+    if kind is None:
+        raise ValueError("Only POLYGON and MULTIPOLYGON AOIs are supported: "
+                         "%s" % text[:40])
+
+    # Parentheses depth of the rings (one more in multi-polygons):
+    ring_depth = 3 if kind.group(1).upper() == 'MULTIPOLYGON' else 2
+
+    polygons = []
+    depth = start = 0
+    for i, char in enumerate(text):
+        if char == '(':
+            depth += 1
+            if depth == ring_depth - 1:
+                polygons.append([])
+            elif depth == ring_depth:
+                start = i + 1
+        elif char == ')':
+            if depth == ring_depth:
+                points = [point.split()[:2]
+                          for point in text[start:i].split(',')]
+                polygons[-1].append(np.array(points, dtype = np.float64))
+            depth -= 1
+
+    return polygons
+
+# Function to get the polygons of a GeoJSON object (geometry, feature or
+# collection of them), as "wkt_polygons" does:
+def geojson_polygons(geojson):
+
+    kind = geojson.get('type')
+
+    if kind == 'Polygon':
+        return [[np.array(ring, dtype = np.float64)[:, :2]
+                 for ring in geojson['coordinates']]]
+    if kind == 'MultiPolygon':
+        return [[np.array(ring, dtype = np.float64)[:, :2] for ring in polygon]
+                for polygon in geojson['coordinates']]
+    if kind == 'Feature':
+        return geojson_polygons(geojson['geometry'])
+    if kind == 'FeatureCollection':
+        return [polygon for feature in geojson['features']
+                for polygon in geojson_polygons(feature)]
+    if kind == 'GeometryCollection':
+        return [polygon for geometry in geojson['geometries']
+                for polygon in geojson_polygons(geometry)]
+
+    raise ValueError("Only Polygon and MultiPolygon AOIs are supported: %s"
+                     % kind)
+
+# Function to read an AOI given as: a WKT or GeoJSON text; a file holding one
+# of them ('.wkt', '.txt', '.json' or '.geojson'); a shapefile (its first
+# geometry, as in Script 04; geopandas is needed); a GeoJSON dictionary; a
+# geometry with a "__geo_interface__"; or polygons already read. It returns
+# the AOI polygons (see "wkt_polygons"):
+def read_aoi(aoi):
+
+    if isinstance(aoi, list):
+        return aoi
+    if hasattr(aoi, '__geo_interface__'):
+        aoi = aoi.__geo_interface__
+    if isinstance(aoi, dict):
+        polygons = geojson_polygons(aoi)
+    else:
+        aoi = str(aoi)
+        if os.path.isfile(aoi) and aoi.lower().endswith('.shp'):
+            import geopandas as gpd
+            return read_aoi(gpd.read_file(aoi).geometry.iloc[0])
+        if os.path.isfile(aoi):
+            with open(aoi) as aoi_file:
+                aoi = aoi_file.read()
+        if aoi.lstrip().startswith('{'):
+            polygons = geojson_polygons(json.loads(aoi))
+        else:
+            polygons = wkt_polygons(aoi)
+
+    if not polygons:
+        raise ValueError("Empty AOI")
+
+    return polygons
+
+# Function to read many AOIs at once: every geometry of a shapefile
+# (geopandas is needed) or feature of a GeoJSON feature collection, each one
+# an AOI of its own; any other AOI (see "read_aoi") is a single one. AOIs are
+# identified by the "id_field" attribute of their feature, or by their
+# position in the file. It returns a list of (id, polygons):
+def read_aois(aoi, id_field = None):
+
+    if isinstance(aoi, str) and os.path.isfile(aoi) and \
+            aoi.lower().endswith('.shp'):
+        import geopandas as gpd
+        features = gpd.read_file(aoi)
+        ids = features.index if id_field is None else features[id_field]
+        return [(str(aoi_id), read_aoi(geometry))
+                for aoi_id, geometry in zip(ids, features.geometry)
+                if geometry is not None and not geometry.is_empty]
+
+    collection = aoi
+    if isinstance(aoi, str) and not os.path.isfile(aoi) and \
+            aoi.lstrip().startswith('{'):
+        collection = json.loads(aoi)
+    elif isinstance(aoi, str) and os.path.isfile(aoi) and \
+            aoi.lower().endswith(('.json', '.geojson')):
+        with open(aoi) as aoi_file:
+            collection = json.load(aoi_file)
+
+    if isinstance(collection, dict) and \
+            collection.get('type') == 'FeatureCollection':
+        aois = []
+        for i, feature in enumerate(collection['features']):
+            properties = feature.get('properties') or {}
+            aoi_id = properties.get(id_field, feature.get('id', i))
+            aois.append((str(aoi_id), geojson_polygons(feature)))
+        return aois
+
+    return [('0', read_aoi(aoi))]
+
+# Function to hash the AOI polygons (to record them in the run manifest):
+def aoi_hash(polygons):
+
+    digest = hashlib.sha1()
+    for polygon in polygons:
+        for ring in polygon:
+            digest.update(np.ascontiguousarray(ring, dtype = np.float64))
+        digest.update(b'|')
+
+    return digest.hexdigest()
+
+#%% GEOCODING
+
+# Function to get the pixel coordinates (x, y, from the upper left corner of
+# the grid) of WGS84 longitudes and latitudes through the geocoding of a
+# product: the map transform of a BEAM-DIMAP product read by "dimap_io", or
+# the scene geocoding of a snappy product (one vertex at a time):
+def geo_to_pixel(product, lon, lat):
+
+    if isinstance(product, DimapProduct):
+        return product.geo_to_pixel(lon, lat)
+
+    from snappy import GeoPos
+
+    geocoding = product.getSceneGeoCoding()
+    if geocoding is None:
+        raise ValueError("%s has no geocoding" % product.getName())
+
+    positions = [geocoding.getPixelPos(GeoPos(float(b), float(a)), None)
+                 for a, b in zip(lon, lat)]
+
+    return (np.array([position.x for position in positions]),
+            np.array([position.y for position in positions]))
+
+# Function to get the key of the grid of a product: its map CRS (WKT), its
+# image-to-map transform (as "DimapProduct.image_to_model") and its raster
+# size. Scenes terrain corrected to the same grid (e.g. the UTM projection of
+# Script 03, on the same pixel size and origin) have the same key, so pixel
+# windows computed on one of them hold for the others. It is None for
+# products without a map geocoding (e.g. not terrain corrected):
+def grid_key(product):
+
+    w = product.getSceneRasterWidth()
+    h = product.getSceneRasterHeight()
+
+    if isinstance(product, DimapProduct):
+        transform = product.image_to_model()
+        wkt = product.root.find('Coordinate_Reference_System/WKT')
+        if transform is None or wkt is None:
+            return None
+        return (' '.join(wkt.text.split()), tuple(transform), w, h)
+
+    geocoding = product.getSceneGeoCoding()
+    if geocoding is None or not hasattr(geocoding, 'getImageToMapTransform'):
+        return None
+    transform = geocoding.getImageToMapTransform()
+    return (' '.join(str(geocoding.getMapCRS().toWKT()).split()),
+            (transform.getScaleX(), transform.getShearY(),
+             transform.getShearX(), transform.getScaleY(),
+             transform.getTranslateX(), transform.getTranslateY()), w, h)
+
+# Function to put the AOI polygons on the grid of a product (rings as (n, 2)
+# arrays of pixel x and y):
+def pixel_polygons(product, polygons):
+
+    pixels = []
+    for polygon in polygons:
+        rings = []
+        for ring in polygon:
+            x, y = geo_to_pixel(product, ring[:, 0], ring[:, 1])
+            if not (np.all(np.isfinite(x)) and np.all(np.isfinite(y))):
+                raise ValueError("AOI out of the geocoding of %s"
+                                 % product.getName())
+            rings.append(np.column_stack((x, y)))
+        pixels.append(rings)
+
+    return pixels
+
+# Function to get the pixel window (x, y, w, h) covering polygons on the
+# pixel grid (their bounds, widened by "margin" pixels and clipped to the w x
+# h raster). It returns None when they are out of the raster:
+def polygons_window(polygons, w, h, margin = 0):
+
+    points = np.concatenate([polygon[0] for polygon in polygons])
+
+    x0 = max(int(np.floor(points[:, 0].min())) - margin, 0)
+    y0 = max(int(np.floor(points[:, 1].min())) - margin, 0)
+    x1 = min(int(np.ceil(points[:, 0].max())) + margin, w)
+    y1 = min(int(np.ceil(points[:, 1].max())) + margin, h)
+
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+#%% AOI MASKS
+
+# The following class is the mask of polygons over a pixel grid: a pixel is
+# inside when its center is (even-odd rule, so holes are outside). Tiles of
+# the mask are rasterized on demand, a line at a time, from the polygon edges
+# crossing the line. It is the "region" of a validity index (see
+# tile_validity.py):
+class AoiMask:
+
+    def __init__(self, polygons):
+
+        edges = []
+        for polygon in polygons:
+            for ring in polygon:
+                start, end = ring, np.roll(ring, -1, axis = 0)
+                edges.append(np.column_stack((start, end)))
+        edges = np.concatenate(edges)
+
+        # Horizontal edges never cross a line of pixel centers:
+        self.edges = edges[edges[:, 1] != edges[:, 3]]
+
+    # Function to get the mask (boolean, th x tw) of the tile at x, y:
+    def rasterize(self, x, y, tw, th, out = None):
+
+        if out is None:
+            out = np.empty((th, tw), dtype = bool)
+        out[...] = False
+
+        x1, y1, x2, y2 = self.edges.T
+        centers = np.arange(x, x + tw) + 0.5
+
+        for row in range(th):
+            center = y + row + 0.5
+            crossing = (y1 <= center) != (y2 <= center)
+            if not crossing.any():
+                continue
+            crossings = np.sort(x1[crossing] + (center - y1[crossing]) *
+                                (x2[crossing] - x1[crossing]) /
+                                (y2[crossing] - y1[crossing]))
+            # Inside when an odd number of edges cross the line to the left:
+            out[row] = np.searchsorted(crossings, centers) % 2 == 1
+
+        return out
+
+# Function to get the window of polygons on the pixel grid of a w x h raster
+# (see "polygons_window") and their mask on the window grid. It returns
+# None, None when they are out of the raster:
+def window_and_mask(polygons, w, h, margin = 0):
+
+    window = polygons_window(polygons, w, h, margin)
+    if window is None:
+        return None, None
+
+    offset = np.array(window[:2], dtype = np.float64)
+    mask = AoiMask([[ring - offset for ring in polygon]
+                    for polygon in polygons])
+
+    return window, mask
+
+# Function to get the window of a product covering an AOI (see "read_aoi"):
+# it returns the pixel window (x, y, w, h), or None when the AOI is out of the
+# scene, and the AOI mask on the window grid. Given a window cache (see
+# window_cache.py), the window and mask of a grid already seen are reused:
+def aoi_window(product, aoi, margin = 0, cache = None):
+
+    if cache is not None:
+        return cache.window(product, read_aoi(aoi), margin)
+
+    return window_and_mask(pixel_polygons(product, read_aoi(aoi)),
+                           product.getSceneRasterWidth(),
+                           product.getSceneRasterHeight(), margin)
+
+# Function to get a window (x, y, w, h) of a product, as a product read
+# lazily (only the window pixels are read, nothing is written): a DimapWindow
+# for products read by "dimap_io", or a snappy subset (as SubsetOp does) for
+# snappy ones:
+def crop_product(product, window, name = None):
+
+    x, y, w, h = window
+    name = name or str(product.getName()) + '_sub'
+
+    if isinstance(product, DimapProduct):
+        return product.subset(x, y, w, h, name)
+
+    from snappy import jpy
+
+    ProductSubsetDef = jpy.get_type('org.esa.snap.core.dataio.ProductSubsetDef')
+    Rectangle = jpy.get_type('java.awt.Rectangle')
+
+    subset_def = ProductSubsetDef()
+    subset_def.setRegion(Rectangle(x, y, w, h))
+    subset_def.setSubSampling(1, 1)
+
+    return product.createSubset(subset_def, name, product.getDescription())
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to compute band statistics (min, max, mean, percentiles and the
+number of NaN/no-data pixels) tile by tile, in bounded memory.
+    Inputs: band objects with the snappy "readPixels" method;
+    Output: a dictionary with the band statistics.
+
+Percentiles come from a fixed-bin histogram updated tile by tile (log-spaced
+bins for backscatter in linear power units), so a full Sentinel-1 scene never
+has to be held in memory. With the default 4096 bins over 1e-6 to 1e3, the
+relative error of a percentile is below 0.5 %.
+
+The statistics of a product are cached in a sidecar file next to it
+("<product>.stats.json"), keyed by the band file path, size and modification
+time, so unchanged scenes are not scanned again.
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+# For reading and writing the statistics cache:
+import json
+# Fast arrays computation:
+import numpy as np
+# Tiled block engine:
+from sar_vi_engine import TILE_HEIGHT, TILE_WIDTH, iter_tiles, read_tile
+# Virtual subsets (windows of a parent product):
+from dimap_io import is_virtual_subset, read_virtual_subset
+
+#%% DEFAULT PARAMETERS
+
+# Percentiles computed by default:
+PERCENTILES = (1, 2, 50, 98, 99)
+
+# Histogram bins and value range (Sigma0 in linear power units, from -60 dB
+# to +30 dB):
+HISTOGRAM_BINS = 4096
+VALUE_RANGE = (1e-6, 1e3)
+
+# No-data value of the Sigma0 bands written by SNAP's Terrain-Correction (the
+# border around the swath), for bands declaring none:
+NODATA = 0.0
+
+#%% STREAMING STATISTICS REDUCER
+
+# Function to name a percentile in the statistics dictionary (99.0 -> '99'):
+def percentile_key(p):
+    return '%g' % float(p)
+
+# The following class accumulates the statistics of the tiles given to its
+# "update" method. Values equal to "nodata" (if given) and NaN are counted but
+# kept out of the statistics. Two reducers with the same bins can be merged
+# (e.g. when tiles are spread among workers):
+class StreamingStats:
+
+    def __init__(self, percentiles = PERCENTILES, bins = HISTOGRAM_BINS,
+                 value_range = VALUE_RANGE, log_bins = True, nodata = None):
+
+        self.percentiles = tuple(percentiles)
+        self.log_bins = log_bins
+        self.nodata = nodata
+
+        lo, hi = value_range
+        if log_bins:
+            lo, hi = np.log10(lo), np.log10(hi)
+        self.lo, self.hi, self.bins = float(lo), float(hi), int(bins)
+        self.step = (self.hi - self.lo) / self.bins
+
+        # Histogram counts, with an underflow and an overflow bin at the ends:
+        self.counts = np.zeros(self.bins + 2, dtype = np.int64)
+
+        self.count = 0
+        self.nan_count = 0
+        self.nodata_count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    # Function to add a tile (any shape) to the statistics:
+    def update(self, block):
+
+        block = np.asarray(block).reshape(-1)
+        finite = np.isfinite(block)
+        self.nan_count += int(block.size - np.count_nonzero(finite))
+
+        if self.nodata is not None:
+            valid = finite & (block != self.nodata)
+            self.nodata_count += int(np.count_nonzero(finite) -
+                                     np.count_nonzero(valid))
+        else:
+            valid = finite
+
+        values = block[valid]
+        if values.size == 0:
+            return self
+
+        self.count += int(values.size)
+        self.total += float(np.sum(values, dtype = np.float64))
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        if self.log_bins:
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                position = np.log10(values)
+            # Zero and negative values go to the underflow bin:
+            position[~np.isfinite(position)] = -np.inf
+        else:
+            position = values
+        index = np.floor((position - self.lo) / self.step)
+        index = np.clip(index, -1, self.bins).astype(np.int64) + 1
+        self.counts += np.bincount(index, minlength = self.bins + 2)
+
+        return self
+
+    # Function to add the statistics of another reducer (same bins) to this one:
+    def merge(self, other):
+
+        if (other.lo, other.hi, other.bins, other.log_bins) != \
+                (self.lo, self.hi, self.bins, self.log_bins):
+            raise ValueError("Cannot merge statistics with different bins")
+
+        self.counts += other.counts
+        self.count += other.count
+        self.nan_count += other.nan_count
+        self.nodata_count += other.nodata_count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+        return self
+
+    # Function to get a percentile (0 to 100) from the histogram. The value is
+    # interpolated within its bin (in log10 space for log bins):
+    def percentile(self, p):
+
+        if self.count == 0:
+            return np.nan
+        if p <= 0:
+            return self.min
+        if p >= 100:
+            return self.max
+
+        rank = p / 100.0 * self.count
+        cumulative = np.cumsum(self.counts)
+        i = int(np.searchsorted(cumulative, rank))
+        below = cumulative[i - 1] if i > 0 else 0
+        fraction = (rank - below) / self.counts[i]
+
+        # The underflow and overflow bins are interpolated linearly between
+        # the observed min (or max) and the histogram range:
+        if i == 0 or i == self.bins + 1:
+            edge = 10 ** self.lo if i == 0 else 10 ** self.hi
+            if not self.log_bins:
+                edge = self.lo if i == 0 else self.hi
+            lower, upper = (self.min, edge) if i == 0 else (edge, self.max)
+            value = lower + fraction * (upper - lower)
+        else:
+            lower = self.lo + (i - 1) * self.step
+            value = lower + fraction * self.step
+            if self.log_bins:
+                value = 10 ** value
+
+        return float(np.clip(value, self.min, self.max))
+
+    # Function to get the statistics as a dictionary:
+    def result(self):
+
+        return {'count': self.count,
+                'nan_count': self.nan_count,
+                'nodata_count': self.nodata_count,
+                'min': self.min if self.count else np.nan,
+                'max': self.max if self.count else np.nan,
+                'mean': self.total / self.count if self.count else np.nan,
+                'percentiles': {percentile_key(p): self.percentile(p)
+                                for p in self.percentiles}}
+
+#%% DEFINING FUNCTIONS
+
+# Function to get the no-data value of a band: its own one if used, or the
+# default (the terrain-correction border, NODATA):
+def band_nodata(band, default = NODATA):
+    return band.getNoDataValue() if band.isNoDataValueUsed() else default
+
+# Function to compute the statistics of a band, reading it tile by tile. Only
+# one tile buffer is held in memory:
+def compute_band_stats(band, w, h, percentiles = PERCENTILES, nodata = None,
+                       tile_height = TILE_HEIGHT, tile_width = TILE_WIDTH,
+                       **histogram):
+
+    stats = StreamingStats(percentiles, nodata = nodata, **histogram)
+    buffer = None
+
+    for x, y, tw, th in iter_tiles(w, h, tile_height, tile_width):
+        if buffer is None:
+            buffer = np.empty(tw * th, dtype = np.float32)
+        stats.update(read_tile(band, x, y, tw, th, buffer))
+
+    return stats.result()
+
+#%% STATISTICS CACHE
+
+# Function to get the sidecar cache file of a product ("scene.dim" ->
+# "scene.stats.json"):
+def stats_cache_path(product_path):
+    return os.path.splitext(str(product_path))[0] + '.stats.json'
+
+# Function to identify the file holding a band: the ENVI raster of a
+# BEAM-DIMAP product ("scene.data/<band>.img") or, if there is none (as in
+# '.zip' products), the product file itself. The band of a virtual subset
+# ('.vdim') is the one of its parent product, within the subset window:
+def file_identity(product_path, band_name):
+
+    if is_virtual_subset(product_path):
+        subset = read_virtual_subset(product_path)
+        return dict(file_identity(subset['parent'], band_name),
+                    window = subset['window'])
+
+    product_path = os.path.abspath(str(product_path))
+    image = os.path.join(os.path.splitext(product_path)[0] + '.data',
+                         band_name + '.img')
+    path = image if os.path.exists(image) else product_path
+    status = os.stat(path)
+
+    return {'path': path, 'size': status.st_size, 'mtime': status.st_mtime}
+
+# Function to read the cache of a product (an empty one if missing or broken):
+def load_stats_cache(product_path):
+    try:
+        with open(stats_cache_path(product_path)) as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+# Function to write the cache of a product. It is written to a temporary file
+# first, so a crash never leaves a half-written cache:
+def save_stats_cache(product_path, cache):
+    path = stats_cache_path(product_path)
+    temporary = path + '.%d.tmp' % os.getpid()
+    with open(temporary, 'w') as cache_file:
+        json.dump(cache, cache_file, indent = 1)
+    os.replace(temporary, path)
+
+# Function to get the statistics of a band, from the cache when the band file
+# has not changed since they were computed (and every requested percentile is
+# there), or by scanning the band tile by tile otherwise. Without a product
+# path, it just computes them:
+def get_band_stats(band, w, h, product_path = None, band_name = None,
+                   percentiles = PERCENTILES, nodata = None, **kwargs):
+
+    if product_path is None:
+        return compute_band_stats(band, w, h, percentiles, nodata, **kwargs)
+
+    band_name = band_name or str(band.getName())
+    key = band_name if nodata is None else '%s@nodata=%g' % (band_name, nodata)
+    identity = file_identity(product_path, band_name)
+
+    cache = load_stats_cache(product_path)
+    entry = cache.get(key)
+    if entry and entry['identity'] == identity and \
+            all(percentile_key(p) in entry['stats']['percentiles']
+                for p in percentiles):
+        return entry['stats']
+
+    percentiles = sorted(set(percentiles) | set(PERCENTILES))
+    stats = compute_band_stats(band, w, h, percentiles, nodata, **kwargs)
+
+    cache = load_stats_cache(product_path)
+    cache[key] = {'identity': identity, 'stats': stats}
+    save_stats_cache(product_path, cache)
+
+    return stats
+
+#%% DPSVI REFERENCE VALUE
+
+# Function to get the VV reference value used by DPSVI. vv_max_param can be:
+# an int or float (VV max by analyst); "null" (the non-NaN max value from VV
+# band); or a percentile as "p99" (a robust VV max, less sensitive to strong
+# scatterers). No-data pixels (the terrain-correction border, see
+# "band_nodata") are kept out of the statistics, computed tile by tile and
+# cached next to the product (if its path is given), so the next runs do not
+# scan VV again:
+def get_vv_max(VV, w, h, vv_max_param = "null", product_path = None):
+
+    if (type(vv_max_param) == int) or (type(vv_max_param) == float):
+        VV_max = float(vv_max_param)
+        print("Using VV max by analyst = ", VV_max)
+        return VV_max
+
+    percentile = None
+    if str(vv_max_param).startswith('p'):
+        percentile = float(vv_max_param[1:])
+
+    stats = get_band_stats(VV, w, h, product_path, 'Sigma0_VV',
+                           percentiles = (100 if percentile is None
+                                          else percentile,),
+                           nodata = band_nodata(VV))
+
+    if percentile is None:
+        VV_max = stats['max']
+        print("Max non-NaN in VV band: ", VV_max, "and the code is employing it.")
+    else:
+        VV_max = stats['percentiles'][percentile_key(percentile)]
+        print("Percentile", percentile, "of VV band: ", VV_max,
+              "and the code is employing it.")
+
+    return float(VV_max)
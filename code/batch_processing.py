@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to process a batch of scenes, either one after the other or
+spread among worker processes (one scene per worker at a time).
+    Inputs: a function processing one scene (given its file path) and the
+    list of scene files;
+    Output: a report (status, elapsed time and error message) per scene,
+    printed as a table at the end of the batch.
+
+A scene raising an error, or even killing its worker process, is reported as
+failed and the batch goes on with the other scenes.
+
+WARNING:
+    Workers are started with the "spawn" method (a forked process would share
+    the parent's Java Virtual Machine, used by snappy), so the scene function
+    must be importable by the workers: run the script from a terminal
+    (python Script_05_...py --jobs 8), not from an interactive console.
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and processes:
+import os
+# To known processing time:
+import time
+# To report errors without stopping the batch:
+import traceback
+# Queues of scenes waiting for a worker:
+from collections import deque
+# Pool of worker processes:
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+#%% DEFAULT PARAMETERS
+
+# Memory (MB) each worker may use for its arrays (tile buffers and index
+# temporaries), besides the memory of its own Java Virtual Machine (set in
+# snappy's "snappy.ini", "java_max_mem"):
+WORKER_MEMORY_MB = 4096
+
+#%% DEFINING FUNCTIONS
+
+# Function to get the number of workers: the requested jobs, limited by the
+# number of workers fitting within the memory budget (MB) of the batch:
+def worker_count(jobs, memory_budget_mb = None,
+                 worker_memory_mb = WORKER_MEMORY_MB):
+
+    jobs = max(1, int(jobs))
+
+    if memory_budget_mb is not None:
+        fitting = max(1, int(memory_budget_mb // worker_memory_mb))
+        if fitting < jobs:
+            print("Memory budget of %d MB fits %d workers of %d MB (not %d)."
+                  % (memory_budget_mb, fitting, worker_memory_mb, jobs))
+        jobs = min(jobs, fitting)
+
+    return jobs
+
+# Function to process a single scene, catching any error. It returns the scene
+# report:
+def run_scene(function, scene, args = (), kwargs = None):
+
+    start_time = time.perf_counter()
+    report = {'scene': scene, 'pid': os.getpid()}
+
+    try:
+        report['result'] = function(scene, *args, **(kwargs or {}))
+        report['status'] = 'ok'
+    except Exception as error:
+        report['status'] = 'failed'
+        report['error'] = "%s: %s" % (type(error).__name__, error)
+        traceback.print_exc()
+
+    report['seconds'] = time.perf_counter() - start_time
+
+    return report
+
+# Function to print the progress of the batch after each scene:
+def print_progress(report, done, total):
+    print("[%d/%d] %s %s in %.1f s%s"
+          % (done, total, os.path.basename(str(report['scene'])),
+             report['status'], report['seconds'],
+             (" (" + report['error'] + ")") if 'error' in report else ""))
+
+# Function to run the scenes on a pool of worker processes. When a worker
+# dies (e.g. the JVM crashes on a corrupt scene), the pool breaks and every
+# scene running at that time is lost: they are run again one at a time, so
+# only the scene actually killing its worker is reported as failed:
+def run_pool(function, scenes, args, kwargs, jobs):
+
+    context = multiprocessing.get_context('spawn')
+    queue = deque(scenes)
+    suspects = deque()
+    reports = []
+
+    while queue or suspects:
+
+        solo = bool(suspects)
+        source = suspects if solo else queue
+        width = 1 if solo else jobs
+        in_flight = {}
+        lost = []
+
+        with ProcessPoolExecutor(max_workers = width,
+                                 mp_context = context) as pool:
+
+            while (source or in_flight) and not lost:
+
+                while source and len(in_flight) < width:
+                    scene = source.popleft()
+                    future = pool.submit(run_scene, function, scene, args, kwargs)
+                    in_flight[future] = scene
+
+                done, _ = wait(in_flight, return_when = FIRST_COMPLETED)
+
+                for future in done:
+                    scene = in_flight.pop(future)
+                    try:
+                        reports.append(future.result())
+                        print_progress(reports[-1], len(reports), len(scenes))
+                    except BrokenProcessPool:
+                        lost.append(scene)
+
+            lost.extend(in_flight.values())
+
+        for scene in lost:
+            if solo:
+                reports.append({'scene': scene, 'status': 'failed',
+                                'error': 'worker process died',
+                                'seconds': float('nan')})
+                print_progress(reports[-1], len(reports), len(scenes))
+            else:
+                suspects.append(scene)
+
+    return reports
+
+# Function to print the final report of a batch, with one line per scene and
+# the total time:
+def print_report(reports, elapsed):
+
+    print("\n%-70s %-7s %10s" % ("Scene", "Status", "Seconds"))
+    for report in reports:
+        print("%-70s %-7s %10.1f" % (os.path.basename(str(report['scene']))[:70],
+                                      report['status'], report['seconds']))
+
+    ok = [r for r in reports if r['status'] == 'ok']
+    busy = sum(r['seconds'] for r in ok)
+    print("\n%d scenes: %d ok, %d failed." % (len(reports), len(ok),
+                                               len(reports) - len(ok)))
+    print("Wall time: %.1f s; scene time: %.1f s (%.2fx)."
+          % (elapsed, busy, busy / elapsed if elapsed else 0))
+
+    for report in reports:
+        if report['status'] != 'ok':
+            print("FAILED %s: %s" % (report['scene'], report.get('error')))
+
+# The following function is the batch runner itself. It calls
+# function(scene, *args, **kwargs) for each scene, in this process when
+# jobs = 1, or on a pool of worker processes otherwise:
+def run_scenes(function, scenes, args = (), kwargs = None, jobs = 1,
+               memory_budget_mb = None, worker_memory_mb = WORKER_MEMORY_MB):
+
+    scenes = list(scenes)
+    jobs = min(worker_count(jobs, memory_budget_mb, worker_memory_mb),
+               max(1, len(scenes)))
+    start_time = time.perf_counter()
+
+    if jobs == 1:
+        reports = []
+        for scene in scenes:
+            reports.append(run_scene(function, scene, args, kwargs))
+            print_progress(reports[-1], len(reports), len(scenes))
+    else:
+        print("Processing %d scenes on %d workers..." % (len(scenes), jobs))
+        reports = run_pool(function, scenes, args, kwargs, jobs)
+
+    print_report(reports, time.perf_counter() - start_time)
+
+    return reports
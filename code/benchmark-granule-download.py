@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to check the granule download manager (granule_download.py)
+against a local HTTP server standing in for ASF, and to compare its rate
+with sequential downloads.
+    Inputs: nothing (synthetic granules, served from a temporary directory);
+    Outputs: the checks passed (resumed transfers, checksums, skipped files)
+    and the download time and rate for each number of concurrent transfers.
+
+The server answers HTTP Range requests (206 partial content), limits the rate
+of each connection (as ASF's servers do, so concurrent transfers are faster
+than a single one) and can drop the first connection of each granule after
+some bytes, to be resumed.
+
+Checks:
+    - every granule is downloaded whole (MD5 checked), although the first
+      connection of each one is dropped half-way, and the bytes resumed are
+      not received twice;
+    - a second run skips every granule (complete already);
+    - a granule with a wrong checksum is downloaded again and reported as
+      failed, leaving no file with its name;
+    - a server ignoring the Range header restarts the file.
+
+Usage:
+    python benchmark-granule-download.py
+    python benchmark-granule-download.py --granules 8 --size 32 \
+        --connection-rate 8 --transfers 1,2,4,8
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+import shutil
+import tempfile
+# For reading the command line options:
+import argparse
+# To known download times, and to limit the rate of the server:
+import time
+# For the MD5 checksums:
+import hashlib
+# The local HTTP server (in a thread):
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+# Granule download manager:
+from granule_download import download_granules, part_path
+
+#%% LOCAL SERVER
+
+# The following class answers the GET requests of the local server: the
+# granule files, whole or from the requested byte on ("Range: bytes=n-"):
+class GranuleHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+
+        server = self.server
+        path = os.path.join(server.directory, os.path.basename(self.path))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        size = os.path.getsize(path)
+        start = 0
+        requested = self.headers.get('Range')
+        if requested and server.ranges:
+            start = int(requested.split('=')[1].split('-')[0])
+            if start >= size:
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d'
+                             % (start, size - 1, size))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(size - start))
+        self.end_headers()
+
+        with server.lock:
+            drop = server.drops.pop(os.path.basename(path), None)
+
+        chunk = 64 * 1024
+        sent = 0
+        with open(path, 'rb') as granule_file:
+            granule_file.seek(start)
+            while True:
+                data = granule_file.read(chunk)
+                if not data:
+                    break
+                if drop is not None and sent + len(data) > drop:
+                    # Dropped connection, part of the granule sent:
+                    self.wfile.write(data[:drop - sent])
+                    with server.lock:
+                        server.sent += drop - sent
+                    self.close_connection = True
+                    return
+                self.wfile.write(data)
+                sent += len(data)
+                with server.lock:
+                    server.sent += len(data)
+                if server.connection_rate:
+                    time.sleep(len(data) / server.connection_rate)
+
+# Function to start the local server (in a thread) serving a directory. The
+# rate of each connection is limited to "connection_rate" (bytes/s), and the
+# first connection of each granule in "drops" is dropped after the given
+# bytes. It returns the server and its base URL:
+def start_server(directory, connection_rate = None, drops = None,
+                 ranges = True):
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GranuleHandler)
+    server.daemon_threads = True
+    server.directory = directory
+    server.connection_rate = connection_rate
+    server.drops = dict(drops or {})
+    server.ranges = ranges
+    server.sent = 0
+    server.lock = threading.Lock()
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    return server, 'http://127.0.0.1:%d/' % server.server_address[1]
+
+# Function to write synthetic granules (random bytes, sizes in MB, a little
+# different from one another) and to get their downloads:
+def make_granules(directory, count, size_mb, seed = 0):
+
+    downloads = []
+    for i in range(count):
+        data = os.urandom(int(size_mb * 1024 ** 2 * (1 + 0.1 * (i % 3))))
+        name = 'S1A_IW_GRDH_1SDV_%03d.zip' % i
+        with open(os.path.join(directory, name), 'wb') as granule_file:
+            granule_file.write(data)
+        downloads.append({'url': None, 'file': name, 'size': len(data),
+                          'md5': hashlib.md5(data).hexdigest()})
+
+    return downloads
+
+# Function to point the downloads to a server:
+def served(downloads, url):
+    return [dict(download, url = url + download['file'])
+            for download in downloads]
+
+#%% CHECKS
+
+def check_downloads(directory, downloads, outpath, transfers):
+
+    # Dropped connections, resumed:
+    drops = {download['file']: download['size'] // 2
+             for download in downloads}
+    server, url = start_server(directory, drops = drops)
+    reports = download_granules(served(downloads, url), outpath,
+                                transfers = transfers, backoff = 0.01,
+                                probe_seconds = 0.2)
+    total = sum(download['size'] for download in downloads)
+    assert all(report['status'] == 'ok' for report in reports), reports
+    assert all(report['attempts'] == 2 for report in reports), reports
+    assert server.sent == total, (server.sent, total)
+    for download in downloads:
+        path = os.path.join(outpath, download['file'])
+        with open(path, 'rb') as granule_file:
+            assert hashlib.md5(granule_file.read()).hexdigest() == \
+                download['md5']
+        assert not os.path.exists(part_path(path))
+    print("OK: %d granules resumed after a dropped connection, %d bytes "
+          "sent for %d." % (len(downloads), server.sent, total))
+
+    # Complete files skipped:
+    sent = server.sent
+    reports = download_granules(served(downloads, url), outpath,
+                                transfers = transfers)
+    assert all(report['status'] == 'skipped' for report in reports)
+    assert server.sent == sent
+    print("OK: complete granules skipped.")
+    server.shutdown()
+
+    # Wrong checksum:
+    server, url = start_server(directory)
+    wrong = dict(served(downloads[:1], url)[0], md5 = '0' * 32,
+                 file = downloads[0]['file'])
+    reports = download_granules([wrong], outpath + '-wrong', retries = 1,
+                                backoff = 0.01)
+    assert reports[0]['status'] == 'failed' and reports[0]['attempts'] == 2
+    assert not os.listdir(outpath + '-wrong')
+    print("OK: corrupt granule downloaded again, reported as failed.")
+    server.shutdown()
+
+    # Range ignored by the server:
+    path = os.path.join(outpath + '-ranges', downloads[0]['file'])
+    os.makedirs(os.path.dirname(path))
+    with open(part_path(path), 'wb') as part_file:
+        part_file.write(b'x' * 1000)
+    server, url = start_server(directory, ranges = False)
+    reports = download_granules(served(downloads[:1], url),
+                                outpath + '-ranges')
+    assert reports[0]['status'] == 'ok', reports
+    print("OK: granule restarted by a server ignoring ranges.")
+    server.shutdown()
+
+#%% RATE
+
+def run_rate(directory, downloads, outpath, transfers, connection_rate):
+
+    server, url = start_server(directory, connection_rate)
+    shutil.rmtree(outpath, ignore_errors = True)
+    start_time = time.perf_counter()
+    download_granules(served(downloads, url), outpath,
+                      transfers = transfers, probe_seconds = 0.5)
+    elapsed = time.perf_counter() - start_time
+    server.shutdown()
+
+    total = sum(download['size'] for download in downloads)
+    print("%d transfer(s): %.2f s, %.1f MB/s"
+          % (transfers, elapsed, total / 1024 ** 2 / elapsed))
+
+    return elapsed
+
+#%% RUNNING
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = __doc__.split('\n')[3])
+    parser.add_argument('--granules', type = int, default = 6)
+    parser.add_argument('--size', type = float, default = 4,
+                        help = "size of the granules (MB)")
+    parser.add_argument('--connection-rate', type = float, default = 8,
+                        help = "rate of each connection (MB/s)")
+    parser.add_argument('--transfers', default = '1,2,4')
+    options = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix = 'granules-')
+    try:
+        served_dir = os.path.join(directory, 'served')
+        os.makedirs(served_dir)
+        downloads = make_granules(served_dir, options.granules, options.size)
+
+        check_downloads(served_dir, downloads,
+                        os.path.join(directory, 'checks'),
+                        max(int(k) for k in options.transfers.split(',')))
+
+        print("\nRate (%d granules, %.1f MB/s per connection):"
+              % (options.granules, options.connection_rate))
+        for transfers in [int(k) for k in options.transfers.split(',')]:
+            run_rate(served_dir, downloads,
+                     os.path.join(directory, 'rate'), transfers,
+                     options.connection_rate * 1024 ** 2)
+    finally:
+        shutil.rmtree(directory, ignore_errors = True)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to check the run manifest of Script 05 (run_manifest.py), which
+decides the indices a rerun skips: an output is only skipped while it is
+up to date.
+    Inputs: none (a synthetic scene and index outputs are written to a
+    temporary directory);
+    Outputs: the result of each check (exit status 1 when one fails).
+
+The scene is a BEAM-DIMAP product in name only (a '.dim' file and the
+Sigma0_VH and Sigma0_VV rasters in its '.data' directory, filled with random
+bytes): the manifest only looks at the paths, sizes and modification times of
+the files, never at their contents. The outputs are recorded as Script 05
+records them (one product per index), and each check changes one thing the
+outputs depend on:
+    - the modification time of an input raster (all the outputs are stale);
+    - the fingerprint of a formula (the outputs computed with it are stale);
+    - DPSVI's vv_max_param (only DPSVI is stale);
+    - the AOI the indices are computed within (all the outputs are stale);
+    - a band raster of an output removed (that output is stale);
+    - the outputs moved into the scene product (stale, unless relocated).
+
+Usage:
+    python benchmark-run-manifest.py
+    python benchmark-run-manifest.py --indices CR,DPSVI,Pol --keep
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+import sys
+import shutil
+import tempfile
+# For reading the command line options:
+import argparse
+# Fast arrays computation (AOI polygons):
+import numpy as np
+# Run manifest (the module checked here):
+from run_manifest import INPUT_BANDS, RunManifest
+# Formulas of the indices (one is changed to check the fingerprint):
+import sar_vi_formulas
+from sar_vi_formulas import index_bands, plan
+# Hash of the AOI, as Script 05 records it (recipe_options):
+from aoi_windows import aoi_hash
+
+#%% DEFAULT PARAMETERS
+
+# Indices recorded (DPSVI is the one depending on vv_max_param, CR the one
+# whose formula is changed):
+INDICES = ('CR', 'DPRVIC', 'DPSVI', 'DPSVIm', 'Pol', 'RVIm', 'desc')
+
+# DPSVI's VV reference value of the records, and the one of a changed run:
+VV_MAX_PARAM = 'p99'
+OTHER_VV_MAX_PARAM = 'p95'
+
+# Formula changed to check the fingerprint:
+CHANGED_FORMULA = 'CR'
+
+#%% DEFINING FUNCTIONS
+
+# Function to write a file of random bytes:
+def write_file(path, size = 4096):
+    directory = os.path.dirname(path)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'wb') as output_file:
+        output_file.write(os.urandom(size))
+
+# Function to write a product (a '.dim' file and a raster per band in its
+# '.data' directory):
+def write_product(path, band_names):
+    write_file(path, 256)
+    data_dir = os.path.splitext(path)[0] + '.data'
+    for band_name in band_names:
+        write_file(os.path.join(data_dir, band_name + '.img'))
+
+# Function to get the output product of an index, as Script 05 names it:
+def output_path(outpath, scene, index):
+    name = os.path.splitext(os.path.basename(scene))[0]
+    return os.path.join(outpath, '%s_%s.dim' % (name, index))
+
+# Function to record the outputs of all the indices:
+def record_all(outpath, scene, indices, options = None):
+    manifest = RunManifest(outpath, scene)
+    for index in indices:
+        manifest.record(index, output_path(outpath, scene, index),
+                        VV_MAX_PARAM, 1.0, options)
+    return manifest
+
+# Function to compare the stale indices with the expected ones (a fresh
+# manifest is read from disk, as a rerun reads it):
+def check(name, outpath, scene, indices, expected, vv_max_param = VV_MAX_PARAM,
+          options = None):
+
+    stale = RunManifest(outpath, scene).stale(indices, vv_max_param, options)
+    expected = [index for index in indices if index in expected]
+
+    if stale != expected:
+        print("FAILED: %s: stale %s, expected %s" % (name, stale, expected))
+        return [name]
+
+    print("OK: %s: stale %s" % (name, stale or 'none'))
+    return []
+
+# A formula of the same inputs as the changed one, but another code (so
+# another fingerprint):
+def changed_formula(*inputs):
+    return inputs[0] - inputs[1] + 0.0
+
+#%% CHECKS
+
+# Function to run the checks over a scene in a directory, returning the
+# failed ones:
+def run_checks(directory, indices):
+
+    failures = []
+    scene = os.path.join(directory, 'S1A_IW_GRDH_synthetic.dim')
+    outpath = os.path.join(directory, 'indices')
+    scene_data = os.path.splitext(scene)[0] + '.data'
+
+    write_product(scene, INPUT_BANDS)
+    for index in indices:
+        write_product(output_path(outpath, scene, index),
+                      index_bands((index,)))
+
+    # Nothing recorded yet: everything is computed:
+    failures += check("no manifest", outpath, scene, indices, indices)
+
+    # Recorded and untouched: nothing is computed (but DPSVI with another VV
+    # reference value):
+    record_all(outpath, scene, indices)
+    failures += check("recorded", outpath, scene, indices, ())
+    failures += check("other vv_max_param", outpath, scene, indices,
+                      ('DPSVI',), OTHER_VV_MAX_PARAM)
+
+    # An input raster rewritten (a new modification time): every output is
+    # stale, and up to date again once recorded:
+    vv_image = os.path.join(scene_data, 'Sigma0_VV.img')
+    status = os.stat(vv_image)
+    os.utime(vv_image, (status.st_atime, status.st_mtime + 60))
+    failures += check("input mtime changed", outpath, scene, indices, indices)
+    record_all(outpath, scene, indices)
+    failures += check("recorded again", outpath, scene, indices, ())
+
+    # A formula changed: the outputs computed with it are stale:
+    inputs, function = sar_vi_formulas.FORMULAS[CHANGED_FORMULA]
+    sar_vi_formulas.FORMULAS[CHANGED_FORMULA] = (inputs, changed_formula)
+    try:
+        failures += check(
+            "formula %s changed" % CHANGED_FORMULA, outpath, scene, indices,
+            [index for index in indices
+             if CHANGED_FORMULA in plan(index_bands((index,)))])
+    finally:
+        sar_vi_formulas.FORMULAS[CHANGED_FORMULA] = (inputs, function)
+    failures += check("formula restored", outpath, scene, indices, ())
+
+    # An AOI (as recipe_options records it): every output is stale, and with
+    # another AOI or without masking it again:
+    square = np.array([[-46.0, -21.0], [-45.9, -21.0], [-45.9, -20.9],
+                       [-46.0, -20.9], [-46.0, -21.0]])
+    options = {'aoi': aoi_hash([[square]]), 'mask_aoi': False}
+    failures += check("AOI added", outpath, scene, indices, indices,
+                      options = options)
+    record_all(outpath, scene, indices, options)
+    failures += check("recorded with the AOI", outpath, scene, indices, (),
+                      options = options)
+    failures += check("AOI changed", outpath, scene, indices, indices,
+                      options = {'aoi': aoi_hash([[square + 0.01]]),
+                                 'mask_aoi': False})
+    failures += check("AOI masked", outpath, scene, indices, indices,
+                      options = dict(options, mask_aoi = True))
+    failures += check("AOI removed", outpath, scene, indices, indices)
+    record_all(outpath, scene, indices)
+
+    # A band raster of an output removed: that output is stale:
+    removed = indices[-1]
+    path = output_path(outpath, scene, removed)
+    band_name = index_bands((removed,))[-1]
+    os.remove(os.path.join(os.path.splitext(path)[0] + '.data',
+                           band_name + '.img'))
+    failures += check("%s of %s removed" % (band_name, removed), outpath,
+                      scene, indices, (removed,))
+    write_product(path, index_bands((removed,)))
+    record_all(outpath, scene, (removed,))
+
+    # The outputs moved into the scene product (as --append does): stale
+    # unless relocated, and up to date once relocated:
+    for index in indices:
+        path = output_path(outpath, scene, index)
+        data_dir = os.path.splitext(path)[0] + '.data'
+        for band_name in index_bands((index,)):
+            shutil.move(os.path.join(data_dir, band_name + '.img'),
+                        os.path.join(scene_data, band_name + '.img'))
+        shutil.rmtree(data_dir)
+        os.remove(path)
+    failures += check("outputs moved", outpath, scene, indices, indices)
+    manifest = RunManifest(outpath, scene)
+    for index in indices:
+        manifest.relocate(output_path(outpath, scene, index), scene)
+    failures += check("outputs relocated", outpath, scene, indices, ())
+
+    return failures
+
+#%% RUNNING THE CHECKS
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = __doc__.split('\n')[2])
+    parser.add_argument('--indices', default = ','.join(INDICES),
+                        help = 'comma-separated indices to record')
+    parser.add_argument('--keep', action = 'store_true',
+                        help = 'keep the temporary directory')
+    options = parser.parse_args()
+
+    indices = tuple(options.indices.split(','))
+    directory = tempfile.mkdtemp(prefix = 'run-manifest-')
+    try:
+        failures = run_checks(directory, indices)
+    finally:
+        if options.keep:
+            print("Files kept in %s" % directory)
+        else:
+            shutil.rmtree(directory)
+
+    print("%d check(s) failed." % len(failures) if failures
+          else "All checks passed.")
+    sys.exit(1 if failures else 0)
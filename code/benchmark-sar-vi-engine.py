@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to benchmark the tiled block engine (sar_vi_engine.py) against
+the former line by line processing of Script 05, and its scaling with the
+number of threads computing the tiles.
+    Inputs: a Sentinel-1 GRD preprocessed product ('.dim'), or nothing to use
+    a synthetic full-size scene (no snappy needed);
+    Outputs: elapsed time, number of readPixels calls and throughput
+    (Mpixel/s) for each tile size and number of threads.
+
+With --memory, each case runs in its own process, once with the in-place
+kernels (preallocated float32 buffers) and once with kernels written as plain
+NumPy expressions (a new array per operation, as the former Script 05
+functions), reporting the memory allocated by NumPy (peak, and total over the
+scene) and the peak resident memory of the process.
+
+Usage:
+    python benchmark-sar-vi-engine.py --product path_to/scene.dim
+    python benchmark-sar-vi-engine.py --width 25000 --height 16700
+    python benchmark-sar-vi-engine.py --tile-heights 512 --threads 1,2,4,8 \
+        --indices CR,DPRVIC,DPSVIm,Pol,RVIm,desc
+    python benchmark-sar-vi-engine.py --memory --tile-heights 512 \
+        --indices CR,DPRVIC,DPSVIm,Pol,RVIm,desc
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For reading the command line options:
+import argparse
+# To known processing time:
+import time
+# To measure the memory allocated by each case (in its own process):
+import resource
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+# Fast arrays computation:
+import numpy as np
+# Tiled block engine:
+from sar_vi_engine import process_tiles
+# Index formulas (kernels computing several indices at once):
+from sar_vi_formulas import index_bands, make_kernel
+
+#%% STAND-IN BANDS
+
+# Band holding a small block of gamma-distributed backscatter, repeated along
+# the lines, so a full-size scene fits in memory. It counts the readPixels
+# calls, as each one would be a JNI round-trip in snappy:
+class SyntheticBand:
+
+    def __init__(self, w, h, mean, seed, pattern_lines = 256):
+        rng = np.random.default_rng(seed)
+        self.w = w
+        self.h = h
+        self.pattern = rng.gamma(4.0, mean / 4.0,
+                                 (pattern_lines, w)).astype(np.float32)
+        self.calls = 0
+
+    def readPixels(self, x, y, w, h, array):
+        self.calls += 1
+        lines = np.arange(y, y + h) % self.pattern.shape[0]
+        out = array.reshape(h, w)
+        np.take(self.pattern[:, x:x + w], lines, axis = 0, out = out)
+        return array
+
+# Band discarding whatever is written, so the benchmark measures reading and
+# computing only:
+class NullBand:
+
+    def __init__(self):
+        self.calls = 0
+
+    def writePixels(self, x, y, w, h, array):
+        self.calls += 1
+
+#%% ALLOCATING KERNELS
+
+# Indices written as plain NumPy expressions, as in the former Script 05
+# functions: every operation allocates a new array (in float64 for the
+# np.sqrt(2) and 180/np.pi constants under NumPy 2). They are the reference of
+# the --memory comparison:
+def allocating_formulas(VH, VV, VV_max):
+
+    VV_dB = np.multiply(10, np.log10(VV))
+    VH_dB = np.multiply(10, np.log10(VH))
+    q = np.divide(VH, VV)
+    q[q >= 1] = 1
+    p1 = np.divide(1, (1 + q))
+    p2 = np.divide(q, (1 + q))
+
+    return {'CR': lambda: np.divide(VV_dB, VH_dB),
+            'DPRVIC': lambda: np.divide(np.multiply(q, (q + 3)),
+                                        np.multiply((q + 1), (q + 1))),
+            'm_c': lambda: np.divide((1 - q), (1 + q)),
+            'H_c': lambda: -1 * (np.multiply(p1, np.log2(p1)) +
+                                 np.multiply(p2, np.log2(p2))),
+            'Theta_c': lambda: np.arctan(((1 - q)**2) / (1 - q + q**2)) *
+                               (180 / np.pi),
+            'DPSVI': lambda: np.multiply(np.multiply(
+                np.divide(np.add(np.subtract(VV_max, VV), VH), np.sqrt(2)),
+                np.divide(np.add(VV, VH), VV)), VH),
+            'DPSVIm': lambda: np.divide(np.add(np.square(VV),
+                                               np.multiply(VV, VH)),
+                                        np.sqrt(2)),
+            'Pol': lambda: np.divide(np.subtract(VH_dB, VV_dB),
+                                     np.add(VH_dB, VV_dB)),
+            'RVIm': lambda: np.divide(np.multiply(4, VH_dB),
+                                      np.add(VV_dB, VH_dB))}
+
+# Function to build a kernel computing the requested bands with the
+# allocating formulas:
+def make_allocating_kernel(bands, VV_max):
+    def kernel(VH, VV):
+        formulas = allocating_formulas(VH, VV, VV_max)
+        return [formulas[band]() for band in bands]
+    return kernel
+
+#%% DEFINING FUNCTIONS
+
+# Function to time the engine over a (VH, VV) pair for a given tile size and
+# number of threads:
+def run_case(VH, VV, w, h, kernel, n_outputs, tile_height, tile_width,
+             threads = 1):
+
+    targets = [NullBand() for _ in range(n_outputs)]
+    calls_before = getattr(VV, 'calls', 0)
+
+    start_time = time.perf_counter()
+    n_tiles = process_tiles((VH, VV), targets, kernel, w, h,
+                            tile_height, tile_width, threads)
+    elapsed = time.perf_counter() - start_time
+
+    return {'tile_height': tile_height,
+            'tile_width': tile_width,
+            'threads': threads,
+            'tiles': n_tiles,
+            'read_calls': getattr(VV, 'calls', 0) - calls_before,
+            'seconds': elapsed,
+            'mpixel_s': w * h / elapsed / 1e6}
+
+# Function to get the (VH, VV) bands, either from a snappy product or from
+# synthetic stand-ins:
+def open_bands(args):
+
+    if args.product:
+        from snappy import ProductIO
+        product = ProductIO.readProduct(args.product)
+        w = product.getSceneRasterWidth()
+        h = product.getSceneRasterHeight()
+        return product.getBand('Sigma0_VH'), product.getBand('Sigma0_VV'), w, h
+
+    w, h = args.width, args.height
+    return (SyntheticBand(w, h, 0.02, seed = 1),
+            SyntheticBand(w, h, 0.1, seed = 2), w, h)
+
+# Function to run a case in a new process, tracing NumPy allocations. The
+# total allocated memory is the sum of the traced memory growth between
+# allocations, sampled by a tracing hook on each kernel call:
+def run_memory_case(args, kernel_kind, tile_height, threads):
+
+    VH, VV, w, h = open_bands(args)
+    bands = index_bands(args.indices.split(','))
+    if kernel_kind == 'allocating':
+        kernel = make_allocating_kernel(bands, args.vv_max)
+    else:
+        kernel = make_kernel(bands, parameters = {'VV_max': args.vv_max})
+
+    calls = []
+    def traced(*blocks, **out):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        results = kernel(*blocks, **out)
+        calls.append(tracemalloc.get_traced_memory()[1] - before)
+        return results
+    traced.fills_out = getattr(kernel, 'fills_out', False)
+
+    tracemalloc.start()
+    with np.errstate(all = 'ignore'):
+        case = run_case(VH, VV, w, h, traced, len(bands), tile_height,
+                        args.tile_width, threads)
+    case['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+
+    case['kernel'] = kernel_kind
+    case['kernel_mb_per_tile'] = max(calls) / 2**20
+    case['kernel_mb_total'] = sum(calls) / 2**20
+    # ru_maxrss is in KB on Linux:
+    case['peak_rss_mb'] = resource.getrusage(
+        resource.RUSAGE_SELF).ru_maxrss / 1024
+    return case
+
+# Function to compare the allocating and in-place kernels, each case in its
+# own process (the peak resident memory of a process never goes down):
+def run_memory_benchmark(args):
+
+    context = multiprocessing.get_context('spawn')
+    for tile_height in [int(k) for k in args.tile_heights.split(',')]:
+        for threads in [int(k) for k in args.threads.split(',')]:
+            for kind in ('allocating', 'in-place'):
+                with ProcessPoolExecutor(max_workers = 1,
+                                         mp_context = context) as pool:
+                    case = pool.submit(run_memory_case, args, kind,
+                                       tile_height, threads).result()
+                print("tile %5s  threads: %2d  %-10s  %8.2f s  "
+                      "kernel: %8.1f MB/tile %10.1f MB/scene  "
+                      "traced peak: %8.1f MB  peak RSS: %8.1f MB"
+                      % (tile_height, threads, kind, case['seconds'],
+                         case['kernel_mb_per_tile'], case['kernel_mb_total'],
+                         case['traced_peak_mb'], case['peak_rss_mb']))
+
+#%% RUNNING THE BENCHMARK
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = __doc__.split('\n')[2])
+    parser.add_argument('--product', default = None,
+                        help = "BEAM-DIMAP product with Sigma0_VV/VH bands")
+    parser.add_argument('--width', type = int, default = 25000)
+    parser.add_argument('--height', type = int, default = 16700)
+    parser.add_argument('--tile-heights', default = '1,64,256,512,1024',
+                        help = "comma separated; 1 is the former per-line path")
+    parser.add_argument('--tile-width', type = int, default = None)
+    parser.add_argument('--threads', default = '1',
+                        help = "comma separated numbers of threads")
+    parser.add_argument('--indices', default = 'CR',
+                        help = "comma separated indices (see sar_vi_formulas)")
+    parser.add_argument('--vv-max', type = float, default = 3.0,
+                        help = "DPSVI's VV reference value")
+    parser.add_argument('--memory', action = 'store_true',
+                        help = "compare the memory of allocating and "
+                               "in-place kernels")
+    args = parser.parse_args()
+
+    if args.memory:
+        run_memory_benchmark(args)
+        raise SystemExit
+
+    VH, VV, w, h = open_bands(args)
+    bands = index_bands(args.indices.split(','))
+    kernel = make_kernel(bands, parameters = {'VV_max': args.vv_max})
+    print("Raster size: %d x %d pixels; bands: %s" % (w, h, ', '.join(bands)))
+
+    baseline = None
+    for tile_height in [int(k) for k in args.tile_heights.split(',')]:
+        for threads in [int(k) for k in args.threads.split(',')]:
+            with np.errstate(all = 'ignore'):
+                case = run_case(VH, VV, w, h, kernel, len(bands), tile_height,
+                                args.tile_width, threads)
+            baseline = baseline or case['seconds']
+            print("tile %5s x %-6s  threads: %2d  tiles: %6d  reads: %6d  "
+                  "%8.2f s  %7.2f Mpixel/s  speed-up: %5.2fx"
+                  % (tile_height, case['tile_width'] or w, threads,
+                     case['tiles'], case['read_calls'], case['seconds'],
+                     case['mpixel_s'], baseline / case['seconds']))
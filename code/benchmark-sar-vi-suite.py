@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to track the performance of the SAR vegetation indices (Script
+05) from change to change: a benchmark suite over synthetic Sentinel-1 GRD
+scenes, compared against stored baselines.
+    Inputs: a scene size (a preset or --width/--height), the indices to run
+    and, optionally, a baseline file from a former run;
+    Outputs: for each index (as do_cr, do_dprvic, ...) and for the fused
+    computation (do_fused): throughput (Mpixel/s of the scene), peak memory
+    (resident and allocated by NumPy) and I/O (bytes read and written); and
+    the comparison with the baseline (exit status 1 when a case is worse than
+    the threshold).
+
+The scenes are made by a local stand-in for the product reader (no snappy, no
+files): gamma-distributed Sigma0 VV and VH, within a tilted swath surrounded
+by no-data borders (0.0), as terrain-corrected GRD scenes are. The cases run
+the same path as "do_indices" (validity index, formula kernels and the tiled
+block engine), the index bands being discarded (counted) instead of written.
+Each case runs in its own process, so the peak resident memory is its own.
+
+Baselines are machine dependent: save them once (--save-baseline) on the
+machine the suite runs on, and compare the following runs against them.
+
+Usage:
+    python benchmark-sar-vi-suite.py --save-baseline
+    python benchmark-sar-vi-suite.py --threshold 0.15
+    python benchmark-sar-vi-suite.py --scene iw-grd-20m --threads 4
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+import sys
+# For reading the command line options:
+import argparse
+# For reading and writing the baselines:
+import json
+# To known processing time:
+import time
+# To measure the memory of each case (in its own process):
+import resource
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+# Fast arrays computation:
+import numpy as np
+# Tiled block engine:
+from sar_vi_engine import TILE_HEIGHT, iter_tiles, process_tiles
+# Index of the tiles with data (no-data tiles are not computed):
+from tile_validity import NODATA, build_validity_index
+# Index formulas (kernels computing several indices at once):
+from sar_vi_formulas import index_bands, make_kernel
+
+#%% DEFAULT PARAMETERS
+
+# Scene sizes (columns, lines) of terrain-corrected IW GRD scenes: at 10 m
+# (as Script 03 writes them), resampled to 20 m, and a farm AOI window:
+SCENES = {'iw-grd-10m': (25000, 16700),
+          'iw-grd-20m': (12500, 8350),
+          'farm-aoi': (1200, 900)}
+
+# Indices computed one by one (as do_cr, do_dprvic, do_desc, do_dpsvi,
+# do_dpsvim, do_pol and do_rvim), and together (as do_fused):
+INDICES = ('CR', 'DPRVIC', 'desc', 'DPSVI', 'DPSVIm', 'Pol', 'RVIm')
+FUSED_INDICES = ('CR', 'DPRVIC', 'DPSVI', 'DPSVIm', 'Pol', 'RVIm')
+
+# Mean Sigma0 (linear power) of the synthetic bands:
+SIGMA0_MEANS = {'Sigma0_VH': 0.02, 'Sigma0_VV': 0.1}
+
+# Fraction a case can be worse than its baseline (slower, or more memory or
+# I/O) before the suite fails:
+THRESHOLD = 0.2
+
+# Baseline file, next to this script:
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'benchmark-sar-vi-suite.baseline.json')
+
+#%% STAND-IN PRODUCT
+
+# The following class is a synthetic Sigma0 band. It holds a block of
+# gamma-distributed backscatter, repeated along the lines (so a full-size
+# scene fits in memory), within a swath tilted as the ground tracks of a
+# terrain-corrected scene; outside it (the borders) pixels are no-data. It
+# counts the bytes read, as the reader of a product on disk would:
+class StandInBand:
+
+    def __init__(self, name, w, h, mean, seed, border = 0.08,
+                 pattern_lines = 256):
+
+        rng = np.random.default_rng(seed)
+        self.name = name
+        self.w, self.h = w, h
+        self.pattern = rng.gamma(4.0, mean / 4.0,
+                                 (pattern_lines, w)).astype(np.float32)
+        # Swath edges: columns at the first and last lines (the swath is
+        # tilted by a tenth of the scene width), and no-data lines at the top
+        # and bottom:
+        self.left = (border * w, 0.1 * w + border * w)
+        self.right = ((0.9 - border) * w, (1.0 - border) * w)
+        self.top, self.bottom = int(border * h / 2), h - int(border * h / 2)
+        self.bytes_read = 0
+
+    def getName(self):
+        return self.name
+
+    def getRasterWidth(self):
+        return self.w
+
+    def getRasterHeight(self):
+        return self.h
+
+    def isNoDataValueUsed(self):
+        return True
+
+    def getNoDataValue(self):
+        return NODATA
+
+    def readPixels(self, x, y, w, h, array):
+
+        self.bytes_read += w * h * 4
+        lines = np.arange(y, y + h)
+        out = np.asarray(array)[:w * h].reshape(h, w)
+        np.take(self.pattern[:, x:x + w], lines % self.pattern.shape[0],
+                axis = 0, out = out)
+
+        # No-data out of the swath:
+        fraction = lines / max(self.h - 1, 1)
+        left = self.left[0] + fraction * (self.left[1] - self.left[0])
+        right = self.right[0] + fraction * (self.right[1] - self.right[0])
+        columns = np.arange(x, x + w)
+        outside = (columns[None, :] < left[:, None]) | \
+                  (columns[None, :] >= right[:, None]) | \
+                  ((lines < self.top) | (lines >= self.bottom))[:, None]
+        out[outside] = NODATA
+
+        return array
+
+# The following class is the synthetic scene (a product with the Sigma0_VH
+# and Sigma0_VV stand-in bands), with the snappy methods used by Script 05:
+class StandInProduct:
+
+    def __init__(self, w, h, seed = 0):
+        self.w, self.h = w, h
+        self.bands = {name: StandInBand(name, w, h, mean, seed + i)
+                      for i, (name, mean) in enumerate(SIGMA0_MEANS.items())}
+
+    def getName(self):
+        return 'S1A_IW_GRDH_synthetic'
+
+    def getSceneRasterWidth(self):
+        return self.w
+
+    def getSceneRasterHeight(self):
+        return self.h
+
+    def getBand(self, name):
+        return self.bands.get(name)
+
+    def getBandNames(self):
+        return list(self.bands)
+
+    def getFileLocation(self):
+        return None
+
+    def bytes_read(self):
+        return sum(band.bytes_read for band in self.bands.values())
+
+# Band discarding what is written (counting the bytes), so the writer does
+# not weigh on the results:
+class NullBand:
+
+    def __init__(self):
+        self.bytes_written = 0
+
+    def writePixels(self, x, y, w, h, array):
+        self.bytes_written += w * h * 4
+
+#%% DEFINING FUNCTIONS
+
+# Function to run a case (a list of indices computed in one pass, as
+# "do_indices" does) in this process: the validity index of the scene is
+# built, and the indices are computed over the tiles with data:
+def run_case(name, indices, w, h, tile_height, threads, vv_max):
+
+    product = StandInProduct(w, h)
+    VH = product.getBand('Sigma0_VH')
+    VV = product.getBand('Sigma0_VV')
+    bands = index_bands(indices)
+    targets = [NullBand() for _ in bands]
+
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    start_cpu = time.process_time()
+
+    with np.errstate(all = 'ignore'):
+        kernel = make_kernel(bands, ('VH', 'VV'), {'VV_max': vv_max})
+        validity = build_validity_index((VH, VV), w, h, NODATA)
+        n_tiles = process_tiles((VH, VV), targets, kernel, w, h, tile_height,
+                                None, threads, validity)
+
+    seconds = time.perf_counter() - start_time
+    cpu_seconds = time.process_time() - start_cpu
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    summary = validity.summary(list(iter_tiles(w, h, tile_height, None)))
+
+    return {'case': name,
+            'indices': list(indices),
+            'bands': len(bands),
+            'tiles': n_tiles,
+            'empty_tiles': summary['empty'],
+            'seconds': seconds,
+            'cpu_seconds': cpu_seconds,
+            'mpixel_s': w * h / seconds / 1e6,
+            'read_mb': product.bytes_read() / 2**20,
+            'written_mb': sum(band.bytes_written for band in targets) / 2**20,
+            'traced_peak_mb': traced_peak / 2**20,
+            # ru_maxrss is in KB on Linux:
+            'peak_rss_mb': resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+# Function to get the cases of the suite: each index on its own, and the
+# fused indices:
+def suite_cases(indices):
+
+    cases = [(index, (index,)) for index in indices]
+    fused = [index for index in FUSED_INDICES if index in indices]
+    if len(fused) > 1:
+        cases.append(('fused', tuple(fused)))
+
+    return cases
+
+# Function to run the cases, each one in its own process (the peak resident
+# memory of a process never goes down):
+def run_suite(cases, w, h, tile_height, threads, vv_max):
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name, indices in cases:
+        with ProcessPoolExecutor(max_workers = 1,
+                                 mp_context = context) as pool:
+            results.append(pool.submit(run_case, name, indices, w, h,
+                                       tile_height, threads, vv_max).result())
+        case = results[-1]
+        print("%-8s %8.2f s  %8.2f Mpixel/s  read: %8.1f MB  "
+              "written: %8.1f MB  traced peak: %7.1f MB  peak RSS: %7.1f MB"
+              % (name, case['seconds'], case['mpixel_s'], case['read_mb'],
+                 case['written_mb'], case['traced_peak_mb'],
+                 case['peak_rss_mb']))
+
+    return results
+
+# Function to get the key of a run in the baseline file (the baselines of
+# different scene sizes, tile sizes and threads are kept apart):
+def baseline_key(w, h, tile_height, threads):
+    return '%dx%d-tile%s-threads%d' % (w, h, tile_height, threads)
+
+# Function to compare the cases with their baselines. A case fails when its
+# throughput is lower, or its peak memory or I/O higher, than the baseline
+# by more than the threshold. It returns the failures:
+def compare(results, baselines, threshold = THRESHOLD):
+
+    failures = []
+    print("\n%-8s %12s %12s %12s %12s" % ('case', 'Mpixel/s', 'peak RSS',
+                                          'traced peak', 'I/O'))
+    for case in results:
+        baseline = baselines.get(case['case'])
+        if baseline is None or baseline['indices'] != case['indices']:
+            print("%-8s (no baseline)" % case['case'])
+            continue
+
+        io = case['read_mb'] + case['written_mb']
+        io_baseline = baseline['read_mb'] + baseline['written_mb']
+        changes = {'Mpixel/s': case['mpixel_s'] / baseline['mpixel_s'] - 1,
+                   'peak RSS': case['peak_rss_mb'] /
+                               baseline['peak_rss_mb'] - 1,
+                   'traced peak': case['traced_peak_mb'] /
+                                  max(baseline['traced_peak_mb'], 1.0) - 1,
+                   'I/O': io / max(io_baseline, 1.0) - 1}
+        print("%-8s %+11.1f%% %+11.1f%% %+11.1f%% %+11.1f%%"
+              % (case['case'], 100 * changes['Mpixel/s'],
+                 100 * changes['peak RSS'], 100 * changes['traced peak'],
+                 100 * changes['I/O']))
+
+        if changes['Mpixel/s'] < -threshold:
+            failures.append((case['case'], 'Mpixel/s', changes['Mpixel/s']))
+        for measure in ('peak RSS', 'traced peak', 'I/O'):
+            if changes[measure] > threshold:
+                failures.append((case['case'], measure, changes[measure]))
+
+    return failures
+
+#%% RUNNING THE BENCHMARK
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = __doc__.split('\n')[2])
+    parser.add_argument('--scene', choices = sorted(SCENES),
+                        default = 'iw-grd-10m',
+                        help = "size of the synthetic scene")
+    parser.add_argument('--width', type = int, default = None)
+    parser.add_argument('--height', type = int, default = None)
+    parser.add_argument('--indices', default = ','.join(INDICES),
+                        help = "comma separated indices (see sar_vi_formulas)")
+    parser.add_argument('--tile-height', type = int, default = TILE_HEIGHT)
+    parser.add_argument('--threads', type = int, default = 1)
+    parser.add_argument('--vv-max', type = float, default = 3.0,
+                        help = "DPSVI's VV reference value")
+    parser.add_argument('--baseline', default = BASELINE,
+                        help = "baseline file (JSON)")
+    parser.add_argument('--save-baseline', action = 'store_true',
+                        help = "store the results as the baseline")
+    parser.add_argument('--threshold', type = float, default = THRESHOLD,
+                        help = "fraction a case can be worse than its "
+                               "baseline")
+    args = parser.parse_args()
+
+    w, h = SCENES[args.scene]
+    w, h = args.width or w, args.height or h
+    key = baseline_key(w, h, args.tile_height, args.threads)
+
+    print("Synthetic scene: %d x %d pixels; tile height: %s; threads: %d"
+          % (w, h, args.tile_height, args.threads))
+    results = run_suite(suite_cases(args.indices.split(',')), w, h,
+                        args.tile_height, args.threads, args.vv_max)
+
+    try:
+        with open(args.baseline) as baseline_file:
+            baselines = json.load(baseline_file)
+    except (OSError, ValueError):
+        baselines = {}
+
+    if args.save_baseline:
+        baselines[key] = {case['case']: case for case in results}
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baselines, baseline_file, indent = 1)
+        print("\nBaseline saved: %s (%s)" % (args.baseline, key))
+        sys.exit(0)
+
+    if key not in baselines:
+        print("\nNo baseline for %s in %s (run with --save-baseline)"
+              % (key, args.baseline))
+        sys.exit(0)
+
+    failures = compare(results, baselines[key], args.threshold)
+    for case, measure, change in failures:
+        print("FAILED: %s %s %+.1f %% (threshold %.0f %%)"
+              % (case, measure, 100 * change, 100 * args.threshold))
+    sys.exit(1 if failures else 0)
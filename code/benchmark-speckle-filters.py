@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to check the NumPy speckle filters (speckle_filters.py) against
+reference outputs, and to compare their throughput with SNAP's Speckle-Filter
+operator.
+    Inputs: nothing (a synthetic speckled scene, no snappy needed), or a
+    BEAM-DIMAP product and, optionally, the same product filtered by SNAP
+    (e.g. with Script 03's "do_speckle_filtering" written to disk);
+    Outputs: the agreement of each filter with its reference (largest and
+    mean relative differences) and the throughput (Mpixel/s) for each number
+    of threads (and of SNAP's operator, with --snap). The exit status is 1
+    when a filter does not agree with its per-pixel reference or with itself
+    over other tiles (with --checks-only, only these checks are run).
+
+Agreement:
+    - with a straightforward per-pixel implementation of each filter (the
+      definitions of Lee (1981) and Lee et al. (2009), a window at a time)
+      over a small crop: they should agree to float32 precision;
+    - with the tiled filter over the whole crop: the tiles (and strips)
+      should not change the result (their halo holding the windows), and
+      neither should the tile height when Lee Sigma's 98th percentile is
+      estimated once for the band (from blocks spread over it, which should
+      be close to the 98th percentile of the whole band);
+    - with SNAP's output (--snap-reference), over the whole band: relative
+      differences and correlation are reported (the implementations differ in
+      details, e.g. SNAP's no-data handling at the borders).
+
+Usage:
+    python benchmark-speckle-filters.py
+    python benchmark-speckle-filters.py --checks-only
+    python benchmark-speckle-filters.py --width 25000 --height 2048 \
+        --threads 1,2,4,8
+    python benchmark-speckle-filters.py --product path_to/scene.dim \
+        --snap-reference path_to/scene_Spk.dim --band Sigma0_VV
+    python benchmark-speckle-filters.py --product path_to/scene.dim --snap
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For reading the command line options (and the exit status):
+import sys
+import argparse
+# To known processing time:
+import time
+# Fast arrays computation:
+import numpy as np
+# Speckle filters computed tile by tile with NumPy:
+from speckle_filters import (FILTERS, HALO, POINT_TARGET_COUNT,
+                             REFINED_LEE_SIDES, SIGMA_RANGES, FilteredBand,
+                             refined_lee_masks, sample_percentile)
+# BEAM-DIMAP products read with NumPy:
+from dimap_io import open_product
+
+#%% STAND-IN BANDS
+
+# Band holding a synthetic scene: fields of constant reflectivity (with
+# edges in every direction), bright point targets and a no-data border, with
+# single-look speckle (exponential intensities):
+class SyntheticBand:
+
+    def __init__(self, w, h, seed = 0, nodata_border = 16):
+
+        rng = np.random.default_rng(seed)
+        i, j = np.mgrid[0:h, 0:w]
+        reflectivity = 0.02 + 0.03 * ((i // 97 + j // 61) % 3) + \
+            0.04 * ((i + j) // 83 % 2)
+        self.array = (reflectivity * rng.exponential(1.0, (h, w))
+                      ).astype(np.float32)
+
+        targets = rng.integers(0, [h, w], (max(h * w // 20000, 1), 2))
+        for a, b in targets:
+            self.array[a:a + 2, b:b + 2] = 5.0
+
+        self.array[:nodata_border] = 0.0
+        self.array[:, :nodata_border] = 0.0
+        self.w, self.h = w, h
+
+    def readPixels(self, x, y, w, h, array):
+        np.asarray(array)[:w * h] = self.array[y:y + h, x:x + w].reshape(-1)
+        return array
+
+    def isNoDataValueUsed(self):
+        return True
+
+    def getNoDataValue(self):
+        return 0.0
+
+#%% REFERENCE IMPLEMENTATIONS (A WINDOW AT A TIME)
+
+# Function to get the MMSE estimate of a pixel from the pixels of its window:
+def reference_mmse(z, window, speckle):
+    mean, variance = window.mean(), window.var()
+    if variance == 0:
+        return mean
+    weight = ((variance - mean * mean * speckle ** 2) /
+              (1.0 + speckle ** 2)) / variance
+    return mean + min(max(weight, 0.0), 1.0) * (z - mean)
+
+# Lee Sigma of a (h, w) array, a pixel at a time (no-data pixels kept):
+def reference_lee_sigma(array, z98, nodata = 0.0, looks = 1, sigma = 0.9):
+
+    a1, a2, speckle = SIGMA_RANGES[looks][sigma]
+    padded = np.pad(array, HALO, constant_values = np.nan).astype(np.float64)
+    valid = np.isfinite(padded) & (padded != nodata)
+    h, w = array.shape
+    out = array.astype(np.float64)
+
+    def window(a, b, r):
+        block = padded[a - r:a + r + 1, b - r:b + r + 1]
+        return block, valid[a - r:a + r + 1, b - r:b + r + 1]
+
+    targets = np.zeros(padded.shape, dtype = bool)
+    for a in range(1, padded.shape[0] - 1):
+        for b in range(1, padded.shape[1] - 1):
+            block, ok = window(a, b, 1)
+            targets[a, b] = np.sum((block >= z98) & ok) >= POINT_TARGET_COUNT
+
+    for a in range(HALO, h + HALO):
+        for b in range(HALO, w + HALO):
+            if not valid[a, b] or targets[a - 1:a + 2, b - 1:b + 2].any():
+                continue
+            block, ok = window(a, b, 1)
+            prior = reference_mmse(padded[a, b], block[ok], 1 / np.sqrt(looks))
+            block, ok = window(a, b, 3)
+            ok = ok & (block >= a1 * prior) & (block <= a2 * prior)
+            out[a - HALO, b - HALO] = prior if not ok.any() else \
+                reference_mmse(padded[a, b], block[ok], speckle)
+
+    return out
+
+# Refined Lee of a (h, w) array, a pixel at a time (no-data pixels kept):
+def reference_refined_lee(array, nodata = 0.0, looks = 1):
+
+    masks = refined_lee_masks()
+    padded = np.pad(array, HALO, constant_values = np.nan).astype(np.float64)
+    valid = np.isfinite(padded) & (padded != nodata)
+    h, w = array.shape
+    out = array.astype(np.float64)
+
+    for a in range(HALO, h + HALO):
+        for b in range(HALO, w + HALO):
+            if not valid[a, b]:
+                continue
+            means = np.full((3, 3), np.nan)
+            for p in range(3):
+                for q in range(3):
+                    c, d = a + 2 * (p - 1), b + 2 * (q - 1)
+                    ok = valid[c - 1:c + 2, d - 1:d + 2]
+                    if ok.any():
+                        means[p, q] = padded[c - 1:c + 2, d - 1:d + 2][ok].mean()
+            gradients = [abs(means[1, 2] - means[1, 0]),
+                         abs(means[0, 2] - means[2, 0]),
+                         abs(means[0, 1] - means[2, 1]),
+                         abs(means[0, 0] - means[2, 2])]
+            k = int(np.argmax(np.nan_to_num(gradients, nan = -1.0)))
+            first, second = [means[p, q] for p, q in REFINED_LEE_SIDES[k]]
+            side = 0 if abs(means[1, 1] - first) <= \
+                abs(means[1, 1] - second) else 1
+            ok = masks[k][side] & valid[a - 3:a + 4, b - 3:b + 4]
+            out[a - HALO, b - HALO] = reference_mmse(
+                padded[a, b], padded[a - 3:a + 4, b - 3:b + 4][ok],
+                1 / np.sqrt(looks))
+
+    return out
+
+#%% DEFINING FUNCTIONS
+
+# Function to read a whole band (or a window of it) as a float32 array:
+def read_band(band, x, y, w, h):
+    return band.readPixels(x, y, w, h, np.empty(w * h, dtype = np.float32)
+                           ).reshape(h, w)
+
+# Function to get the relative differences (largest and mean) of an output to
+# its reference, over the pixels valid in both:
+def agreement(output, reference):
+
+    ok = np.isfinite(output) & np.isfinite(reference) & (reference != 0)
+    difference = np.abs(output[ok] - reference[ok]) / np.abs(reference[ok])
+
+    return {'max_relative': float(difference.max()),
+            'mean_relative': float(difference.mean()),
+            'correlation': float(np.corrcoef(output[ok], reference[ok])[0, 1])}
+
+# Largest relative difference of a filter to its per-pixel reference (float32
+# precision), of the 98th percentile of a crop covered by the sampled blocks
+# to NumPy's, and of the one sampled from a whole band to NumPy's:
+REFERENCE_TOLERANCE = 1e-4
+PERCENTILE_TOLERANCE = 5e-3
+SAMPLE_TOLERANCE = 2e-2
+
+# Function to read a filtered band in tiles of the given lines:
+def read_tiles(band, w, h, tile_height):
+    return np.vstack([read_band(band, 0, y, w, min(tile_height, h - y))
+                      for y in range(0, h, tile_height)])
+
+# Function to check each filter against its per-pixel reference and the tiled
+# filter against the whole-crop filter, over a crop of the band. It returns
+# the checks failed:
+def check_references(band, w, h, crop):
+
+    cw, ch = min(crop, w), min(crop, h)
+    array = read_band(band, 0, 0, cw, ch)
+    padded = np.pad(array, HALO, constant_values = np.nan)
+    values = array[np.isfinite(array) & (array != 0.0)]
+    z98 = float(np.percentile(values, 98))
+
+    references = {'Lee Sigma': reference_lee_sigma(array, z98),
+                  'Refined Lee': reference_refined_lee(array)}
+
+    failures = []
+    for name, reference in references.items():
+        parameters = {'nodata': 0.0}
+        if name == 'Lee Sigma':
+            parameters['z98'] = z98
+        whole = FILTERS[name](padded, **parameters)
+
+        tiled_band = FilteredBand(_Crop(array), cw, ch, name, threads = 2,
+                                  strip_height = 7, **parameters)
+        tiled = read_tiles(tiled_band, cw, ch, 13)
+        tiled_band.close()
+
+        differences = agreement(whole, reference)
+        print("%-12s per-pixel reference: %s" % (name,
+              ', '.join('%s %.2e' % item for item in differences.items())))
+        print("%-12s tiles = whole crop: %s" % (name,
+                                                 np.array_equal(tiled, whole)))
+        if differences['max_relative'] > REFERENCE_TOLERANCE:
+            failures.append((name, 'per-pixel reference'))
+        if not np.array_equal(tiled, whole):
+            failures.append((name, 'tiles = whole crop'))
+
+    # Lee Sigma's 98th percentile estimated once for the band: the same
+    # output for any tile height:
+    stats_band = FilteredBand(_Crop(array), cw, ch, 'Lee Sigma')
+    band_z98 = stats_band.parameters['z98']
+    outputs = [read_tiles(stats_band, cw, ch, tile_height)
+               for tile_height in (ch, 32, 13)]
+    stats_band.close()
+    same = all(np.array_equal(output, outputs[0]) for output in outputs[1:])
+    print("%-12s band 98th percentile: %.4g (NumPy %.4g), same output for "
+          "tiles of %d, 32 and 13 lines: %s" % ('Lee Sigma', band_z98, z98,
+                                                ch, same))
+    if abs(band_z98 - z98) > PERCENTILE_TOLERANCE * z98:
+        failures.append(('Lee Sigma', 'band 98th percentile'))
+    if not same:
+        failures.append(('Lee Sigma', 'output of any tile height'))
+
+    # The 98th percentile sampled from the whole band:
+    array = read_band(band, 0, 0, w, h)
+    values = array[np.isfinite(array) & (array != 0.0)]
+    band_z98 = sample_percentile(band, w, h, 98, 0.0)
+    z98 = float(np.percentile(values, 98))
+    print("%-12s sampled 98th percentile of the band: %.4g (NumPy %.4g)"
+          % ('Lee Sigma', band_z98, z98))
+    if abs(band_z98 - z98) > SAMPLE_TOLERANCE * z98:
+        failures.append(('Lee Sigma', 'sampled 98th percentile'))
+
+    return failures
+
+# Band of an array (the crop of the reference checks):
+class _Crop(SyntheticBand):
+
+    def __init__(self, array):
+        self.array = array
+        self.h, self.w = array.shape
+
+# Function to time a filter over the band (tiles of tile_height lines):
+def run_throughput(band, w, h, name, threads, tile_height):
+
+    filtered = FilteredBand(band, w, h, name, threads)
+    buffer = np.empty(w * tile_height, dtype = np.float32)
+
+    start = time.perf_counter()
+    for y in range(0, h, tile_height):
+        th = min(tile_height, h - y)
+        filtered.readPixels(0, y, w, th, buffer[:w * th])
+    seconds = time.perf_counter() - start
+    filtered.close()
+
+    return seconds
+
+# Function to time SNAP's Speckle-Filter operator over a product (its
+# pixels computed as the band is read, tile by tile):
+def run_snap_throughput(path, band_name, name, tile_height):
+
+    from snappy import GPF, HashMap, ProductIO
+
+    parameters = HashMap()
+    parameters.put('filter', name)
+    parameters.put('sourceBands', band_name)
+    if name == 'Lee Sigma':
+        parameters.put('filterSizeX', '7')
+        parameters.put('filterSizeY', '7')
+        parameters.put('sigmaStr', '0.9')
+    product = GPF.createProduct('Speckle-Filter', parameters,
+                                ProductIO.readProduct(str(path)))
+    band = product.getBand(band_name)
+    w, h = product.getSceneRasterWidth(), product.getSceneRasterHeight()
+    buffer = np.empty(w * tile_height, dtype = np.float32)
+
+    start = time.perf_counter()
+    for y in range(0, h, tile_height):
+        th = min(tile_height, h - y)
+        band.readPixels(0, y, w, th, buffer[:w * th])
+    seconds = time.perf_counter() - start
+    product.dispose()
+
+    return seconds, w * h
+
+#%% RUNNING THE BENCHMARK
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = __doc__.split('\n')[2])
+    parser.add_argument('--product', default = None,
+                        help = "BEAM-DIMAP product (a synthetic scene "
+                               "otherwise)")
+    parser.add_argument('--band', default = 'Sigma0_VV')
+    parser.add_argument('--snap-reference', default = None,
+                        help = "the product filtered by SNAP (Lee Sigma)")
+    parser.add_argument('--snap', action = 'store_true',
+                        help = "time SNAP's operator too (snappy needed)")
+    parser.add_argument('--width', type = int, default = 4096)
+    parser.add_argument('--height', type = int, default = 2048)
+    parser.add_argument('--filters', default = 'Lee Sigma,Refined Lee')
+    parser.add_argument('--threads', default = '1,2,4')
+    parser.add_argument('--tile-height', type = int, default = 512)
+    parser.add_argument('--crop', type = int, default = 96,
+                        help = "pixels of the per-pixel reference checks")
+    parser.add_argument('--checks-only', action = 'store_true',
+                        help = "only check the filters (no timing)")
+    args = parser.parse_args()
+
+    if args.product is None:
+        band = SyntheticBand(args.width, args.height)
+        w, h = args.width, args.height
+    else:
+        product = open_product(args.product)
+        band = product.getBand(args.band)
+        w, h = product.getSceneRasterWidth(), product.getSceneRasterHeight()
+
+    names = args.filters.split(',')
+
+    print("Agreement (crop of %d x %d pixels):" % (min(args.crop, w),
+                                                   min(args.crop, h)))
+    failures = check_references(band, w, h, args.crop)
+    for name, check in failures:
+        print("FAILED: %s, %s" % (name, check))
+    if args.checks_only:
+        sys.exit(1 if failures else 0)
+
+    if args.snap_reference is not None:
+        reference = open_product(args.snap_reference).getBand(args.band)
+        filtered = FilteredBand(band, w, h, 'Lee Sigma')
+        print("Lee Sigma    SNAP output: %s" % ', '.join(
+            '%s %.3g' % item for item in agreement(
+                read_band(filtered, 0, 0, w, h),
+                read_band(reference, 0, 0, w, h)).items()))
+        filtered.close()
+
+    print("\nThroughput (%d x %d pixels, tiles of %d lines):"
+          % (w, h, args.tile_height))
+    print("%-12s %8s %10s %10s" % ('filter', 'threads', 'time (s)',
+                                   'Mpixel/s'))
+    for name in names:
+        for threads in [int(k) for k in args.threads.split(',')]:
+            seconds = run_throughput(band, w, h, name, threads,
+                                     args.tile_height)
+            print("%-12s %8d %10.2f %10.2f" % (name, threads, seconds,
+                                               w * h / seconds / 1e6))
+        if args.snap and args.product is not None:
+            seconds, pixels = run_snap_throughput(args.product, args.band,
+                                                  name, args.tile_height)
+            print("%-12s %8s %10.2f %10.2f" % (name, 'SNAP', seconds,
+                                               pixels / seconds / 1e6))
+
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,742 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to read and write BEAM-DIMAP products (SNAP's default format)
+with NumPy only, without snappy and its Java Virtual Machine.
+    Inputs: a BEAM-DIMAP product, i.e. a '.dim' XML file and its '.data'
+    directory holding one ENVI raster per band ('.hdr' header and '.img'
+    pixels);
+    Outputs: band arrays memory-mapped on the '.img' files (pixels are read
+    from disk only when used) and new bands written the same way.
+
+The product and band objects have the snappy methods used by these scripts
+(getBand, getSceneRasterWidth, readPixels, writePixels, ...), so they can be
+given to the tiled block engine (sar_vi_engine.py) in place of snappy ones.
+Byte order and data type come from each ENVI header (SNAP writes big-endian
+rasters, byte order = 1).
+
+Only products written by SNAP's BEAM-DIMAP writer are supported: bands held in
+their own '.img' file ("bsq" interleave). Virtual bands (band maths
+expressions) have no raster and are not read.
+
+A pixel window of a product ("subset") is a read-only product whose bands are
+views of the mapped rasters, with the geocoding of the window: nothing is
+copied, and only the window pixels are ever read. A window can be kept on disk
+as a virtual subset: a small '.vdim' file (JSON) holding the path of the
+parent '.dim' and the window, opened by "open_product" as the window itself.
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+import re
+import copy
+import shutil
+# For parsing and writing the '.dim' XML:
+import xml.etree.ElementTree as ET
+# For the virtual subsets ('.vdim'):
+import json
+# Fast arrays computation (and memory-mapped files):
+import numpy as np
+
+#%% DATA TYPES
+
+# ENVI "data type" codes and NumPy types:
+ENVI_TYPES = {1: 'u1', 2: 'i2', 3: 'i4', 4: 'f4', 5: 'f8', 12: 'u2', 13: 'u4',
+              14: 'i8', 15: 'u8'}
+
+# ENVI "data type" codes of NumPy types (ENVI has no signed byte, SNAP writes
+# int8 bands as code 1):
+ENVI_CODES = dict([(v, k) for k, v in ENVI_TYPES.items()], i1 = 1)
+
+# BEAM-DIMAP "DATA_TYPE" names and NumPy types:
+DIMAP_TYPES = {'int8': 'i1', 'uint8': 'u1', 'int16': 'i2', 'uint16': 'u2',
+               'int32': 'i4', 'uint32': 'u4', 'float32': 'f4',
+               'float64': 'f8'}
+
+#%% ENVI HEADERS
+
+# Function to read an ENVI header ('.hdr') as a dictionary of strings (values
+# within braces, which may span several lines, are kept without the braces):
+def read_envi_header(path):
+
+    with open(path) as header_file:
+        text = header_file.read()
+
+    if not text.lstrip().startswith('ENVI'):
+        raise ValueError("Not an ENVI header: %s" % path)
+
+    header = {}
+    for key, value in re.findall(r'^\s*([^=\n]+?)\s*=\s*(\{[^}]*\}|[^\n]*)',
+                                 text, re.MULTILINE):
+        value = value.strip()
+        if value.startswith('{'):
+            value = value[1:-1].strip()
+        header[key.strip().lower()] = value
+
+    return header
+
+# Function to write an ENVI header, keys in the given order (values with
+# commas or spaces are put within braces, as SNAP does):
+def write_envi_header(path, header):
+
+    lines = ['ENVI']
+    for key, value in header.items():
+        value = str(value)
+        if key in ('description', 'band names', 'map info',
+                   'coordinate system string', 'data gain values',
+                   'data offset values', 'wavelength units'):
+            value = '{' + value + '}'
+        lines.append('%s = %s' % (key, value))
+
+    with open(path, 'w') as header_file:
+        header_file.write('\n'.join(lines) + '\n')
+
+# Function to get the NumPy type of an ENVI raster (with its byte order):
+def envi_dtype(header):
+
+    dtype = np.dtype(ENVI_TYPES[int(header['data type'])])
+    big_endian = int(header.get('byte order', 0)) == 1
+
+    return dtype.newbyteorder('>' if big_endian else '<')
+
+#%% BANDS
+
+# The following class is a band of a BEAM-DIMAP product, memory-mapped on its
+# '.img' file (opened at the first access). "readPixels" returns geophysical
+# values (scaling factor and offset applied) as float32:
+class DimapBand:
+
+    def __init__(self, product, name, header_path, info):
+
+        self.product = product
+        self.name = name
+        self.header_path = header_path
+        self.image_path = os.path.splitext(header_path)[0] + '.img'
+        self.info = info
+        self.header = read_envi_header(header_path)
+        self.dtype = envi_dtype(self.header)
+        self.width = int(self.header['samples'])
+        self.height = int(self.header['lines'])
+        self.offset = int(self.header.get('header offset', 0))
+        self.writable = False
+        self._array = None
+
+        if self.header.get('interleave', 'bsq').lower() != 'bsq' or \
+                int(self.header.get('bands', 1)) != 1:
+            raise ValueError("Only single band ENVI rasters are supported: "
+                             "%s" % header_path)
+
+    # Scaling (raw value * factor + offset) and no-data value, from the '.dim':
+    @property
+    def scaling(self):
+        return (float(self.info.get('SCALING_FACTOR', 1.0)),
+                float(self.info.get('SCALING_OFFSET', 0.0)))
+
+    @property
+    def no_data_value(self):
+        if self.info.get('NO_DATA_VALUE_USED', 'false').lower() != 'true':
+            return None
+        return float(self.info.get('NO_DATA_VALUE', 0.0))
+
+    # The (height, width) array of raw values, memory-mapped on the '.img'
+    # file (read-only unless the band was created or opened for writing):
+    @property
+    def array(self):
+        if self._array is None:
+            self._array = np.memmap(self.image_path, dtype = self.dtype,
+                                    mode = 'r+' if self.writable else 'r',
+                                    offset = self.offset,
+                                    shape = (self.height, self.width))
+        return self._array
+
+    # Function to get a (height, width) window of raw values, without copying
+    # them (a view of the mapped file, in the file byte order):
+    def read(self, x, y, w, h):
+        return self.array[y:y + h, x:x + w]
+
+    # snappy's methods:
+
+    def getName(self):
+        return self.name
+
+    def getRasterWidth(self):
+        return self.width
+
+    def getRasterHeight(self):
+        return self.height
+
+    def getNoDataValue(self):
+        return self.no_data_value or 0.0
+
+    def isNoDataValueUsed(self):
+        return self.no_data_value is not None
+
+    def readPixels(self, x, y, w, h, array = None):
+
+        if array is None:
+            array = np.empty(w * h, dtype = np.float32)
+
+        out = np.asarray(array)[:w * h].reshape(h, w)
+        out[...] = self.read(x, y, w, h)
+
+        factor, offset = self.scaling
+        if factor != 1.0:
+            out *= factor
+        if offset != 0.0:
+            out += offset
+
+        return array
+
+    def writePixels(self, x, y, w, h, array):
+
+        if not self.writable:
+            raise IOError("Band '%s' is read-only" % self.name)
+
+        self.array[y:y + h, x:x + w] = np.asarray(array)[:w * h].reshape(h, w)
+
+    # Function to write the mapped pixels to disk and to close the file:
+    def close(self):
+        if self._array is not None:
+            if self.writable:
+                self._array.flush()
+            self._array = None
+
+# The following class is a pixel window (x, y, w, h) of a band: a read-only
+# band whose array is a view of the window in the mapped raster of the band,
+# and whose header has the map info of the window:
+class DimapBandWindow(DimapBand):
+
+    def __init__(self, product, band, x, y, w, h):
+
+        self.product = product
+        self.band = band
+        self.x, self.y = x, y
+        self.name = band.name
+        self.header_path = band.header_path
+        self.image_path = band.image_path
+        self.info = band.info
+        self.header = dict(band.header, samples = str(w), lines = str(h))
+        if 'map info' in self.header:
+            self.header['map info'] = shift_map_info(self.header['map info'],
+                                                     x, y)
+        self.dtype = band.dtype
+        self.width, self.height = w, h
+        self.offset = band.offset
+        self.writable = False
+        self._array = None
+
+    @property
+    def array(self):
+        if self._array is None:
+            self._array = self.band.array[self.y:self.y + self.height,
+                                          self.x:self.x + self.width]
+        return self._array
+
+# Function to move the reference pixel of an ENVI "map info" (north-up grids:
+# name, reference pixel x and y, easting, northing, pixel sizes, ...) to the
+# upper left corner of a window starting at pixel x, y:
+def shift_map_info(map_info, x, y):
+
+    fields = [k.strip() for k in map_info.split(',')]
+    reference_x, reference_y = float(fields[1]) - 1, float(fields[2]) - 1
+    fields[3] = str(float(fields[3]) + (x - reference_x) * float(fields[5]))
+    fields[4] = str(float(fields[4]) - (y - reference_y) * float(fields[6]))
+    fields[1] = fields[2] = '1.0'
+
+    return ', '.join(fields)
+
+#%% PRODUCTS
+
+# Function to write a '.dim' document (indented as SNAP does, when the Python
+# version can):
+def write_dim(tree, path):
+    if hasattr(ET, 'indent'):
+        ET.indent(tree, space = '    ')
+    tree.write(path, encoding = 'ISO-8859-1', xml_declaration = True)
+
+# Function to write a number as SNAP does (NaN is "NaN", as read by Java):
+def dimap_number(value):
+    value = float(value)
+    return 'NaN' if np.isnan(value) else str(value)
+
+# Function to get the text of an XML element (default if missing):
+def element_text(parent, path, default = None):
+    element = parent.find(path)
+    return default if element is None or element.text is None \
+        else element.text.strip()
+
+# Function to set the text of an XML element, creating it if missing:
+def set_element_text(parent, tag, text):
+    element = parent.find(tag)
+    if element is None:
+        element = ET.SubElement(parent, tag)
+    element.text = str(text)
+    return element
+
+# The following class is a BEAM-DIMAP product: the parsed '.dim' document and
+# its bands (in the order of the '.dim'). New bands are added with "add_band"
+# and the '.dim' is rewritten with "save":
+class DimapProduct:
+
+    def __init__(self, path):
+
+        self.path = os.path.abspath(str(path))
+        self.data_dir = os.path.splitext(self.path)[0] + '.data'
+        self.tree = ET.parse(self.path)
+        self.root = self.tree.getroot()
+        self.bands = {}
+        # Product whose grid a new (empty) product was created on:
+        self.template = None
+
+        files = {}
+        for data_file in self.root.iter('Data_File'):
+            index = element_text(data_file, 'BAND_INDEX')
+            href = data_file.find('DATA_FILE_PATH').get('href')
+            files[index] = os.path.join(os.path.dirname(self.path), href)
+
+        for info in self.root.iter('Spectral_Band_Info'):
+            index = element_text(info, 'BAND_INDEX')
+            name = element_text(info, 'BAND_NAME')
+            if index not in files:
+                # Virtual band (band maths expression), no raster on disk:
+                continue
+            fields = {child.tag: (child.text or '').strip() for child in info}
+            self.bands[name] = DimapBand(self, name, files[index], fields)
+
+    # snappy's methods:
+
+    def getName(self):
+        return element_text(self.root, 'Dataset_Id/DATASET_NAME',
+                            os.path.splitext(os.path.basename(self.path))[0])
+
+    def getDescription(self):
+        return element_text(self.root, 'Dataset_Use/DATASET_COMMENTS', '')
+
+    def getProductType(self):
+        return element_text(self.root, 'Production/PRODUCT_TYPE', '')
+
+    def getStartTime(self):
+        return element_text(self.root,
+                            'Production/PRODUCT_SCENE_RASTER_START_TIME')
+
+    def getEndTime(self):
+        return element_text(self.root,
+                            'Production/PRODUCT_SCENE_RASTER_STOP_TIME')
+
+    def getSceneRasterWidth(self):
+        return int(element_text(self.root, 'Raster_Dimensions/NCOLS'))
+
+    def getSceneRasterHeight(self):
+        return int(element_text(self.root, 'Raster_Dimensions/NROWS'))
+
+    def getBandNames(self):
+        return list(self.bands)
+
+    def getBand(self, name):
+        return self.bands.get(name)
+
+    def containsBand(self, name):
+        return name in self.bands
+
+    def getFileLocation(self):
+        return self.path
+
+    def dispose(self):
+        for band in self.bands.values():
+            band.close()
+
+    closeIO = dispose
+
+    # Function to get the image-to-map transform of the grid (SNAP's
+    # IMAGE_TO_MODEL_TRANSFORM, the flat matrix of a Java AffineTransform:
+    # m00, m10, m01, m11, m02, m12), None without a map geocoding:
+    def image_to_model(self):
+        transform = element_text(self.root,
+                                 'Geoposition/IMAGE_TO_MODEL_TRANSFORM')
+        if transform is None:
+            return None
+        return [float(k) for k in transform.split(',')]
+
+    # Function to get the pixel coordinates (x, y, from the upper left corner
+    # of the grid; pixel centers at +0.5) of WGS84 longitudes and latitudes,
+    # as the geocoding's getPixelPos. Terrain-corrected products are on a map
+    # grid; pyproj is needed when it is projected (e.g. UTM):
+    def geo_to_pixel(self, lon, lat):
+
+        transform = self.image_to_model()
+        wkt = element_text(self.root, 'Coordinate_Reference_System/WKT')
+        if transform is None or wkt is None:
+            raise ValueError("%s has no map geocoding (not terrain corrected?)"
+                             % self.getName())
+
+        lon = np.asarray(lon, dtype = np.float64)
+        lat = np.asarray(lat, dtype = np.float64)
+        if wkt.upper().startswith('GEOGCS'):
+            easting, northing = lon, lat
+        else:
+            import pyproj
+            transformer = pyproj.Transformer.from_crs(
+                'EPSG:4326', pyproj.CRS.from_wkt(wkt), always_xy = True)
+            easting, northing = transformer.transform(lon, lat)
+
+        m00, m10, m01, m11, m02, m12 = transform
+        determinant = m00 * m11 - m01 * m10
+        dx, dy = np.asarray(easting) - m02, np.asarray(northing) - m12
+
+        return ((m11 * dx - m01 * dy) / determinant,
+                (m00 * dy - m10 * dx) / determinant)
+
+    # Function to get a pixel window (x, y, w, h) of the product, without
+    # copying it (see "DimapWindow"):
+    def subset(self, x, y, w, h, name = None):
+        return DimapWindow(self, x, y, w, h, name)
+
+    # Function to add a band to the product: its ENVI header and raster (with
+    # the geocoding lines of the header of "like", another band of the same
+    # grid, by default the first band of the product or of its template) are
+    # created in the '.data' directory, and the band is declared in the '.dim'
+    # (written by "save"). The new band can be written with "writePixels" or
+    # through its "array". With overwrite = True, a band already in the
+    # product gets a new (empty) raster, keeping its declaration:
+    def add_band(self, name, data_type = 'float32', unit = None,
+                 description = None, no_data_value = None, like = None,
+                 overwrite = False):
+
+        existing = self.bands.get(name)
+        if existing is not None and not overwrite:
+            raise ValueError("Band '%s' already in %s" % (name, self.path))
+        if existing is not None:
+            existing.close()
+
+        w = self.getSceneRasterWidth()
+        h = self.getSceneRasterHeight()
+        dtype = np.dtype(DIMAP_TYPES[data_type]).newbyteorder('>')
+        code = ENVI_CODES[DIMAP_TYPES[data_type]]
+
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+        header_path = os.path.join(self.data_dir, name + '.hdr')
+
+        header = {'description': description or '',
+                  'samples': w,
+                  'lines': h,
+                  'bands': 1,
+                  'header offset': 0,
+                  'file type': 'ENVI Standard',
+                  'data type': code,
+                  'interleave': 'bsq',
+                  'byte order': 1,
+                  'band names': ' ' + name + ' '}
+        if like is None:
+            grid = self.bands or (self.template.bands if self.template else {})
+            like = next(iter(grid.values()), None)
+        if like is not None:
+            for key in ('map info', 'coordinate system string'):
+                if key in like.header:
+                    header[key] = like.header[key]
+        header['data gain values'] = '1.0'
+        header['data offset values'] = '0.0'
+        write_envi_header(header_path, header)
+
+        # Full-size raster (sparse on most file systems until written):
+        np.memmap(os.path.splitext(header_path)[0] + '.img', dtype = dtype,
+                  mode = 'w+', shape = (h, w)).flush()
+
+        if existing is not None:
+            info = existing.info
+        else:
+            index = self.declare_band(name, data_type, unit, description,
+                                      no_data_value, header_path)
+            info = {'BAND_INDEX': str(index), 'BAND_NAME': name,
+                    'DATA_TYPE': data_type}
+            if no_data_value is not None:
+                info.update(NO_DATA_VALUE_USED = 'true',
+                            NO_DATA_VALUE = dimap_number(no_data_value))
+        band = DimapBand(self, name, header_path, info)
+        band.writable = True
+        self.bands[name] = band
+
+        return band
+
+    # Function to append a band of another product on the same grid (e.g. an
+    # index computed into a temporary product): its '.img' and '.hdr' files
+    # are moved (or copied) into the '.data' directory and the band is
+    # declared in the '.dim' (written by "save"). No other band is rewritten.
+    # A band of the same name already in the product is replaced:
+    def append_band(self, band, move = False):
+
+        if (band.getRasterWidth(), band.getRasterHeight()) != \
+                (self.getSceneRasterWidth(), self.getSceneRasterHeight()):
+            raise ValueError("Band '%s' is not on the grid of %s"
+                             % (band.name, self.path))
+
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+        header_path = os.path.join(self.data_dir, band.name + '.hdr')
+        image_path = os.path.splitext(header_path)[0] + '.img'
+
+        band.close()
+        existing = self.bands.get(band.name)
+        if existing is not None:
+            existing.close()
+
+        transfer = shutil.move if move else shutil.copyfile
+        transfer(band.header_path, header_path)
+        transfer(band.image_path, image_path)
+
+        if existing is not None:
+            info = existing.info
+        else:
+            no_data = band.no_data_value
+            index = self.declare_band(band.name,
+                                      band.info.get('DATA_TYPE', 'float32'),
+                                      band.info.get('PHYSICAL_UNIT'),
+                                      band.info.get('BAND_DESCRIPTION'),
+                                      no_data, header_path)
+            info = dict(band.info, BAND_INDEX = str(index))
+        self.bands[band.name] = DimapBand(self, band.name, header_path, info)
+
+        return self.bands[band.name]
+
+    # Function to declare a band (raster file and band information) in the
+    # '.dim' document. It returns the band index:
+    def declare_band(self, name, data_type, unit, description, no_data_value,
+                     header_path):
+
+        indices = [int(element_text(info, 'BAND_INDEX'))
+                   for info in self.root.iter('Spectral_Band_Info')]
+        index = max(indices) + 1 if indices else 0
+
+        dimensions = self.root.find('Raster_Dimensions')
+        set_element_text(dimensions, 'NBANDS', len(indices) + 1)
+
+        access = self.root.find('Data_Access')
+        if access is None:
+            access = ET.SubElement(self.root, 'Data_Access')
+            set_element_text(access, 'DATA_FILE_FORMAT', 'ENVI')
+            set_element_text(access, 'DATA_FILE_FORMAT_DESC',
+                             'ENVI File Format')
+            set_element_text(access, 'DATA_FILE_ORGANISATION',
+                             'BAND_SEPARATE')
+        data_file = ET.Element('Data_File')
+        href = os.path.relpath(header_path, os.path.dirname(self.path))
+        ET.SubElement(data_file, 'DATA_FILE_PATH',
+                      href = href.replace(os.sep, '/'))
+        set_element_text(data_file, 'BAND_INDEX', index)
+        # Data files come before the tie-point grid files:
+        position = len([k for k in access
+                        if k.tag != 'Tie_Point_Grid_File'])
+        access.insert(position, data_file)
+
+        interpretation = self.root.find('Image_Interpretation')
+        if interpretation is None:
+            interpretation = ET.SubElement(self.root, 'Image_Interpretation')
+        info = ET.SubElement(interpretation, 'Spectral_Band_Info')
+        set_element_text(info, 'BAND_INDEX', index)
+        set_element_text(info, 'BAND_DESCRIPTION', description or '')
+        set_element_text(info, 'BAND_NAME', name)
+        set_element_text(info, 'BAND_RASTER_WIDTH', self.getSceneRasterWidth())
+        set_element_text(info, 'BAND_RASTER_HEIGHT',
+                         self.getSceneRasterHeight())
+        set_element_text(info, 'DATA_TYPE', data_type)
+        set_element_text(info, 'PHYSICAL_UNIT', unit or '')
+        set_element_text(info, 'SOLAR_FLUX', 0.0)
+        set_element_text(info, 'BAND_WAVELEN', 0.0)
+        set_element_text(info, 'BANDWIDTH', 0.0)
+        set_element_text(info, 'SCALING_FACTOR', 1.0)
+        set_element_text(info, 'SCALING_OFFSET', 0.0)
+        set_element_text(info, 'LOG10_SCALED', 'false')
+        set_element_text(info, 'NO_DATA_VALUE_USED',
+                         'false' if no_data_value is None else 'true')
+        set_element_text(info, 'NO_DATA_VALUE',
+                         dimap_number(0.0 if no_data_value is None
+                                      else no_data_value))
+        transform = element_text(self.root,
+                                 'Geoposition/IMAGE_TO_MODEL_TRANSFORM')
+        if transform is not None:
+            set_element_text(info, 'IMAGE_TO_MODEL_TRANSFORM', transform)
+
+        return index
+
+    # Function to write the mapped rasters to disk and the '.dim' document
+    # (to a temporary file first, so a crash never leaves a broken '.dim'):
+    def save(self):
+
+        for band in self.bands.values():
+            if band.writable and band._array is not None:
+                band._array.flush()
+
+        temporary = self.path + '.%d.tmp' % os.getpid()
+        write_dim(self.tree, temporary)
+        os.replace(temporary, self.path)
+
+# The following class is a pixel window (x, y, w, h) of a product: its
+# document is the one of the product on the window grid (raster size and
+# image-to-map transform), and its bands are windows of the product bands.
+# It is read-only, and has no file of its own (so band statistics are not
+# cached for it):
+class DimapWindow(DimapProduct):
+
+    def __init__(self, parent, x, y, w, h, name = None):
+
+        x, y, w, h = int(x), int(y), int(w), int(h)
+        if x < 0 or y < 0 or w < 1 or h < 1 or \
+                x + w > parent.getSceneRasterWidth() or \
+                y + h > parent.getSceneRasterHeight():
+            raise ValueError("Window %s out of %s" % ((x, y, w, h),
+                                                      parent.path))
+
+        self.parent = parent
+        self.window = (x, y, w, h)
+        # Virtual subset file ('.vdim') the window was opened from, if any:
+        self.descriptor = None
+        self.path = parent.path
+        self.data_dir = parent.data_dir
+        self.root = copy.deepcopy(parent.root)
+        self.tree = ET.ElementTree(self.root)
+        self.template = None
+
+        if name is not None:
+            set_element_text(self.root.find('Dataset_Id'), 'DATASET_NAME',
+                             name)
+        dimensions = self.root.find('Raster_Dimensions')
+        set_element_text(dimensions, 'NCOLS', w)
+        set_element_text(dimensions, 'NROWS', h)
+        for info in self.root.iter('Spectral_Band_Info'):
+            if info.find('BAND_RASTER_WIDTH') is not None:
+                set_element_text(info, 'BAND_RASTER_WIDTH', w)
+                set_element_text(info, 'BAND_RASTER_HEIGHT', h)
+
+        transform = parent.image_to_model()
+        if transform is not None:
+            m00, m10, m01, m11, m02, m12 = transform
+            text = ','.join(str(k) for k in (m00, m10, m01, m11,
+                                             m02 + m00 * x + m01 * y,
+                                             m12 + m10 * x + m11 * y))
+            for element in self.root.iter('IMAGE_TO_MODEL_TRANSFORM'):
+                element.text = text
+
+        self.bands = {band_name: DimapBandWindow(self, band, x, y, w, h)
+                      for band_name, band in parent.bands.items()}
+
+    def getFileLocation(self):
+        return self.descriptor
+
+    def add_band(self, *args, **kwargs):
+        raise IOError("A window of %s is read-only" % self.parent.path)
+
+    append_band = save = add_band
+
+#%% VIRTUAL SUBSETS
+
+# Extension of the virtual subset files:
+VIRTUAL_EXTENSION = '.vdim'
+
+# Function to check whether a path is a virtual subset file:
+def is_virtual_subset(path):
+    return str(path).lower().endswith(VIRTUAL_EXTENSION)
+
+# Function to write a virtual subset: the window (x, y, w, h) of the product
+# at "parent_path" (a '.dim'), saved to "path" ('.vdim' added if missing) with
+# its name and any other field given (e.g. the AOI id). The parent is written
+# relative to the subset file, so both can be moved together:
+def write_virtual_subset(path, parent_path, window, name = None, **fields):
+
+    path = os.path.abspath(str(path))
+    if not is_virtual_subset(path):
+        path += VIRTUAL_EXTENSION
+    parent_path = os.path.abspath(str(parent_path))
+    try:
+        parent = os.path.relpath(parent_path, os.path.dirname(path))
+    except ValueError:
+        # On another drive (Windows):
+        parent = parent_path
+
+    descriptor = dict(fields, parent = parent.replace(os.sep, '/'),
+                      window = [int(k) for k in window],
+                      name = name or os.path.splitext(
+                          os.path.basename(path))[0])
+
+    directory = os.path.dirname(path)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    temporary = path + '.%d.tmp' % os.getpid()
+    with open(temporary, 'w') as subset_file:
+        json.dump(descriptor, subset_file, indent = 1)
+    os.replace(temporary, path)
+
+    return path
+
+# Function to read a virtual subset file: its fields, with the absolute path
+# of the parent product:
+def read_virtual_subset(path):
+
+    path = os.path.abspath(str(path))
+    with open(path) as subset_file:
+        descriptor = json.load(subset_file)
+    descriptor['parent'] = os.path.normpath(
+        os.path.join(os.path.dirname(path), descriptor['parent']))
+
+    return descriptor
+
+#%% DEFINING FUNCTIONS
+
+# Function to open a BEAM-DIMAP product ('.dim'), as ProductIO.readProduct, or
+# a virtual subset ('.vdim'), as the window of its parent product:
+def open_product(path):
+
+    if not is_virtual_subset(path):
+        return DimapProduct(path)
+
+    subset = read_virtual_subset(path)
+    window = DimapProduct(subset['parent']).subset(*subset['window'],
+                                                   name = subset['name'])
+    window.descriptor = os.path.abspath(str(path))
+
+    return window
+
+# Function to create an empty BEAM-DIMAP product ("path", a '.dim') on the
+# grid of another one ("like", a product or a window of it): its '.dim' is
+# copied (geocoding, times and metadata) without the bands, tie-point grids
+# and band statistics:
+def create_product(path, like, name = None):
+
+    path = os.path.abspath(str(path))
+    name = name or os.path.splitext(os.path.basename(path))[0]
+
+    root = copy.deepcopy(like.root)
+    tree = ET.ElementTree(root)
+    root.set('name', os.path.basename(path))
+    set_element_text(root.find('Dataset_Id'), 'DATASET_NAME', name)
+    set_element_text(root.find('Raster_Dimensions'), 'NBANDS', 0)
+
+    for parent, tags in ((root, ('Tie_Point_Grids', 'Image_Display',
+                                 'Masks')),
+                         (root.find('Data_Access'),
+                          ('Data_File', 'Tie_Point_Grid_File')),
+                         (root.find('Image_Interpretation'),
+                          ('Spectral_Band_Info',))):
+        if parent is None:
+            continue
+        for element in [k for k in parent if k.tag in tags]:
+            parent.remove(element)
+
+    directory = os.path.dirname(path)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    write_dim(tree, path)
+
+    product = DimapProduct(path)
+    product.template = like
+    return product
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to keep a local catalog of the Sentinel-1 granules found by the
+ASF searches of Script 01, so the same searches are not sent again, and to
+query it offline.
+    Inputs: a search function (asf_search's "geo_search") and its options
+    (platform, dates, relative orbit, processing level, AOI, ...);
+    Outputs: the catalog, an SQLite database ("granules.sqlite") holding the
+    metadata of each granule (footprint, start and stop times, orbits,
+    flight direction, polarization, URL, size and MD5 checksum), and the
+    granules of a query (spatial, temporal and by orbit, polarization and
+    processing level), answered from the catalog.
+
+Synchronizing:
+    The date ranges already searched are recorded for each set of search
+    options (all of them but the dates, e.g. the same orbit, processing level
+    and AOI): a new search only asks ASF for the dates not covered yet (e.g.
+    the last weeks of an ongoing season). The dates after the search time are
+    never recorded as covered, as new granules may still be published.
+
+Querying:
+    The footprints are indexed by their bounds in an R-tree (SQLite's "rtree"
+    module), so a spatial query only tests the granules whose bounds overlap
+    the AOI; these are then tested against the footprint polygons.
+
+The granules of a query have the "properties" and "geometry" of an ASF search
+result, so they can be given to the download manager (see
+"granule_downloads" in granule_download.py).
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+# The catalog database:
+import sqlite3
+# For the search options and the granule properties:
+import json
+# Dates of the granules and of the searches:
+import datetime
+# Fast arrays computation (footprint polygons):
+import numpy as np
+# Area of Interest polygons (WKT, GeoJSON, shapefiles, ...):
+from aoi_windows import geojson_polygons, read_aoi
+
+#%% DEFAULT PARAMETERS
+
+# Catalog tables: granule metadata, R-tree of the footprint bounds and the
+# date ranges already searched:
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS granules (
+    id INTEGER PRIMARY KEY,
+    scene TEXT UNIQUE,
+    file TEXT,
+    platform TEXT,
+    processing_level TEXT,
+    beam_mode TEXT,
+    start TEXT,
+    stop TEXT,
+    relative_orbit INTEGER,
+    absolute_orbit INTEGER,
+    flight_direction TEXT,
+    polarization TEXT,
+    url TEXT,
+    bytes INTEGER,
+    md5 TEXT,
+    footprint TEXT,
+    properties TEXT);
+CREATE INDEX IF NOT EXISTS granules_start ON granules (start);
+CREATE VIRTUAL TABLE IF NOT EXISTS granule_bounds
+    USING rtree(id, min_lon, max_lon, min_lat, max_lat);
+CREATE TABLE IF NOT EXISTS syncs (
+    options TEXT,
+    start TEXT,
+    end TEXT,
+    granules INTEGER,
+    synced TEXT);
+'''
+
+# Granule columns and the ASF properties holding them:
+PROPERTIES = (('scene', 'sceneName'), ('file', 'fileName'),
+              ('platform', 'platform'),
+              ('processing_level', 'processingLevel'),
+              ('beam_mode', 'beamModeType'), ('start', 'startTime'),
+              ('stop', 'stopTime'), ('relative_orbit', 'pathNumber'),
+              ('absolute_orbit', 'orbit'),
+              ('flight_direction', 'flightDirection'),
+              ('polarization', 'polarization'), ('url', 'url'),
+              ('bytes', 'bytes'), ('md5', 'md5sum'))
+
+#%% DATES AND POLYGONS
+
+# Function to get a date (text as '2017-11-01T00:00:00Z' or '2017-11-01', or a
+# date or datetime) as a UTC datetime:
+def utc_datetime(date):
+
+    if isinstance(date, str):
+        date = datetime.datetime.fromisoformat(date.strip().replace('Z',
+                                                                    '+00:00'))
+    elif not isinstance(date, datetime.datetime):
+        date = datetime.datetime(date.year, date.month, date.day)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo = datetime.timezone.utc)
+
+    return date.astimezone(datetime.timezone.utc)
+
+# Function to write a date as stored in the catalog (sortable as text):
+def catalog_date(date):
+    return utc_datetime(date).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+# Function to get the date ranges of [start, end] not covered by the given
+# ranges (pairs of catalog dates):
+def missing_ranges(start, end, covered):
+
+    missing = []
+    for covered_start, covered_end in sorted(covered):
+        if covered_end < start:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > start:
+            missing.append((start, covered_start))
+        start = max(start, covered_end)
+    if start < end:
+        missing.append((start, end))
+
+    return missing
+
+# Function to check whether points (n, 2) are inside a ring (even-odd rule):
+def points_in_ring(points, ring):
+
+    points = np.asarray(points, dtype = np.float64).reshape(-1, 2)
+    x, y = points[:, 0:1], points[:, 1:2]
+    x1, y1 = ring[:, 0], ring[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+
+    crossing = (y1 <= y) != (y2 <= y)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        at = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+
+    return np.count_nonzero(crossing & (x < at), axis = 1) % 2 == 1
+
+# Function to get the cross products of 2-D vectors (arrays (..., 2)):
+def cross_2d(v, w):
+    return v[..., 0] * w[..., 1] - v[..., 1] * w[..., 0]
+
+# Function to check whether two rings (exterior rings of polygons, (n, 2)
+# arrays) intersect: a vertex of one inside the other, or crossing edges:
+def rings_intersect(a, b):
+
+    if points_in_ring(a, b).any() or points_in_ring(b, a).any():
+        return True
+
+    # Edges p + t r of a and q + u s of b cross for t and u within [0, 1]:
+    p, r = a[:, None], (np.roll(a, -1, axis = 0) - a)[:, None]
+    q, s = b[None, :], (np.roll(b, -1, axis = 0) - b)[None, :]
+    denominator = cross_2d(r, s)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        t = cross_2d(q - p, s) / denominator
+        u = cross_2d(q - p, r) / denominator
+
+    return bool(np.any((denominator != 0) & (t >= 0) & (t <= 1) &
+                       (u >= 0) & (u <= 1)))
+
+# Function to check whether two sets of polygons (see "wkt_polygons" in
+# aoi_windows.py) intersect (their exterior rings):
+def polygons_intersect(a, b):
+    return any(rings_intersect(polygon_a[0], polygon_b[0])
+               for polygon_a in a for polygon_b in b)
+
+#%% CATALOG
+
+# The following class is a granule of a query, with the "properties" and
+# "geometry" of an ASF search result:
+class CatalogGranule:
+
+    def __init__(self, row):
+        self.record = dict(row)
+        self.properties = json.loads(row['properties'])
+        self.geometry = json.loads(row['footprint'])
+
+    def __getitem__(self, key):
+        return self.record[key]
+
+    def __repr__(self):
+        return 'CatalogGranule(%s)' % self.record['scene']
+
+# The following class is the catalog database (see the module notes):
+class GranuleCatalog:
+
+    def __init__(self, path):
+
+        self.path = os.path.abspath(str(path))
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.connection = sqlite3.connect(self.path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    # Function to add (or update) granules from ASF search results (or any
+    # object with their "properties" and GeoJSON "geometry"). It returns the
+    # number of granules new to the catalog:
+    def add(self, results):
+
+        new = 0
+        with self.connection:
+            for result in results:
+                properties = dict(result.properties)
+                geometry = result.geometry
+                if not isinstance(geometry, dict):
+                    geometry = geometry.__geo_interface__
+                values = {column: properties.get(name)
+                          for column, name in PROPERTIES}
+                for column in ('start', 'stop'):
+                    if values[column]:
+                        values[column] = catalog_date(values[column])
+                if isinstance(values['polarization'], (list, tuple)):
+                    values['polarization'] = '+'.join(values['polarization'])
+                values['scene'] = values['scene'] or properties.get('fileID')
+                values['footprint'] = json.dumps(geometry)
+                values['properties'] = json.dumps(properties, default = str)
+
+                row = self.connection.execute(
+                    'SELECT id FROM granules WHERE scene = ?',
+                    (values['scene'],)).fetchone()
+                columns = list(values)
+                if row is None:
+                    cursor = self.connection.execute(
+                        'INSERT INTO granules (%s) VALUES (%s)'
+                        % (', '.join(columns), ', '.join('?' * len(columns))),
+                        [values[k] for k in columns])
+                    granule_id = cursor.lastrowid
+                    new += 1
+                else:
+                    granule_id = row['id']
+                    self.connection.execute(
+                        'UPDATE granules SET %s WHERE id = ?'
+                        % ', '.join(k + ' = ?' for k in columns),
+                        [values[k] for k in columns] + [granule_id])
+
+                points = np.concatenate([polygon[0] for polygon in
+                                         geojson_polygons(geometry)])
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO granule_bounds VALUES '
+                    '(?, ?, ?, ?, ?)',
+                    (granule_id, points[:, 0].min(), points[:, 0].max(),
+                     points[:, 1].min(), points[:, 1].max()))
+
+        return new
+
+    # Function to get the date ranges already searched with the given search
+    # options (all of them but the dates):
+    def covered_ranges(self, options):
+        key = json.dumps(options, sort_keys = True, default = str)
+        return [(row['start'], row['end']) for row in self.connection.execute(
+            'SELECT start, end FROM syncs WHERE options = ?', (key,))]
+
+    # Function to synchronize the catalog with ASF: "search" (e.g.
+    # asf_search's geo_search) is called with the search options (e.g.
+    # platform, relativeOrbit, processingLevel and intersectsWith) for each
+    # date range of [start, end] not searched yet with the same options. It
+    # returns the number of granules new to the catalog:
+    def sync(self, search, start, end, **options):
+
+        start, end = catalog_date(start), catalog_date(end)
+        now = catalog_date(datetime.datetime.now(datetime.timezone.utc))
+        key = json.dumps(options, sort_keys = True, default = str)
+
+        new = 0
+        for range_start, range_end in missing_ranges(
+                start, end, self.covered_ranges(options)):
+            results = search(start = range_start, end = range_end, **options)
+            found = self.add(results)
+            new += found
+            print("Searched %s to %s: %d granule(s), %d new."
+                  % (range_start, range_end, len(results), found))
+            if range_start < min(range_end, now):
+                with self.connection:
+                    self.connection.execute(
+                        'INSERT INTO syncs VALUES (?, ?, ?, ?, ?)',
+                        (key, range_start, min(range_end, now),
+                         len(results), now))
+
+        return new
+
+    # Function to query the catalog: granules whose footprint intersects
+    # "aoi" (see "read_aoi" in aoi_windows.py; or "bounds", a (min lon, min
+    # lat, max lon, max lat) box), starting between "start" and "end", and of
+    # the given relative orbit, polarization (e.g. 'VV+VH'), processing level
+    # (e.g. 'GRD_HD') and flight direction, when given. It returns the
+    # granules (see "CatalogGranule"), by start time:
+    def query(self, aoi = None, start = None, end = None, bounds = None,
+              relative_orbit = None, polarization = None,
+              processing_level = None, flight_direction = None):
+
+        conditions, parameters = [], []
+        polygons = None if aoi is None else read_aoi(aoi)
+        if polygons is not None:
+            points = np.concatenate([polygon[0] for polygon in polygons])
+            bounds = (points[:, 0].min(), points[:, 1].min(),
+                      points[:, 0].max(), points[:, 1].max())
+        if bounds is not None:
+            conditions.append('id IN (SELECT id FROM granule_bounds WHERE '
+                              'max_lon >= ? AND min_lon <= ? AND '
+                              'max_lat >= ? AND min_lat <= ?)')
+            parameters += [float(bounds[0]), float(bounds[2]),
+                           float(bounds[1]), float(bounds[3])]
+        for column, operator, value in (
+                ('start', '>=', start), ('start', '<=', end),
+                ('relative_orbit', '=', relative_orbit),
+                ('polarization', '=', polarization),
+                ('processing_level', '=', processing_level),
+                ('flight_direction', '=', flight_direction)):
+            if value is None:
+                continue
+            if column == 'start':
+                value = catalog_date(value)
+            conditions.append('%s %s ?' % (column, operator))
+            parameters.append(value)
+
+        rows = self.connection.execute(
+            'SELECT * FROM granules%s ORDER BY start'
+            % (' WHERE ' + ' AND '.join(conditions) if conditions else ''),
+            parameters).fetchall()
+        granules = [CatalogGranule(row) for row in rows]
+
+        if polygons is not None:
+            granules = [granule for granule in granules
+                        if polygons_intersect(
+                            polygons, geojson_polygons(granule.geometry))]
+
+        return granules
+
+    # Function to keep the files (e.g. the '.zip' granules found by Script 03)
+    # of the granules of a query (see "query" for its options):
+    def select_files(self, files, **query):
+        names = {granule['file'] for granule in self.query(**query)}
+        return [path for path in files if os.path.basename(path) in names]
@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to download Sentinel-1 granules (e.g. the '.zip' GRD products
+found by Script 01) concurrently, resuming interrupted transfers and checking
+each file.
+    Inputs: the granules to download (URL, file name, size and MD5 checksum,
+    from the ASF search results, see "granule_downloads"), the output
+    directory and a session (the ASF session of Script 01, or any object with
+    the "get" method of a "requests" session);
+    Outputs: the granule files and a report (status, bytes transferred, time
+    and rate) per granule, printed as a table at the end.
+
+Transfers:
+    - a granule is written to "<file>.part" and renamed only once complete
+      and verified, so a file with the granule name is always a whole one
+      (already complete files are skipped);
+    - a dropped connection is retried (up to "retries" times, waiting longer
+      each time), resuming from the end of the '.part' file with an HTTP
+      Range request. A server ignoring the range restarts the file;
+    - the MD5 checksum (ASF's "md5sum") is computed as the bytes arrive (the
+      bytes of a resumed '.part' file first) and compared with the expected
+      one: a corrupt file is downloaded again from the start.
+
+Scheduling:
+    - the largest granules (remaining bytes) are started first, so the
+      transfers end together instead of a single large one running alone;
+    - transfers run on a bounded pool of threads ("transfers" at most). It
+      starts with two, and one more is opened each time the aggregate rate
+      rose by 10 % since the previous probe (every "probe_seconds"): once
+      the link (or the server's limit) is saturated, no more connections are
+      opened;
+    - "max_rate" (bytes/s) caps the aggregate rate of the transfers, leaving
+      bandwidth to other users of the link.
+
+Without a session, the downloads are made with Python's "urllib" (no
+authentication), e.g. from a local HTTP server standing in for ASF (see
+benchmark-granule-download.py).
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+# To known transfer times and to wait between retries:
+import time
+# For the MD5 checksums:
+import hashlib
+# Threads sharing the rate limit and the rate measurements:
+import threading
+# Rate measurements (bytes received over time):
+from collections import deque
+# Pool of transfer threads:
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+# Downloads without a session:
+import http.client
+import urllib.error
+import urllib.request
+
+#%% DEFAULT PARAMETERS
+
+# Maximum number of concurrent transfers:
+TRANSFERS = 4
+
+# Bytes written at a time (and read at a time when hashing):
+CHUNK_SIZE = 1024 ** 2
+
+# Retries of a granule (dropped connections, corrupt files) and the wait
+# before the first one (seconds, doubled at each retry):
+RETRIES = 5
+BACKOFF = 2.0
+
+# Seconds without any byte before a connection is dropped:
+TIMEOUT = 60
+
+# Errors of a transfer that are retried (dropped connections, truncated or
+# corrupt files):
+TRANSFER_ERRORS = (IOError, ValueError, http.client.HTTPException)
+
+# Seconds between the rate probes opening new transfers, and the rate gain
+# (fraction) needed to open one:
+PROBE_SECONDS = 5.0
+RATE_GAIN = 0.1
+
+#%% GRANULES
+
+# Function to get the granules to download from ASF search results (the
+# "properties" of each result): a list of dictionaries with the URL, file
+# name, size (bytes) and MD5 checksum of each granule:
+def granule_downloads(results):
+    return [{'url': result.properties['url'],
+             'file': result.properties['fileName'],
+             'size': result.properties.get('bytes'),
+             'md5': result.properties.get('md5sum')}
+            for result in results]
+
+# Function to get the temporary file of a granule being downloaded:
+def part_path(path):
+    return str(path) + '.part'
+
+# Function to compute the MD5 checksum of a file (into "digest", if given):
+def file_md5(path, chunk_size = CHUNK_SIZE, digest = None):
+
+    digest = digest or hashlib.md5()
+    with open(path, 'rb') as granule_file:
+        for chunk in iter(lambda: granule_file.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest
+
+# Function to check whether a granule file is complete: it exists, with the
+# expected size (if known) and, with verify = True, the expected checksum:
+def is_complete(download, path, verify = False):
+
+    if not os.path.isfile(path):
+        return False
+    if download.get('size') and \
+            os.path.getsize(path) != int(download['size']):
+        return False
+    if verify and download.get('md5'):
+        return file_md5(path).hexdigest() == download['md5'].lower()
+
+    return True
+
+#%% SESSIONS AND RATES
+
+# The following class is a response of "UrllibSession", with the attributes
+# and methods of a "requests" response used here:
+class UrllibResponse:
+
+    def __init__(self, response, url):
+        self.response = response
+        self.url = url
+        self.status_code = response.getcode()
+        self.headers = response.headers
+
+    def iter_content(self, chunk_size = CHUNK_SIZE):
+        return iter(lambda: self.response.read(chunk_size), b'')
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError("HTTP %d for %s" % (self.status_code, self.url))
+
+    def close(self):
+        self.response.close()
+
+# The following class is a session downloading with "urllib" (no
+# authentication), with the "get" method of a "requests" session:
+class UrllibSession:
+
+    def get(self, url, headers = None, stream = True, timeout = TIMEOUT):
+
+        request = urllib.request.Request(url, headers = headers or {})
+        try:
+            response = urllib.request.urlopen(request, timeout = timeout)
+        except urllib.error.HTTPError as error:
+            # Errors have a status code (e.g. 416, range not satisfiable):
+            response = error
+
+        return UrllibResponse(response, url)
+
+# The following class limits the aggregate rate (bytes/s) of the transfers
+# sharing it (a token bucket holding up to a second of bytes):
+class RateLimiter:
+
+    def __init__(self, max_rate):
+        self.max_rate = float(max_rate)
+        self.tokens = self.max_rate
+        self.last = time.perf_counter()
+        self.lock = threading.Lock()
+
+    # Function to wait until n bytes can be received:
+    def consume(self, n):
+
+        with self.lock:
+            now = time.perf_counter()
+            self.tokens = min(self.max_rate, self.tokens +
+                              (now - self.last) * self.max_rate) - n
+            self.last = now
+            wait_seconds = -self.tokens / self.max_rate
+
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+# The following class measures the aggregate rate of the transfers: the
+# bytes received, counted as they arrive:
+class BandwidthMonitor:
+
+    def __init__(self):
+        self.total = 0
+        self.samples = deque([(time.perf_counter(), 0)])
+        self.lock = threading.Lock()
+
+    def add(self, n):
+        with self.lock:
+            self.total += n
+            self.samples.append((time.perf_counter(), self.total))
+
+    # Function to get the rate (bytes/s) over the last given seconds:
+    def rate(self, seconds = PROBE_SECONDS):
+
+        with self.lock:
+            now = time.perf_counter()
+            while len(self.samples) > 1 and \
+                    self.samples[1][0] < now - seconds:
+                self.samples.popleft()
+            start, received = self.samples[0]
+            total = self.total
+
+        return (total - received) / max(now - start, 1e-9)
+
+#%% DOWNLOADS
+
+# Function to transfer a granule once: the request (resuming from the end of
+# the '.part' file, if any), the bytes written to the '.part' file as they
+# arrive (their checksum with them), then the checks, and the '.part' file
+# renamed to "path". It returns the bytes received. A dropped connection
+# raises an IOError (the '.part' file is kept, to be resumed) and a wrong
+# checksum a ValueError (the '.part' file is deleted):
+def fetch_granule(download, path, session, chunk_size = CHUNK_SIZE,
+                  timeout = TIMEOUT, limiter = None, monitor = None):
+
+    part = part_path(path)
+    size = int(download['size']) if download.get('size') else None
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    if size is not None and offset > size:
+        offset = 0
+
+    received = 0
+    digest = file_md5(part, chunk_size) if offset else hashlib.md5()
+
+    if size is None or offset < size:
+        headers = {'Range': 'bytes=%d-' % offset} if offset else {}
+        response = session.get(download['url'], headers = headers,
+                               stream = True, timeout = timeout)
+        try:
+            if response.status_code == 416 and offset:
+                # Nothing left to send: the '.part' file is whole:
+                pass
+            else:
+                response.raise_for_status()
+                content_range = response.headers.get('Content-Range', '')
+                if response.status_code != 206 or not \
+                        content_range.startswith('bytes %d-' % offset):
+                    # The range was ignored, the whole file is sent:
+                    offset = 0
+                    digest = hashlib.md5()
+                with open(part, 'ab' if offset else 'wb') as part_file:
+                    for chunk in response.iter_content(chunk_size):
+                        if not chunk:
+                            continue
+                        if limiter is not None:
+                            limiter.consume(len(chunk))
+                        part_file.write(chunk)
+                        digest.update(chunk)
+                        received += len(chunk)
+                        if monitor is not None:
+                            monitor.add(len(chunk))
+        finally:
+            response.close()
+
+    if size is not None and os.path.getsize(part) != size:
+        raise IOError("%s: %d of %d bytes received"
+                      % (download['file'], os.path.getsize(part), size))
+    if download.get('md5') and \
+            digest.hexdigest() != download['md5'].lower():
+        os.remove(part)
+        raise ValueError("%s: MD5 checksum %s, %s expected"
+                         % (download['file'], digest.hexdigest(),
+                            download['md5']))
+
+    os.replace(part, path)
+
+    return received
+
+# Function to download a granule to the output directory, retrying (and
+# resuming) after errors. It returns the granule report:
+def download_granule(download, outpath, session = None, retries = RETRIES,
+                     backoff = BACKOFF, chunk_size = CHUNK_SIZE,
+                     timeout = TIMEOUT, limiter = None, monitor = None):
+
+    session = session or UrllibSession()
+    path = os.path.join(str(outpath), download['file'])
+    report = {'file': download['file'], 'path': path, 'bytes': 0,
+              'attempts': 0}
+    start_time = time.perf_counter()
+
+    for attempt in range(retries + 1):
+        report['attempts'] = attempt + 1
+        try:
+            report['bytes'] += fetch_granule(download, path, session,
+                                             chunk_size, timeout, limiter,
+                                             monitor)
+            report['status'] = 'ok'
+            report.pop('error', None)
+            break
+        except TRANSFER_ERRORS as error:
+            report['status'] = 'failed'
+            report['error'] = "%s: %s" % (type(error).__name__, error)
+            if attempt < retries:
+                print("%s (retrying)" % report['error'])
+                time.sleep(backoff * 2 ** attempt)
+
+    report['seconds'] = time.perf_counter() - start_time
+
+    return report
+
+# Function to print the progress of the downloads after each granule:
+def print_progress(report, done, total):
+    print("[%d/%d] %s %s, %.1f MB in %.1f s%s"
+          % (done, total, report['file'], report['status'],
+             report['bytes'] / 1024 ** 2, report['seconds'],
+             (" (" + report['error'] + ")") if 'error' in report else ""))
+
+# Function to print the final report of the downloads, with one line per
+# granule and the aggregate rate:
+def print_report(reports, elapsed):
+
+    print("\n%-70s %-7s %10s %10s" % ("Granule", "Status", "MB", "Seconds"))
+    for report in reports:
+        print("%-70s %-7s %10.1f %10.1f" % (report['file'][:70],
+                                            report['status'],
+                                            report['bytes'] / 1024 ** 2,
+                                            report['seconds']))
+
+    received = sum(report['bytes'] for report in reports)
+    counts = {status: len([r for r in reports if r['status'] == status])
+              for status in ('ok', 'skipped', 'failed')}
+    print("\n%d granules: %d downloaded, %d skipped (complete), %d failed."
+          % (len(reports), counts['ok'], counts['skipped'],
+             counts['failed']))
+    print("Received %.1f MB in %.1f s (%.1f MB/s)."
+          % (received / 1024 ** 2, elapsed,
+             received / 1024 ** 2 / elapsed if elapsed else 0))
+
+    for report in reports:
+        if report['status'] == 'failed':
+            print("FAILED %s: %s" % (report['file'], report.get('error')))
+
+# The following function is the download manager itself (see the module
+# notes): it downloads the granules (see "granule_downloads") to "outpath",
+# skipping the complete ones (checked against their checksum too with
+# verify_existing = True), with "transfers" concurrent transfers at most. It
+# returns the reports of the granules:
+def download_granules(downloads, outpath, session = None,
+                      transfers = TRANSFERS, max_rate = None,
+                      retries = RETRIES, backoff = BACKOFF,
+                      verify_existing = False, chunk_size = CHUNK_SIZE,
+                      timeout = TIMEOUT, probe_seconds = PROBE_SECONDS):
+
+    outpath = str(outpath)
+    if not os.path.exists(outpath):
+        os.makedirs(outpath)
+
+    session = session or UrllibSession()
+    limiter = None if max_rate is None else RateLimiter(max_rate)
+    monitor = BandwidthMonitor()
+    start_time = time.perf_counter()
+
+    reports = []
+    queue = []
+    for download in downloads:
+        path = os.path.join(outpath, download['file'])
+        if is_complete(download, path, verify_existing):
+            reports.append({'file': download['file'], 'path': path,
+                            'status': 'skipped', 'bytes': 0, 'attempts': 0,
+                            'seconds': 0.0})
+            continue
+        part = part_path(path)
+        remaining = int(download.get('size') or 0) - \
+            (os.path.getsize(part) if os.path.exists(part) else 0)
+        queue.append((remaining, download))
+
+    # Largest remaining transfers first:
+    queue = deque(download for _, download in
+                  sorted(queue, key = lambda k: -k[0]))
+    total = len(reports) + len(queue)
+    if queue:
+        print("Downloading %d granule(s), %d complete already..."
+              % (len(queue), len(reports)))
+
+    slots = min(2, transfers)
+    last_rate, last_probe = 0.0, time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers = transfers) as pool:
+
+        in_flight = {}
+        while queue or in_flight:
+
+            while queue and len(in_flight) < slots:
+                download = queue.popleft()
+                future = pool.submit(download_granule, download, outpath,
+                                     session, retries, backoff, chunk_size,
+                                     timeout, limiter, monitor)
+                in_flight[future] = download
+
+            done, _ = wait(in_flight, timeout = probe_seconds,
+                           return_when = FIRST_COMPLETED)
+            for future in done:
+                in_flight.pop(future)
+                reports.append(future.result())
+                print_progress(reports[-1], len(reports), total)
+
+            # One more transfer while it still raises the aggregate rate:
+            now = time.perf_counter()
+            if queue and slots < transfers and \
+                    now - last_probe >= probe_seconds:
+                rate = monitor.rate(probe_seconds)
+                if rate > last_rate * (1 + RATE_GAIN):
+                    slots += 1
+                    print("%.1f MB/s: %d concurrent transfers."
+                          % (rate / 1024 ** 2, slots))
+                last_rate, last_probe = max(last_rate, rate), now
+
+    print_report(reports, time.perf_counter() - start_time)
+
+    return reports
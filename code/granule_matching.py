@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to match the sampling points of a field campaign to the
+Sentinel-1 granules acquired over each point close to its sampling date, so
+only these granules are downloaded (Script 01).
+    Inputs: the sampling points (longitude, latitude and sampling date, e.g.
+    the LON, LAT and DATA columns of the Excel sheet of Script 01) and the
+    granules found (ASF search results or catalog granules, see
+    granule_catalog.py), with their footprint ("geometry") and start time;
+    Outputs: a small set of the granules found, covering each point within
+    the date tolerance (+/- days), and the granule matched to each point
+    (None for the points no granule covers within the tolerance).
+
+A search over the convex hull of the points and the whole campaign finds every
+granule covering some part of the hull at any date: for points spread over a
+large area and many months, most of them cover no point at its sampling date.
+Here each point only takes the granules whose footprint contains it and whose
+acquisition date is within the tolerance of its sampling date. The granules
+are then chosen greedily (the one covering the most points not covered yet,
+the closest in time on ties), which gives a small set of granules covering
+every point that can be covered.
+
+The footprints are indexed in an STRtree (shapely 2), queried with all the
+points at once. Without shapely, their bounds are tested with NumPy and the
+points within the bounds of a footprint are tested against its polygon.
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# Dates of the points and of the granules:
+import datetime
+# Fast arrays computation:
+import numpy as np
+# Footprint polygons (GeoJSON) and point-in-polygon test:
+from aoi_windows import geojson_polygons
+from granule_catalog import points_in_ring, utc_datetime
+# Spatial index of the footprints, if installed (shapely 2):
+try:
+    import shapely
+    from shapely.geometry import shape
+    from shapely.strtree import STRtree
+    if int(shapely.__version__.split('.')[0]) < 2:
+        STRtree = None
+except ImportError:
+    STRtree = None
+
+#%% DEFAULT PARAMETERS
+
+# Days between the sampling date of a point and the acquisition date of a
+# granule matched to it (the revisit time of a Sentinel-1 satellite is 12
+# days, so +/- 6 days finds a pass of each relative orbit):
+MATCH_DAYS = 6
+
+#%% DEFINING FUNCTIONS
+
+# Function to get the sampling points of a data frame: a list of (longitude,
+# latitude, date) by row:
+def sample_points(frame, lon = 'LON', lat = 'LAT', date = 'DATA'):
+    return list(zip(frame[lon].astype(float), frame[lat].astype(float),
+                    frame[date]))
+
+# Function to get the date (UTC) of a sampling or acquisition date (text,
+# date, datetime or pandas timestamp):
+def sample_date(date):
+    if isinstance(date, datetime.date) and \
+            not isinstance(date, datetime.datetime):
+        return date
+    return utc_datetime(date).date()
+
+# Function to get the GeoJSON footprint of a granule (ASF search result or
+# catalog granule):
+def granule_footprint(granule):
+    geometry = granule.geometry
+    if not isinstance(geometry, dict):
+        geometry = geometry.__geo_interface__
+    return geometry
+
+# The following class is the spatial index of the granule footprints (see the
+# module notes):
+class FootprintIndex:
+
+    def __init__(self, granules):
+
+        self.footprints = [granule_footprint(granule) for granule in granules]
+
+        if STRtree is not None:
+            self.tree = STRtree([shape(footprint)
+                                 for footprint in self.footprints])
+            return
+
+        self.tree = None
+        self.rings = [[polygon[0] for polygon in geojson_polygons(footprint)]
+                      for footprint in self.footprints]
+        self.bounds = np.array([
+            [min(ring[:, 0].min() for ring in rings),
+             min(ring[:, 1].min() for ring in rings),
+             max(ring[:, 0].max() for ring in rings),
+             max(ring[:, 1].max() for ring in rings)]
+            for rings in self.rings], dtype = np.float64).reshape(-1, 4)
+
+    # Function to get the pairs (point, footprint) of the points (n, 2:
+    # longitude and latitude) within each footprint, as two arrays of indices:
+    def containing(self, points):
+
+        points = np.asarray(points, dtype = np.float64).reshape(-1, 2)
+
+        if self.tree is not None:
+            pairs = self.tree.query(shapely.points(points),
+                                    predicate = 'intersects')
+            return pairs[0], pairs[1]
+
+        point_indices, footprint_indices = [], []
+        for f, (x0, y0, x1, y1) in enumerate(self.bounds):
+            within = np.flatnonzero((points[:, 0] >= x0) &
+                                    (points[:, 0] <= x1) &
+                                    (points[:, 1] >= y0) &
+                                    (points[:, 1] <= y1))
+            if within.size == 0:
+                continue
+            inside = np.zeros(within.size, dtype = bool)
+            for ring in self.rings[f]:
+                inside |= points_in_ring(points[within], ring)
+            point_indices.append(within[inside])
+            footprint_indices.append(np.full(np.count_nonzero(inside), f))
+
+        if not point_indices:
+            return np.zeros(0, dtype = np.intp), np.zeros(0, dtype = np.intp)
+        return np.concatenate(point_indices), np.concatenate(footprint_indices)
+
+# Function to get the candidate granules of each point: the indices of the
+# granules covering it within +/- "days" of its date, with their distance in
+# days:
+def point_candidates(points, granules, days = MATCH_DAYS, index = None):
+
+    index = index or FootprintIndex(granules)
+    point_dates = [sample_date(point[2]) for point in points]
+    granule_dates = [sample_date(granule.properties['startTime'])
+                     for granule in granules]
+
+    candidates = [{} for _ in points]
+    for p, g in zip(*index.containing([point[:2] for point in points])):
+        distance = abs((granule_dates[g] - point_dates[p]).days)
+        if distance <= days:
+            candidates[p][int(g)] = distance
+
+    return candidates
+
+# Function to match sampling points (a list of (longitude, latitude, date),
+# see "sample_points") to the granules found: the granules covering each
+# point within +/- "days" of its date are its candidates, and the fewest
+# granules covering all the points with candidates are chosen (greedily, see
+# the module notes). It returns the chosen granules (by start time) and the
+# granule matched to each point (None when none covers it):
+def match_granules(points, granules, days = MATCH_DAYS, index = None):
+
+    granules = list(granules)
+    candidates = point_candidates(points, granules, days, index)
+
+    # Points covered by each granule, and their distances in days:
+    covers = {}
+    for p, distances in enumerate(candidates):
+        for g, distance in distances.items():
+            covers.setdefault(g, {})[p] = distance
+
+    uncovered = {p for p, distances in enumerate(candidates) if distances}
+    chosen = []
+    while uncovered:
+        best = min(covers, key = lambda g: (
+            -len(uncovered.intersection(covers[g])),
+            sum(covers[g][p] for p in uncovered.intersection(covers[g])),
+            granules[g].properties['startTime']))
+        chosen.append(best)
+        uncovered.difference_update(covers.pop(best))
+
+    # Each point is matched to the closest chosen granule covering it:
+    matches = []
+    for distances in candidates:
+        options = [g for g in chosen if g in distances]
+        matches.append(granules[min(options, key = distances.get)]
+                       if options else None)
+
+    chosen.sort(key = lambda g: granules[g].properties['startTime'])
+    selected = [granules[g] for g in chosen]
+
+    size = sum(granule.properties.get('bytes') or 0 for granule in selected)
+    total = sum(granule.properties.get('bytes') or 0 for granule in granules)
+    print("%d of %d point(s) matched (+/- %d days) by %d of %d granule(s), "
+          "%.1f of %.1f GB." % (len(points) - matches.count(None), len(points),
+                                days, len(selected), len(granules),
+                                size / 1024 ** 3, total / 1024 ** 3))
+
+    return selected, matches
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to stack the SAR vegetation indices of many dates (co-registered
+scenes, on the same grid) into per-pixel time series, and to aggregate them.
+    Inputs: the index tiles of each date (written by the tiled block engine,
+    sar_vi_engine.py);
+    Outputs: a (time, y, x) cube per index band, memory-mapped ('.cube.npy',
+    with its dates and grid in '.cube.json'), and the temporal aggregates of
+    each pixel (mean, median, percentiles and count of valid observations).
+
+The cube is stored in chunks of (all dates) x (chunk lines) x (chunk columns)
+pixels, so the time series of a chunk are contiguous on disk: a date is
+written chunk by chunk, and the aggregates are computed chunk by chunk, in a
+single streaming pass. Neither the stack nor a full date is ever held in
+memory.
+
+The cube file is a NumPy '.npy' array of shape (chunk rows, chunk columns,
+dates, chunk lines, chunk columns), the last chunks padded; use "IndexCube"
+(read, series, read_chunk) to get the pixels of the (time, y, x) grid.
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+# For the cube metadata:
+import json
+# To silence the warnings of pixels without any valid observation:
+import warnings
+# Fast arrays computation (and memory-mapped files):
+import numpy as np
+
+#%% DEFAULT PARAMETERS
+
+# Lines and columns of the cube chunks (all dates of a chunk are contiguous):
+CHUNK = (256, 256)
+
+# Percentiles of the temporal aggregates (besides mean, median and count):
+PERCENTILES = (10, 90)
+
+#%% INDEX CUBES
+
+# Function to get the metadata file of a cube ("DPSVI.cube.npy" ->
+# "DPSVI.cube.json"):
+def cube_metadata_path(path):
+    return os.path.splitext(str(path))[0] + '.json'
+
+# The following class is the (time, y, x) cube of an index band, memory-mapped
+# on its '.cube.npy' file, in chunks of CHUNK pixels (see the module notes):
+class IndexCube:
+
+    def __init__(self, path, mode = 'r'):
+
+        self.path = str(path)
+        with open(cube_metadata_path(self.path)) as metadata_file:
+            self.metadata = json.load(metadata_file)
+
+        self.band = self.metadata['band']
+        self.dates = self.metadata['dates']
+        self.width = self.metadata['width']
+        self.height = self.metadata['height']
+        self.chunk = tuple(self.metadata['chunk'])
+        self.array = np.load(self.path, mmap_mode = mode)
+
+    # Function to create an empty cube (its pixels are written date by date,
+    # see "CubeBand"). "scenes" are the products of each date, if known:
+    @classmethod
+    def create(cls, path, band, dates, w, h, chunk = CHUNK, scenes = None):
+
+        path = str(path)
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        ch, cw = chunk
+        shape = (-(-h // ch), -(-w // cw), len(dates), ch, cw)
+        np.lib.format.open_memmap(path, mode = 'w+', dtype = np.float32,
+                                  shape = shape).flush()
+
+        metadata = {'band': band, 'dates': [str(k) for k in dates],
+                    'width': w, 'height': h, 'chunk': [ch, cw],
+                    'scenes': [str(k) for k in scenes or ()]}
+        with open(cube_metadata_path(path), 'w') as metadata_file:
+            json.dump(metadata, metadata_file, indent = 1)
+
+        return cls(path, mode = 'r+')
+
+    @property
+    def shape(self):
+        return len(self.dates), self.height, self.width
+
+    # Function to iterate over the chunks of the grid: (x, y, w, h) of each
+    # chunk (smaller at the right and bottom edges):
+    def iter_chunks(self):
+        ch, cw = self.chunk
+        for y in range(0, self.height, ch):
+            for x in range(0, self.width, cw):
+                yield x, y, min(cw, self.width - x), min(ch, self.height - y)
+
+    # Function to get the (dates, h, w) view of the chunk at x, y (its
+    # padding excluded):
+    def read_chunk(self, x, y):
+        ch, cw = self.chunk
+        h, w = min(ch, self.height - y), min(cw, self.width - x)
+        return self.array[y // ch, x // cw, :, :h, :w]
+
+    # Function to write a (h, w) block of the date t at x, y, chunk by chunk:
+    def write(self, t, x, y, block):
+
+        ch, cw = self.chunk
+        h, w = block.shape
+        for y0 in range(y - y % ch, y + h, ch):
+            for x0 in range(x - x % cw, x + w, cw):
+                top, left = max(y, y0), max(x, x0)
+                bottom = min(y + h, y0 + ch)
+                right = min(x + w, x0 + cw)
+                self.array[y0 // ch, x0 // cw, t,
+                           top - y0:bottom - y0, left - x0:right - x0] = \
+                    block[top - y:bottom - y, left - x:right - x]
+
+    # Function to read a (dates, h, w) window of the cube:
+    def read(self, x, y, w, h, dates = slice(None)):
+
+        ch, cw = self.chunk
+        times = np.arange(len(self.dates))[dates]
+        out = np.empty((len(times), h, w), dtype = np.float32)
+        for y0 in range(y - y % ch, y + h, ch):
+            for x0 in range(x - x % cw, x + w, cw):
+                top, left = max(y, y0), max(x, x0)
+                bottom = min(y + h, y0 + ch)
+                right = min(x + w, x0 + cw)
+                out[:, top - y:bottom - y, left - x:right - x] = \
+                    self.array[y0 // ch, x0 // cw, times,
+                               top - y0:bottom - y0, left - x0:right - x0]
+        return out
+
+    # Function to get the time series of a pixel:
+    def series(self, x, y):
+        ch, cw = self.chunk
+        return np.array(self.array[y // ch, x // cw, :, y % ch, x % cw])
+
+    def flush(self):
+        if hasattr(self.array, 'flush'):
+            self.array.flush()
+
+# Function to open the cube of an index band ('.cube.npy'):
+def open_cube(path, mode = 'r'):
+    return IndexCube(path, mode)
+
+# The following class is a date of a cube as a band to write (the targets of
+# the tiled block engine), so the tiles of the date go to their chunks:
+class CubeBand:
+
+    def __init__(self, cube, t):
+        self.cube = cube
+        self.t = t
+
+    def getName(self):
+        return self.cube.band
+
+    def writePixels(self, x, y, w, h, array):
+        self.cube.write(self.t, x, y, np.asarray(array)[:w * h].reshape(h, w))
+
+#%% TEMPORAL AGGREGATES
+
+# Function to get the names of the temporal aggregates of a band (e.g.
+# "DPSVI_mean", "DPSVI_p10", "DPSVI_count"):
+def aggregate_names(band, percentiles = PERCENTILES):
+    return ([band + '_mean', band + '_median'] +
+            [band + '_p%g' % q for q in percentiles] + [band + '_count'])
+
+# Function to compute the temporal aggregates of a chunk (dates, h, w): mean,
+# median and percentiles of the valid (finite) observations, and their
+# count. Pixels without any valid observation are NaN (count 0):
+def chunk_aggregates(data, percentiles = PERCENTILES):
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean = np.nanmean(data, axis = 0)
+        quantiles = np.nanpercentile(data, [50] + list(percentiles),
+                                     axis = 0)
+
+    count = np.count_nonzero(np.isfinite(data), axis = 0)
+
+    return ([mean] + list(quantiles) + [count.astype(np.float32)])
+
+# Function to compute the temporal aggregates of a cube, chunk by chunk, and
+# to write them to the given bands (one per aggregate, in the order of
+# "aggregate_names"). Only a chunk of the stack is held in memory at a time:
+def temporal_aggregates(cube, targets, percentiles = PERCENTILES):
+
+    for x, y, w, h in cube.iter_chunks():
+        data = np.array(cube.read_chunk(x, y))
+        for band, values in zip(targets, chunk_aggregates(data,
+                                                          percentiles)):
+            band.writePixels(x, y, w, h,
+                             np.ascontiguousarray(values, dtype = np.float32))
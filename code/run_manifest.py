@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to keep a manifest of the indices computed for each scene, so a
+rerun of Script 05 only computes what is missing or outdated.
+    Inputs: the scene file, the output directory and the requested indices
+    with their parameters (e.g. DPSVI's vv_max_param, and the AOI the indices
+    are computed within, if any);
+    Output: the indices to compute (those without an up-to-date output), and
+    a manifest updated as each output is completed.
+
+An output is up to date when its record has the same input fingerprint (path,
+size and modification time of the scene's Sigma0_VH and Sigma0_VV rasters),
+the same recipe (formula fingerprint and parameters) and its files are still
+there. Each output is recorded only once written, so a batch killed halfway
+resumes from the outputs not yet recorded.
+
+There is one manifest per scene ("<output directory>/<scene>.manifest.json"),
+so worker processes never write the same file.
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+# For reading and writing the manifest:
+import json
+# To hash the recipes:
+import hashlib
+# To date the records:
+import datetime
+# Identity of the band rasters (as in the statistics cache):
+from band_statistics import file_identity
+# Formula fingerprints and parameters of each index:
+from sar_vi_formulas import (formula_fingerprint, index_bands,
+                             required_parameters)
+
+#%% DEFAULT PARAMETERS
+
+# Bands the indices are computed from:
+INPUT_BANDS = ('Sigma0_VH', 'Sigma0_VV')
+
+#%% DEFINING FUNCTIONS
+
+# Function to get the manifest file of a scene in an output directory:
+def manifest_path(outpath, scene):
+    name = os.path.splitext(os.path.basename(str(scene)))[0]
+    return os.path.join(str(outpath), name + '.manifest.json')
+
+# Function to fingerprint the inputs of a scene (one identity per band):
+def input_fingerprint(scene, band_names = INPUT_BANDS):
+    return {band_name: file_identity(scene, band_name)
+            for band_name in band_names}
+
+# Function to get the parameters an index depends on: DPSVI's VV reference
+# value and the options of the run changing every output (e.g. the AOI):
+def index_parameters(index, vv_max_param = "null", options = None):
+    parameters = dict(options or {})
+    if 'VV_max' in required_parameters(index_bands((index,))):
+        parameters['vv_max_param'] = str(vv_max_param)
+    return parameters
+
+# Function to hash the recipe of an index: the fingerprint of its formulas and
+# its parameters:
+def recipe_hash(index, parameters):
+    recipe = {'formulas': formula_fingerprint(index_bands((index,))),
+              'parameters': parameters}
+    return hashlib.sha1(json.dumps(recipe, sort_keys = True).encode()).hexdigest()
+
+# Function to check the files of an output are still there: the product
+# ('.dim') and the raster of each band, when the product has a '.data'
+# directory:
+def output_exists(output):
+
+    path = output.get('path')
+    if not path or not os.path.exists(path):
+        return False
+
+    data_dir = os.path.splitext(path)[0] + '.data'
+    if not os.path.isdir(data_dir):
+        return True
+
+    return all(os.path.exists(os.path.join(data_dir, band + '.img'))
+               for band in output.get('bands', ()))
+
+# The following class is the manifest of a scene: a record per index, saved
+# to disk (to a temporary file first, so a crash never leaves a half-written
+# manifest) each time an index is recorded:
+class RunManifest:
+
+    def __init__(self, outpath, scene):
+
+        self.scene = str(scene)
+        self.path = manifest_path(outpath, scene)
+        self.inputs = input_fingerprint(scene)
+
+        try:
+            with open(self.path) as manifest_file:
+                self.records = json.load(manifest_file).get('indices', {})
+        except (OSError, ValueError):
+            self.records = {}
+
+    # Function to check whether the output of an index is up to date:
+    def is_current(self, index, vv_max_param = "null", options = None):
+
+        record = self.records.get(index)
+
+        return (record is not None and
+                record['inputs'] == self.inputs and
+                record['recipe'] == recipe_hash(
+                    index, index_parameters(index, vv_max_param, options)) and
+                output_exists(record['output']))
+
+    # Function to get the indices to compute (not up to date), in the given
+    # order:
+    def stale(self, indices, vv_max_param = "null", options = None):
+        return [index for index in indices
+                if not self.is_current(index, vv_max_param, options)]
+
+    # Function to record a computed index and its output (product path and
+    # band names):
+    def record(self, index, output_path, vv_max_param = "null", seconds = None,
+               options = None):
+
+        parameters = index_parameters(index, vv_max_param, options)
+        self.records[index] = {
+            'inputs': self.inputs,
+            'recipe': recipe_hash(index, parameters),
+            'parameters': parameters,
+            'output': {'path': os.path.abspath(str(output_path)),
+                       'bands': index_bands((index,))},
+            'seconds': seconds,
+            'finished': datetime.datetime.now().isoformat(timespec = 'seconds')}
+        self.save()
+
+    # Function to point the records of an output to its new location (e.g.
+    # index bands moved into the scene product):
+    def relocate(self, old_path, new_path):
+
+        for record in self.records.values():
+            if record['output']['path'] == os.path.abspath(str(old_path)):
+                record['output']['path'] = os.path.abspath(str(new_path))
+        self.save()
+
+    def save(self):
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        temporary = self.path + '.%d.tmp' % os.getpid()
+        with open(temporary, 'w') as manifest_file:
+            json.dump({'scene': self.scene, 'indices': self.records},
+                      manifest_file, indent = 1)
+        os.replace(temporary, self.path)
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to read, compute and write raster bands in tiles (blocks of
+lines and columns) instead of one line at a time.
+    Inputs: band objects with the snappy "readPixels" method (Sigma0_VV,
+    Sigma0_VH, ...) and a function (the kernel) computing new arrays from
+    them;
+    Outputs: band objects written through the snappy "writePixels" method.
+
+Every "readPixels"/"writePixels" call goes through the Python-Java bridge
+(JNI), so reading 512 lines at once costs almost the same as reading a
+single one. This module is shared by the Script 05 index functions.
+
+The kernel can run on several threads (NumPy releases the GIL in its
+ufuncs): tiles are read in order by the calling thread, computed by a pool of
+threads and written in order by a single writer thread.
+
+Kernels with a "fills_out" attribute (as the sar_vi_formulas kernels) compute
+their results into output buffers given by the engine, so, like the input
+buffers, they are allocated once per scene and reused from tile to tile.
+
+Given a validity index of the scene (tile_validity.py), tiles without valid
+pixels are written as no-data without being read, and tiles partly valid are
+computed over their valid pixels only.
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# Threads computing tiles concurrently and writing them in order:
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+# Fast arrays computation:
+import numpy as np
+
+#%% DEFAULT TILE SIZE
+
+# Number of lines read at once. A full Sentinel-1 GRD line has ~25k pixels,
+# so a 512 lines tile takes ~50 MB per float32 band:
+TILE_HEIGHT = 512
+
+# Number of columns read at once (None means the whole line):
+TILE_WIDTH = None
+
+# Number of threads computing tiles (1 computes them in the calling thread):
+THREADS = 1
+
+# Value written where the sources have no data:
+FILL_VALUE = np.nan
+
+# Tile states, from a validity index (see tile_validity.py): no valid pixel,
+# some valid pixels, every pixel valid:
+EMPTY, PARTIAL, FULL = 0, 1, 2
+
+#%% DEFINING FUNCTIONS
+
+# Function to split a (w x h) raster into tiles. It yields the tile position
+# and size as (x, y, tile width, tile height), line by line of tiles:
+def iter_tiles(w, h, tile_height = TILE_HEIGHT, tile_width = TILE_WIDTH):
+
+    tile_height = h if tile_height is None else max(1, min(int(tile_height), h))
+    tile_width = w if tile_width is None else max(1, min(int(tile_width), w))
+
+    for y in range(0, h, tile_height):
+        th = min(tile_height, h - y)
+        for x in range(0, w, tile_width):
+            yield x, y, min(tile_width, w - x), th
+
+# Function to get the tile height fitting "n_arrays" float32 arrays of a
+# (w columns) tile within a memory budget (MB):
+def tile_height_for_memory(w, n_arrays, memory_mb):
+    return max(1, int(memory_mb * 2**20 // (4 * w * max(1, n_arrays))))
+
+# Function to read a tile of a band as a (height, width) float32 array. The
+# "out" buffer (flat, at least tw * th long) is reused between tiles, so no
+# new array is allocated for each read:
+def read_tile(band, x, y, tw, th, out = None):
+
+    if out is None or out.size < tw * th:
+        out = np.empty(tw * th, dtype = np.float32)
+
+    flat = band.readPixels(x, y, tw, th, out[:tw * th])
+
+    return np.asarray(flat).reshape(th, tw)
+
+# Function to write a (height, width) array as a tile of a band:
+def write_tile(band, x, y, data):
+
+    th, tw = data.shape
+    flat = np.ascontiguousarray(data, dtype = np.float32).reshape(-1)
+    band.writePixels(x, y, tw, th, flat)
+
+# Function to write the results of a kernel on the target bands:
+def write_results(targets, x, y, results):
+
+    if isinstance(results, np.ndarray):
+        results = (results,)
+
+    for band, result in zip(targets, results):
+        write_tile(band, x, y, result)
+
+# Function to allocate the buffers of a tile: one flat float32 buffer per
+# source band and, when the kernel fills given output arrays, one per target
+# band. With a validity index, there are also buffers for the valid pixels of
+# partial tiles (packed one after the other) and for their mask:
+def tile_buffers(sources, targets, kernel, max_size, validity = None):
+
+    n_outputs = len(targets) if getattr(kernel, 'fills_out', False) else 0
+
+    def new(n, dtype = np.float32):
+        return [np.empty(max_size, dtype = dtype) for _ in range(n)]
+
+    buffers = {'inputs': new(len(sources)), 'outputs': new(n_outputs),
+               'n_targets': len(targets)}
+    if validity is not None:
+        buffers.update(packed_inputs = new(len(sources)),
+                       packed_outputs = new(n_outputs),
+                       masks = new(2, bool))
+
+    return buffers
+
+# Function to fill the results of a tile with the no-data value:
+def fill_tile(out, n_targets, th, tw, fill = FILL_VALUE):
+
+    if not out:
+        return [np.full((th, tw), fill, dtype = np.float32)
+                for _ in range(n_targets)]
+
+    for array in out:
+        array.fill(fill)
+    return out
+
+# Function to run the kernel over the valid pixels of a tile (at x, y) only:
+# they are packed into 1-D arrays, computed, and put back in place, the other
+# pixels being filled with the no-data value:
+def compute_valid_pixels(kernel, blocks, out, buffers, validity,
+                         fill = FILL_VALUE, x = 0, y = 0):
+
+    th, tw = blocks[0].shape
+    mask, scratch = [m[:tw * th].reshape(th, tw) for m in buffers['masks']]
+    validity.mask(blocks, mask, scratch, x, y)
+    n = int(np.count_nonzero(mask))
+
+    packed = [np.compress(mask.reshape(-1), block.reshape(-1),
+                          out = buffer[:n])
+              for block, buffer in zip(blocks, buffers['packed_inputs'])]
+
+    if out:
+        results = kernel(*packed, out = [buffer[:n] for buffer
+                                         in buffers['packed_outputs']])
+    else:
+        results = kernel(*packed)
+        if isinstance(results, np.ndarray):
+            results = (results,)
+
+    out = fill_tile(out, buffers['n_targets'], th, tw, fill)
+    for array, result in zip(out, results):
+        np.place(array, mask, result)
+
+    return out
+
+# Function to read the tiles of the source bands into the tile buffers and to
+# run the kernel over them (its results going into the output buffers, if
+# any). It returns the computation as a function, to be run in this thread or
+# in a pool. With a validity index, empty tiles are not read and partial
+# tiles are computed over their valid pixels:
+def compute_tile(sources, kernel, x, y, tw, th, buffers, validity = None,
+                 fill = FILL_VALUE):
+
+    out = [buffer[:tw * th].reshape(th, tw) for buffer in buffers['outputs']]
+    state = FULL if validity is None else validity.state(x, y, tw, th)
+
+    if state == EMPTY:
+        return lambda: fill_tile(out, buffers['n_targets'], th, tw, fill)
+
+    blocks = [read_tile(band, x, y, tw, th, buffer)
+              for band, buffer in zip(sources, buffers['inputs'])]
+
+    if state == PARTIAL:
+        return lambda: compute_valid_pixels(kernel, blocks, out, buffers,
+                                            validity, fill, x, y)
+    if not out:
+        return lambda: kernel(*blocks)
+    return lambda: kernel(*blocks, out = out)
+
+# Function to run the kernel over the tiles on a pool of threads. The calling
+# thread reads the tiles (in order) and a single writer thread writes their
+# results (in the same order), so the bands are read and written just like in
+# the single thread engine. Each tile in flight has its own set of buffers,
+# which goes back to the reader once the tile is written:
+def process_tiles_threaded(sources, targets, kernel, tiles, max_size, threads,
+                           validity = None, fill = FILL_VALUE):
+
+    in_flight = 2 * threads
+    free = queue.Queue()
+    for _ in range(in_flight):
+        free.put(tile_buffers(sources, targets, kernel, max_size, validity))
+
+    pending = queue.Queue(maxsize = in_flight)
+    errors = []
+
+    def writer():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            x, y, future, buffers = item
+            try:
+                if not errors:
+                    write_results(targets, x, y, future.result())
+            except BaseException as error:
+                errors.append(error)
+            finally:
+                free.put(buffers)
+
+    writer_thread = threading.Thread(target = writer, name = 'tile-writer')
+    writer_thread.start()
+
+    try:
+        with ThreadPoolExecutor(max_workers = threads) as pool:
+            for x, y, tw, th in tiles:
+                if errors:
+                    break
+                buffers = free.get()
+                task = compute_tile(sources, kernel, x, y, tw, th, buffers,
+                                    validity, fill)
+                pending.put((x, y, pool.submit(task), buffers))
+    finally:
+        pending.put(None)
+        writer_thread.join()
+
+    if errors:
+        raise errors[0]
+
+# The following function is the block engine itself. It reads the tiles of
+# every source band, apply the kernel over them and write the kernel results
+# on the target bands (one result per target band, in the same order, or a
+# single array for a single target band). Use tile_height = 1 to reproduce
+# the former line by line processing. With threads > 1, the kernel runs on a
+# pool of threads (it must not keep state between calls). With a validity
+# index of the scene, pixels without data are written with the "fill" value
+# and not computed:
+def process_tiles(sources, targets, kernel, w, h,
+                  tile_height = TILE_HEIGHT, tile_width = TILE_WIDTH,
+                  threads = THREADS, validity = None, fill = FILL_VALUE):
+
+    tiles = list(iter_tiles(w, h, tile_height, tile_width))
+    max_size = max(tw * th for _, _, tw, th in tiles)
+
+    if threads > 1:
+        process_tiles_threaded(sources, targets, kernel, tiles, max_size,
+                               int(threads), validity, fill)
+        return len(tiles)
+
+    buffers = tile_buffers(sources, targets, kernel, max_size, validity)
+
+    for x, y, tw, th in tiles:
+        task = compute_tile(sources, kernel, x, y, tw, th, buffers, validity,
+                            fill)
+        write_results(targets, x, y, task())
+
+    return len(tiles)
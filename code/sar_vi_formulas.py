@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to declare the Dual-pol SAR vegetation indices as formulas over
+the VV and VH bands (and over intermediate expressions shared between them),
+and to plan their computation.
+    Inputs: names of the requested indices (or bands, as for the dual-pol
+    descriptors m_c, H_c and Theta_c);
+    Output: a kernel computing them over a tile of VH and VV, in which each
+    intermediate expression (dB conversion, q = VH/VV, q + 1, ...) is
+    computed only once, whatever the number of indices using it.
+
+Formulas are computed in place into float32 buffers allocated once and
+reused from tile to tile (no temporary array per operation).
+
+To add a new index, add its formula with "add_formula" (and its band names to
+INDEX_BANDS); it will be computed by Script 05 like the other ones.
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# Scratch buffers kept by each thread computing tiles:
+import threading
+# To fingerprint the formulas (run manifest of Script 05):
+import hashlib
+# Fast arrays computation:
+import numpy as np
+
+#%% FORMULA REGISTRY
+
+# Base inputs (tiles of Sigma0, in linear power units):
+INPUTS = ('VH', 'VV')
+
+# Scalar parameters given once per scene (DPSVI's VV reference value):
+PARAMETERS = ('VV_max',)
+
+# Formulas by name, as (names of its inputs, function of these inputs). An
+# input is either a base input, a parameter or another formula. Each function
+# takes the array to fill as first argument ("out") and computes the formula
+# in place, with float32 constants, so no temporary array is allocated:
+FORMULAS = {}
+
+# float32 constants (NumPy scalars in float64, as np.sqrt(2), would turn the
+# float32 arithmetic into float64):
+ONE = np.float32(1)
+THREE = np.float32(3)
+FOUR = np.float32(4)
+TEN = np.float32(10)
+SQRT2 = np.float32(np.sqrt(2))
+RAD2DEG = np.float32(180 / np.pi)
+
+# Function to add a formula (an index or an intermediate expression) to the
+# registry:
+def add_formula(name, inputs, function):
+    for k in inputs:
+        if k not in INPUTS and k not in PARAMETERS and k not in FORMULAS:
+            raise ValueError("Unknown input '%s' in formula '%s'" % (k, name))
+    FORMULAS[name] = (tuple(inputs), function)
+
+# Function to turn a NumPy ufunc into a formula function (e.g. into(np.add)
+# fills "out" with the sum of the inputs):
+def into(ufunc):
+    return lambda out, *args: ufunc(*args, out = out)
+
+# Function to compute a dB band, 10*log10(band):
+def to_dB(out, band):
+    np.log10(band, out = out)
+    return np.multiply(out, TEN, out = out)
+
+# Intermediate expressions shared by several indices:
+add_formula('VV_dB', ('VV',), to_dB)
+add_formula('VH_dB', ('VH',), to_dB)
+add_formula('dB_sum', ('VV_dB', 'VH_dB'), into(np.add))
+add_formula('VV_plus_VH', ('VV', 'VH'), into(np.add))
+add_formula('q_raw', ('VH', 'VV'), into(np.divide))
+add_formula('q_raw_plus_1', ('q_raw',),
+            lambda out, q_raw: np.add(q_raw, ONE, out = out))
+add_formula('q', ('q_raw',),
+            lambda out, q_raw: np.minimum(q_raw, ONE, out = out))
+add_formula('q_plus_1', ('q',), lambda out, q: np.add(q, ONE, out = out))
+add_formula('one_minus_q', ('q',),
+            lambda out, q: np.subtract(ONE, q, out = out))
+add_formula('p1', ('q_plus_1',),
+            lambda out, q_plus_1: np.divide(ONE, q_plus_1, out = out))
+add_formula('p2', ('q', 'q_plus_1'), into(np.divide))
+
+# Function to compute p*log2(p), in place:
+def p_log2_p(out, p):
+    np.log2(p, out = out)
+    return np.multiply(out, p, out = out)
+
+add_formula('p1_log2_p1', ('p1',), p_log2_p)
+add_formula('p2_log2_p2', ('p2',), p_log2_p)
+
+# CR (Cross-Ratio, Frison et al. (2018)), in dB:
+add_formula('CR', ('VV_dB', 'VH_dB'), into(np.divide))
+
+# DpRVIc (Bhogapurapu et al. (2022)), q(q + 3)/(q + 1)^2 with q = VH/VV
+# clipped to 1:
+def dprvic(out, q, q_plus_1):
+    np.add(q, THREE, out = out)
+    np.multiply(out, q, out = out)
+    np.divide(out, q_plus_1, out = out)
+    return np.divide(out, q_plus_1, out = out)
+
+add_formula('DPRVIC', ('q', 'q_plus_1'), dprvic)
+
+# Dual-pol descriptors (Bhogapurapu et al. (2021)): co-pol purity (m_c),
+# pseudo entropy (H_c) and pseudo scattering-type (Theta_c):
+def theta_c(out, q, one_minus_q):
+    # (1 - q)^2/(1 - q + q^2), in degrees:
+    np.multiply(q, q, out = out)
+    np.add(out, one_minus_q, out = out)
+    np.divide(one_minus_q, out, out = out)
+    np.multiply(out, one_minus_q, out = out)
+    np.arctan(out, out = out)
+    return np.multiply(out, RAD2DEG, out = out)
+
+def h_c(out, p1_log2_p1, p2_log2_p2):
+    np.add(p1_log2_p1, p2_log2_p2, out = out)
+    return np.negative(out, out = out)
+
+add_formula('m_c', ('one_minus_q', 'q_plus_1'), into(np.divide))
+add_formula('H_c', ('p1_log2_p1', 'p2_log2_p2'), h_c)
+add_formula('Theta_c', ('q', 'one_minus_q'), theta_c)
+
+# DPSVI (Periasamy (2018)): IDPDD x VDDPI x VH, where IDPDD is
+# (VV_max - VV + VH)/sqrt(2) and VDDPI is (VV + VH)/VV:
+def dpsvi(out, VV, VH, VV_plus_VH, VV_max):
+    np.subtract(VV_max, VV, out = out)
+    np.add(out, VH, out = out)
+    np.divide(out, SQRT2, out = out)
+    np.multiply(out, VV_plus_VH, out = out)
+    np.divide(out, VV, out = out)
+    return np.multiply(out, VH, out = out)
+
+add_formula('DPSVI', ('VV', 'VH', 'VV_plus_VH', 'VV_max'), dpsvi)
+
+# DPSVIm (dos Santos et al. (2021)): (VV^2 + VV*VH)/sqrt(2):
+def dpsvim(out, VV, VV_plus_VH):
+    np.multiply(VV, VV_plus_VH, out = out)
+    return np.divide(out, SQRT2, out = out)
+
+add_formula('DPSVIm', ('VV', 'VV_plus_VH'), dpsvim)
+
+# Pol (normalized polarization, Hird et al. (2017)), in dB:
+def pol(out, VH_dB, VV_dB, dB_sum):
+    np.subtract(VH_dB, VV_dB, out = out)
+    return np.divide(out, dB_sum, out = out)
+
+add_formula('Pol', ('VH_dB', 'VV_dB', 'dB_sum'), pol)
+
+# RVIm (modified RVI, Nasirzadehdizaji et al. (2019)), in dB:
+def rvim(out, VH_dB, dB_sum):
+    np.multiply(VH_dB, FOUR, out = out)
+    return np.divide(out, dB_sum, out = out)
+
+add_formula('RVIm', ('VH_dB', 'dB_sum'), rvim)
+
+# RVI4S1 (Agapiou (2020)), q(q + 3)/(q + 1)^2 with q = VH/VV not clipped:
+add_formula('RVI4S1', ('q_raw', 'q_raw_plus_1'), dprvic)
+
+# NRPB (Normalized Ratio Procedure between Bands, Filgueiras et al. (2019)):
+def nrpb(out, VH, VV, VV_plus_VH):
+    np.subtract(VH, VV, out = out)
+    return np.divide(out, VV_plus_VH, out = out)
+
+add_formula('NRPB', ('VH', 'VV', 'VV_plus_VH'), nrpb)
+
+# Bands written for each index (most indices are a single band named after
+# them):
+INDEX_BANDS = {'CR': ('CR',),
+               'DPRVIC': ('DPRVIC',),
+               'desc': ('m_c', 'H_c', 'Theta_c'),
+               'DPSVI': ('DPSVI',),
+               'DPSVIm': ('DPSVIm',),
+               'Pol': ('Pol',),
+               'RVIm': ('RVIm',),
+               'RVI4S1': ('RVI4S1',),
+               'NRPB': ('NRPB',)}
+
+#%% PLANNING AND EVALUATING FORMULAS
+
+# Function to get the band names of a list of indices:
+def index_bands(indices):
+    return [band for index in indices for band in INDEX_BANDS[index]]
+
+# Function to order the formulas needed by the requested outputs, so that
+# each one comes after its inputs and appears only once (this is where the
+# common sub-expressions are shared):
+def plan(outputs):
+
+    ordered = []
+
+    def visit(name, path = ()):
+        if name in INPUTS or name in PARAMETERS or name in ordered:
+            return
+        if name in path:
+            raise ValueError("Circular formula: %s" % ' -> '.join(path + (name,)))
+        if name not in FORMULAS:
+            raise KeyError("Unknown index or formula: '%s'" % name)
+        for k in FORMULAS[name][0]:
+            visit(k, path + (name,))
+        ordered.append(name)
+
+    for name in outputs:
+        visit(name)
+
+    return ordered
+
+# Function to fingerprint the formulas computing the requested outputs (their
+# names, inputs, code and numeric constants), so outputs computed by former
+# formulas can be told apart. The code differs between Python versions, so an
+# upgrade makes every output look outdated:
+def formula_fingerprint(outputs):
+
+    digest = hashlib.sha1()
+
+    for name in plan(outputs):
+        inputs, function = FORMULAS[name]
+        code = function.__code__
+        constants = [repr(v) for v in code.co_consts
+                     if isinstance(v, (int, float, str, np.generic))]
+        constants += [repr(function.__globals__[k]) for k in code.co_names
+                      if isinstance(function.__globals__.get(k),
+                                    (int, float, np.generic))]
+        closure = [repr(cell.cell_contents)
+                   for cell in (function.__closure__ or ())]
+        digest.update(repr((name, inputs, code.co_code.hex(), constants,
+                            closure)).encode())
+
+    return digest.hexdigest()
+
+# Function to get the parameters needed by the requested outputs:
+def required_parameters(outputs):
+    return sorted(set(k for name in plan(outputs) for k in FORMULAS[name][0]
+                      if k in PARAMETERS))
+
+# Function to share the scratch buffers between intermediate expressions: an
+# expression reuses the buffer of one no longer needed by the next steps. It
+# returns the buffer (slot) of each intermediate and the number of buffers:
+def scratch_slots(steps, outputs):
+
+    last_use = {}
+    for i, name in enumerate(steps):
+        for k in FORMULAS[name][0]:
+            last_use[k] = i
+
+    slots, free, n_slots = {}, [], 0
+    for i, name in enumerate(steps):
+        if name not in outputs:
+            if free:
+                slots[name] = free.pop()
+            else:
+                slots[name] = n_slots
+                n_slots += 1
+        # Buffers are freed after the step, as a step reads its inputs while
+        # writing its result:
+        for k in set(FORMULAS[name][0]):
+            if k in slots and last_use[k] == i:
+                free.append(slots[k])
+
+    return slots, n_slots
+
+# Function to get the number of scratch buffers (per thread) of the kernel
+# computing the requested outputs:
+def scratch_count(outputs):
+    return scratch_slots(plan(outputs), outputs)[1]
+
+# The following class is the kernel given to the block engine: it takes the
+# tiles of the base inputs (in the order of "inputs") and returns the
+# requested outputs. Intermediate expressions are computed into float32
+# scratch buffers, kept by each thread and reused from tile to tile; outputs
+# are computed into the "out" arrays given by the engine (or new arrays):
+class FormulaKernel:
+
+    # The block engine gives the output arrays of each tile ("out"):
+    fills_out = True
+
+    def __init__(self, outputs, inputs = INPUTS, parameters = None):
+
+        self.outputs = list(outputs)
+        self.inputs = tuple(inputs)
+        self.steps = plan(self.outputs)
+        self.slots, self.n_slots = scratch_slots(self.steps, self.outputs)
+
+        missing = [k for k in required_parameters(self.outputs)
+                   if k not in (parameters or {})]
+        if missing:
+            raise ValueError("Missing parameters: %s" % ', '.join(missing))
+        self.parameters = {k: np.float32(v)
+                           for k, v in (parameters or {}).items()}
+
+        self.local = threading.local()
+
+    # Function to get this thread's scratch buffers, viewed with the tile
+    # shape (they only grow, to the largest tile seen):
+    def scratch(self, shape):
+
+        size = int(np.prod(shape))
+        buffers = getattr(self.local, 'buffers', None)
+        if buffers is None or (buffers and buffers[0].size < size):
+            buffers = [np.empty(size, dtype = np.float32)
+                       for _ in range(self.n_slots)]
+            self.local.buffers = buffers
+
+        return {name: buffers[slot][:size].reshape(shape)
+                for name, slot in self.slots.items()}
+
+    def __call__(self, *tiles, out = None):
+
+        shape = tiles[0].shape
+        if out is None:
+            out = [np.empty(shape, dtype = np.float32) for _ in self.outputs]
+
+        values = dict(self.parameters)
+        values.update(zip(self.inputs, tiles))
+
+        targets = self.scratch(shape)
+        targets.update(zip(self.outputs, out))
+
+        for name in self.steps:
+            inputs, function = FORMULAS[name]
+            function(targets[name], *[values[k] for k in inputs])
+            values[name] = targets[name]
+
+        # Outputs which are base inputs (a Sigma0 band) are copied:
+        for name, array in zip(self.outputs, out):
+            if name not in self.steps:
+                np.copyto(array, values[name])
+
+        return out
+
+# Function to build a kernel for the block engine (see FormulaKernel):
+def make_kernel(outputs, inputs = INPUTS, parameters = None):
+    return FormulaKernel(outputs, inputs, parameters)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to chain the preprocessing (Script 03), the cropping (Script 04)
+and the SAR vegetation indices (Script 05) of a scene in memory, writing only
+the final product.
+    Inputs: the terrain-corrected product of a scene, as built by the SNAP
+    operators of Script 03 (GPF products are lazy: nothing is computed yet),
+    with Sigma0_VH and Sigma0_VV bands; an optional AOI (see aoi_windows.py);
+    Outputs: the final product of the scene (the one Script 05 writes when
+    merging): the Sigma0 bands, cropped to the AOI window, and the index
+    bands, as a single BEAM-DIMAP product.
+
+The former flow writes the terrain-corrected scene (Script 03), reads it back
+to write a cropped copy (Script 04), reads that back to write the index
+products, and writes everything again when merging (Script 05): four
+round trips to disk per date. Here, the tiles of the final product are pulled
+through the operator chain by the tiled block engine (sar_vi_engine.py): the
+Sigma0 tiles are computed by SNAP, the indices by the formula kernel, and
+both are written once. The intermediate products can still be written, to
+inspect them ("debug = True"): each one is then written and read back, as in
+the former flow.
+
+NOTE:
+    DPSVI needs the VV max of the scene. With vv_max_param given as a number
+    (the default of Script 05), it costs nothing; as "null" or a percentile,
+    the VV band is computed once more to get it.
+    Lee Sigma (speckle_filter = 'Lee Sigma') needs the 98th percentile of
+    each Sigma0 band: it is estimated from 25 blocks of 256 x 256 pixels
+    spread over the scene (see "sample_percentile" in speckle_filters.py), so
+    only the SNAP tiles holding them are computed before the single pass.
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+# Fast arrays computation:
+import numpy as np
+# snappy modules to write the final product:
+from snappy import ProductIO, Product, ProductData, ProductUtils
+# Tiled block engine (reads and writes many lines at once):
+from sar_vi_engine import (FILL_VALUE, THREADS, TILE_HEIGHT, TILE_WIDTH,
+                           process_tiles)
+# No-data of the Sigma0 bands:
+from tile_validity import NODATA, valid_mask
+# Band statistics computed tile by tile (the VV max of DPSVI):
+from band_statistics import get_vv_max
+# Index formulas and their planner (shared sub-expressions computed once):
+from sar_vi_formulas import index_bands, make_kernel, required_parameters
+# Area of Interest windows (the cropping of Script 04, done lazily):
+from aoi_windows import aoi_window, crop_product
+# Stage telemetry (time, CPU, I/O and memory of each processing stage):
+from stage_telemetry import trace_stage
+# Speckle filters computed tile by tile with NumPy:
+from speckle_filters import FilteredBand
+
+#%% DEFAULT PARAMETERS
+
+# Indices of the final product (the ones Script 05 computes by default):
+PIPELINE_INDICES = ('CR', 'DPRVIC', 'DPSVI', 'DPSVIm', 'Pol', 'RVIm')
+
+# Bands of the final product passed through from the source (kernel inputs):
+SIGMA0_BANDS = (('VH', 'Sigma0_VH'), ('VV', 'Sigma0_VV'))
+
+#%% DEFINING FUNCTIONS
+
+# Function to write a product (an intermediate one, for debugging) and to read
+# it back, so the rest of the chain starts from disk as in the former flow:
+def write_and_read(product, path):
+    ProductIO.writeProduct(product, str(path), 'BEAM-DIMAP')
+    return ProductIO.readProduct(str(path) + '.dim')
+
+# The following class is the kernel of the final product: the formula kernel
+# computing the Sigma0 bands (copied) and the indices, with the indices of
+# the Sigma0 no-data pixels (NaN or "nodata") written as no-data (FILL_VALUE).
+# No validity index is built (it would compute the chain once more), so every
+# pixel is read and the Sigma0 bands keep their own no-data value:
+class MaskedKernel:
+
+    fills_out = True
+
+    def __init__(self, kernel, n_passed, nodata = NODATA,
+                 fill = FILL_VALUE):
+        self.kernel = kernel
+        self.n_passed = n_passed
+        self.nodata = nodata
+        self.fill = fill
+
+    def __call__(self, *tiles, out = None):
+
+        # The no-data pixels are computed too (e.g. log of 0), then masked:
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            out = self.kernel(*tiles, out = out)
+
+        invalid = ~valid_mask(tiles, self.nodata)
+        if invalid.any():
+            for array in out[self.n_passed:]:
+                array[invalid] = self.fill
+
+        return out
+
+# Function to write the final product of a scene: the Sigma0 bands of the
+# (lazy) source, cropped to the AOI window if any, and the index bands, to
+# "path" ('.dim' added), tile by tile. With debug = True, the crop is written
+# and read back before the indices ("<path>_crop.dim"). Given a speckle
+# filter ('Lee Sigma' or 'Refined Lee', see speckle_filters.py), the Sigma0
+# bands are filtered as they are read, instead of by SNAP's operator. The
+# stages are
+# recorded in the trace, if any, as stages of "scene". It returns the path of
+# the final product (None if the AOI is out of the scene):
+def write_final_product(source, path, indices = PIPELINE_INDICES,
+                        vv_max_param = 3, aoi = None,
+                        tile_height = TILE_HEIGHT, tile_width = TILE_WIDTH,
+                        threads = THREADS, debug = False, trace = None,
+                        scene = None, speckle_filter = None):
+
+    path = str(path)
+    scene = scene or path
+
+    if aoi is not None:
+        with trace_stage(trace, scene, 'subset'):
+            window, _ = aoi_window(source, aoi)
+            if window is None:
+                print("AOI out of the scene, nothing to write.")
+                return None
+            print("AOI window: %d x %d pixels at x = %d, y = %d"
+                  % (window[2], window[3], window[0], window[1]))
+            source = crop_product(source, window)
+        if debug:
+            with trace_stage(trace, scene, 'write crop (debug)'):
+                source = write_and_read(source, path + '_crop')
+
+    w = source.getSceneRasterWidth()
+    h = source.getSceneRasterHeight()
+
+    inputs = [k for k, _ in SIGMA0_BANDS]
+    sources = [source.getBand(band_name) for _, band_name in SIGMA0_BANDS]
+    if speckle_filter is not None:
+        sources = [FilteredBand(band, w, h, speckle_filter, threads)
+                   for band in sources]
+    band_names = index_bands(indices)
+
+    parameters = {}
+    if 'VV_max' in required_parameters(band_names):
+        parameters['VV_max'] = get_vv_max(sources[1], w, h, vv_max_param)
+
+    nodata = sources[1].getNoDataValue() \
+        if sources[1].isNoDataValueUsed() else None
+    kernel = MaskedKernel(make_kernel(inputs + band_names, inputs, parameters),
+                          len(inputs), nodata)
+
+    # Final product: the Sigma0 bands and the index bands, on the source grid:
+    name = os.path.basename(path)
+    product = Product(name, source.getProductType(), w, h)
+    ProductUtils.copyMetadata(source, product)
+    ProductUtils.copyGeoCoding(source, product)
+    product.setStartTime(source.getStartTime())
+    product.setEndTime(source.getEndTime())
+
+    targets = []
+    for band in sources:
+        target = product.addBand(band.getName(), ProductData.TYPE_FLOAT32)
+        target.setUnit(band.getUnit())
+        target.setNoDataValue(band.getNoDataValue())
+        target.setNoDataValueUsed(band.isNoDataValueUsed())
+        targets.append(target)
+    for band_name in band_names:
+        target = product.addBand(band_name, ProductData.TYPE_FLOAT32)
+        target.setNoDataValue(FILL_VALUE)
+        target.setNoDataValueUsed(True)
+        targets.append(target)
+
+    product.setProductWriter(ProductIO.getProductWriter('BEAM-DIMAP'))
+    product.writeHeader(path + '.dim')
+
+    print("Writing Sigma0 and %s band(s)..." % (', '.join(band_names)))
+
+    with trace_stage(trace, scene, 'indices and write', w * h):
+        process_tiles(sources, targets, kernel, w, h, tile_height,
+                      tile_width, threads)
+
+    product.closeIO()
+    product.dispose()
+    for band in sources:
+        if isinstance(band, FilteredBand):
+            band.close()
+
+    return path + '.dim'
+
@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to filter the speckle of Sentinel-1 GRD intensities with NumPy,
+tile by tile, instead of SNAP's Speckle-Filter operator.
+    Inputs: an intensity band (snappy or dimap_io, e.g. Sigma0_VV), or a tile
+    of it with a halo of HALO pixels on each side;
+    Outputs: the filtered intensities: Lee Sigma (Lee et al. (2009), the
+    filter of Script 03: 7x7 window, 3x3 target window, sigma 0.9) or
+    Refined Lee (Lee (1981), edge-aligned windows of a 7x7 window).
+
+Each tile is read with a halo (the pixels around it needed by its windows), so
+the tiles are filtered independently and the result does not depend on the
+tile size: the 98th percentile marking the point targets of Lee Sigma is
+estimated once per band, from blocks spread over it (see
+"sample_percentile"), not per tile. A tile is split into strips of lines, filtered by a pool of
+threads (NumPy releases the GIL). "FilteredBand" is a filtered band read as
+any other one by the tiled block engine (sar_vi_engine.py): it feeds the
+index formulas directly, without writing a filtered product.
+
+No-data pixels (NaN or the no-data value of the band) are not used by the
+windows, and are returned as they were read.
+
+References:
+    Lee, J.-S. (1981). Refined filtering of image noise using local
+    statistics. Computer Graphics and Image Processing, 15(4), 380-389.
+    Lee, J.-S., Wen, J.-H., Ainsworth, T. L., Chen, K.-S., & Chen, A. J.
+    (2009). Improved Sigma Filter for Speckle Filtering of SAR Imagery. IEEE
+    Transactions on Geoscience and Remote Sensing, 47(1), 202-213.
+
+NOTE:
+    Within the pipeline of Script 03 (sar_vi_pipeline.py), the filter is
+    applied to the terrain-corrected grid, while SNAP's operator filters the
+    GRD grid before the terrain correction.
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# To filter the strips of a tile on a pool of threads:
+from concurrent.futures import ThreadPoolExecutor
+# Fast arrays computation:
+import numpy as np
+# Tiled block engine:
+from sar_vi_engine import THREADS, TILE_HEIGHT, process_tiles, read_tile
+
+#%% DEFAULT PARAMETERS
+
+# Pixels around a tile needed to filter it (half of the 7x7 window):
+HALO = 3
+
+# Lines of the strips of a tile filtered by each thread:
+STRIP_HEIGHT = 64
+
+# Lee Sigma ranges of single-look to 4-look intensities (Lee et al. (2009),
+# Table 1): sigma -> (A1, A2, revised speckle deviation ηv), for each number
+# of looks:
+SIGMA_RANGES = {
+    1: {0.5: (0.436, 1.920, 0.4057), 0.6: (0.343, 2.210, 0.4954),
+        0.7: (0.254, 2.582, 0.5911), 0.8: (0.168, 3.094, 0.6966),
+        0.9: (0.084, 3.941, 0.8191), 0.95: (0.043, 4.840, 0.8599)},
+    2: {0.5: (0.582, 1.584, 0.2763), 0.6: (0.501, 1.755, 0.3388),
+        0.7: (0.418, 1.972, 0.4062), 0.8: (0.327, 2.260, 0.4819),
+        0.9: (0.221, 2.744, 0.5699), 0.95: (0.152, 3.206, 0.6254)},
+    3: {0.5: (0.652, 1.458, 0.2222), 0.6: (0.580, 1.586, 0.2736),
+        0.7: (0.505, 1.751, 0.3280), 0.8: (0.419, 1.965, 0.3892),
+        0.9: (0.313, 2.320, 0.4624), 0.95: (0.238, 2.656, 0.5084)},
+    4: {0.5: (0.694, 1.385, 0.1921), 0.6: (0.630, 1.495, 0.2348),
+        0.7: (0.560, 1.627, 0.2825), 0.8: (0.480, 1.804, 0.3354),
+        0.9: (0.378, 2.094, 0.3991), 0.95: (0.302, 2.369, 0.4391)}}
+
+# Pixels of a 3x3 window above the 98th percentile making a point target
+# (Lee et al. (2009)):
+POINT_TARGET_COUNT = 5
+
+# Blocks (SAMPLE_GRID x SAMPLE_GRID blocks of SAMPLE_BLOCK pixels a side,
+# evenly spread over the band) estimating the 98th percentile of Lee Sigma:
+SAMPLE_GRID = 5
+SAMPLE_BLOCK = 256
+
+#%% WINDOW STATISTICS
+
+# Function to get the (th, tw) view of a padded tile shifted by dy, dx (the
+# tile being the padded one without its halo):
+def shifted(padded, dy, dx, halo = HALO):
+    th = padded.shape[0] - 2 * halo
+    tw = padded.shape[1] - 2 * halo
+    return padded[halo + dy:halo + dy + th, halo + dx:halo + dx + tw]
+
+# Function to get the offsets of a square window of the given size:
+def square_offsets(size):
+    r = size // 2
+    return [(dy, dx) for dy in range(-r, r + 1) for dx in range(-r, r + 1)]
+
+# Function to get the number, sum and sum of squares of the valid pixels of a
+# window (its offsets) around each pixel of a padded tile. "values" hold 0.0
+# at the invalid pixels:
+def window_sums(values, valid, offsets, halo = HALO):
+
+    n = np.zeros(shifted(values, 0, 0, halo).shape, dtype = np.float32)
+    s = np.zeros_like(n)
+    ss = np.zeros_like(n)
+    square = np.empty_like(n)
+    for dy, dx in offsets:
+        value = shifted(values, dy, dx, halo)
+        n += shifted(valid, dy, dx, halo)
+        s += value
+        np.multiply(value, value, out = square)
+        ss += square
+
+    return n, s, ss
+
+# Function to get the mean and variance from window sums (NaN without valid
+# pixels):
+def mean_variance(n, s, ss):
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        mean = s / n
+        variance = np.maximum(ss / n - mean * mean, 0.0)
+    return mean, variance
+
+# Function to get the MMSE (minimum mean square error) estimate of pixels
+# from the mean and variance of their window, for a speckle of relative
+# deviation "speckle" (Lee's filter): the weight of the pixel grows with the
+# variance not explained by the speckle:
+def mmse(z, mean, variance, speckle):
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        signal = (variance - mean * mean * speckle ** 2) / (1.0 + speckle ** 2)
+        weight = np.clip(signal / variance, 0.0, 1.0)
+    weight[~np.isfinite(weight)] = 0.0
+
+    return mean + weight * (z - mean)
+
+# Function to prepare a padded tile: the values (0.0 at the no-data pixels,
+# NaN or "nodata") and their validity:
+def valid_values(padded, nodata = None):
+
+    valid = np.isfinite(padded)
+    if nodata is not None:
+        valid &= padded != nodata
+
+    return np.where(valid, padded, 0.0).astype(np.float32), valid
+
+#%% FILTERS
+
+# Lee Sigma filter of a padded tile (HALO pixels around the tile): each pixel
+# is estimated from the pixels of its window within the sigma range of the
+# a priori MMSE estimate of its target window; point targets (at least
+# POINT_TARGET_COUNT pixels of a 3x3 window above the 98th percentile "z98"
+# of the band, see "FilteredBand"; the one of the padded tile if not given)
+# are not filtered. It returns the filtered (th, tw) tile:
+def lee_sigma(padded, looks = 1, sigma = 0.9, window = 7, target_window = 3,
+              z98 = None, nodata = None, halo = HALO):
+
+    try:
+        a1, a2, speckle = SIGMA_RANGES[int(looks)][sigma]
+    except KeyError:
+        raise ValueError("Lee Sigma ranges are known for 1 to 4 looks and "
+                         "sigma in %s" % sorted(SIGMA_RANGES[1]))
+    if window // 2 > halo or target_window // 2 + 1 > halo:
+        raise ValueError("A halo of %d pixels is too small for a %dx%d window"
+                         % (halo, window, window))
+
+    values, valid = valid_values(padded, nodata)
+    z = shifted(padded, 0, 0, halo)
+    z_valid = shifted(valid, 0, 0, halo)
+
+    # A priori mean: MMSE estimate of the target window (speckle of the
+    # number of looks):
+    mean, variance = mean_variance(*window_sums(
+        values, valid, square_offsets(target_window), halo))
+    prior = mmse(z, mean, variance, 1.0 / np.sqrt(looks))
+    low, high = a1 * prior, a2 * prior
+
+    # Pixels of the window within the sigma range:
+    # (buffers reused from offset to offset):
+    n = np.zeros(z.shape, dtype = np.float32)
+    s = np.zeros_like(n)
+    ss = np.zeros_like(n)
+    selected = np.empty(z.shape, dtype = bool)
+    inside = np.empty(z.shape, dtype = bool)
+    selected_value = np.empty_like(n)
+    for dy, dx in square_offsets(window):
+        value = shifted(values, dy, dx, halo)
+        np.greater_equal(value, low, out = selected)
+        np.less_equal(value, high, out = inside)
+        selected &= inside
+        selected &= shifted(valid, dy, dx, halo)
+        n += selected
+        np.multiply(value, selected, out = selected_value)
+        s += selected_value
+        selected_value *= selected_value
+        ss += selected_value
+
+    mean, variance = mean_variance(n, s, ss)
+    out = mmse(z, mean, variance, speckle)
+    np.copyto(out, prior, where = n == 0)
+
+    # Point targets (and their 3x3 windows) keep their values:
+    if z98 is None:
+        z98 = np.percentile(values[valid], 98) if valid.any() else np.inf
+    bright = (values >= z98) & valid
+    count = sum(shifted(bright, dy, dx, 1).astype(np.int8)
+                for dy, dx in square_offsets(3))
+    targets = np.zeros(valid.shape, dtype = bool)
+    targets[1:-1, 1:-1] = count >= POINT_TARGET_COUNT
+    keep = np.zeros(z.shape, dtype = bool)
+    for dy, dx in square_offsets(3):
+        keep |= shifted(targets, dy, dx, halo)
+
+    np.copyto(out, z, where = keep | ~z_valid)
+
+    return out.astype(np.float32)
+
+# Edge-aligned windows of the Refined Lee filter, within the 7x7 window: for
+# each edge direction (the direction of the largest gradient between the 3x3
+# sub-window means), the two halves of the window on each side of the edge:
+def refined_lee_masks():
+
+    i, j = np.mgrid[0:7, 0:7]
+    return [((j <= 3), (j >= 3)),          # vertical edge: left, right
+            ((j >= i), (j <= i)),          # diagonal: upper right, lower left
+            ((i <= 3), (i >= 3)),          # horizontal edge: top, bottom
+            ((i + j <= 6), (i + j >= 6))]  # anti-diagonal: upper left, lower
+                                           # right
+
+# Sub-window means compared on each side of each edge (rows and columns of
+# the 3x3 grid of 3x3 sub-windows):
+REFINED_LEE_SIDES = [((1, 0), (1, 2)), ((0, 2), (2, 0)), ((0, 1), (2, 1)),
+                     ((0, 0), (2, 2))]
+
+# Refined Lee filter of a padded tile (HALO pixels around the tile): the 7x7
+# window is split into 3x3 sub-windows, the edge direction is the one of the
+# largest gradient between their means, and each pixel is the MMSE estimate
+# of the half window on its side of the edge (speckle of the number of
+# looks). It returns the filtered (th, tw) tile:
+def refined_lee(padded, looks = 1, nodata = None, halo = HALO):
+
+    if halo < 3:
+        raise ValueError("A halo of %d pixels is too small for a 7x7 window"
+                         % halo)
+
+    values, valid = valid_values(padded, nodata)
+    z = shifted(padded, 0, 0, halo)
+    z_valid = shifted(valid, 0, 0, halo)
+
+    # Means of the 3x3 sub-windows (of every pixel but the outer ring of the
+    # padded tile), centered 2 pixels apart:
+    n, s, _ = window_sums(values, valid, square_offsets(3), halo = 1)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        box = s / n
+    means = [[shifted(box, 2 * (a - 1), 2 * (b - 1), halo - 1)
+              for b in range(3)] for a in range(3)]
+
+    # Largest gradient (NaN sub-windows, without valid pixels, are ignored):
+    gradients = np.stack([np.abs(means[1][2] - means[1][0]),
+                          np.abs(means[0][2] - means[2][0]),
+                          np.abs(means[0][1] - means[2][1]),
+                          np.abs(means[0][0] - means[2][2])])
+    direction = np.argmax(np.nan_to_num(gradients, nan = -1.0), axis = 0)
+
+    # Statistics of the half window of each pixel, gathered from the pixels
+    # of the half windows chosen (flat indices within the padded tile):
+    out = np.empty(z.shape, dtype = np.float32)
+    center = means[1][1]
+    flat_values, flat_valid = values.reshape(-1), valid.reshape(-1)
+    line = padded.shape[1]
+    for k, (masks, sides) in enumerate(zip(refined_lee_masks(),
+                                           REFINED_LEE_SIDES)):
+        first, second = [means[a][b] for a, b in sides]
+        closer_first = np.abs(center - first) <= np.abs(center - second)
+        for mask, side in zip(masks, (closer_first, ~closer_first)):
+            rows, cols = np.nonzero((direction == k) & side)
+            if not rows.size:
+                continue
+            pixels = (rows + halo) * line + cols + halo
+            n = np.zeros(rows.size, dtype = np.float32)
+            s = np.zeros_like(n)
+            ss = np.zeros_like(n)
+            for dy, dx in zip(*np.nonzero(mask)):
+                index = pixels + ((dy - 3) * line + dx - 3)
+                value = flat_values[index]
+                n += flat_valid[index]
+                s += value
+                ss += value * value
+            mean, variance = mean_variance(n, s, ss)
+            out[rows, cols] = mmse(z[rows, cols], mean, variance,
+                                   1.0 / np.sqrt(looks))
+
+    np.copyto(out, z, where = ~z_valid | ~np.isfinite(out))
+
+    return out
+
+# Speckle filters by name (the names of SNAP's Speckle-Filter operator):
+FILTERS = {'Lee Sigma': lee_sigma, 'Refined Lee': refined_lee}
+
+#%% FILTERED BANDS
+
+# Function to get the first pixels of the blocks sampled along a side of n
+# pixels (every block when they cover the side):
+def sample_starts(n, grid = SAMPLE_GRID, block = SAMPLE_BLOCK):
+    if grid * block >= n:
+        return range(0, n, block)
+    return np.linspace(0, n - block, grid).astype(int)
+
+# Function to estimate a percentile of a band from blocks evenly spread over
+# it (the whole band when they cover it), no-data pixels (NaN or "nodata")
+# left out. Only these blocks are read, so a band computed on the fly (e.g. a
+# chain of SNAP operators) is only computed there. It returns infinity for a
+# band without valid pixels:
+def sample_percentile(band, w, h, p, nodata = None, grid = SAMPLE_GRID,
+                      block = SAMPLE_BLOCK):
+
+    samples = []
+    for y in sample_starts(h, grid, block):
+        for x in sample_starts(w, grid, block):
+            tile = read_tile(band, x, y, min(block, w - x), min(block, h - y))
+            values, valid = valid_values(tile, nodata)
+            samples.append(values[valid])
+
+    samples = np.concatenate(samples)
+    return float(np.percentile(samples, p)) if samples.size else np.inf
+
+# Function to read a tile of a band with a halo of pixels around it: pixels
+# out of the raster are NaN (they are not used by the windows):
+def read_padded(band, x, y, tw, th, w, h, halo = HALO):
+
+    padded = np.full((th + 2 * halo, tw + 2 * halo), np.nan,
+                     dtype = np.float32)
+
+    x0, y0 = max(x - halo, 0), max(y - halo, 0)
+    x1, y1 = min(x + tw + halo, w), min(y + th + halo, h)
+    buffer = np.empty((y1 - y0) * (x1 - x0), dtype = np.float32)
+    block = np.asarray(band.readPixels(x0, y0, x1 - x0, y1 - y0, buffer))
+
+    padded[y0 - y + halo:y1 - y + halo, x0 - x + halo:x1 - x + halo] = \
+        block.reshape(y1 - y0, x1 - x0)
+
+    return padded
+
+# Function to filter a padded tile strip by strip of lines (each strip with
+# its own halo, taken from the padded tile), on a pool of threads if given:
+def filter_strips(padded, function, parameters, strip_height = STRIP_HEIGHT,
+                  pool = None, halo = HALO):
+
+    th = padded.shape[0] - 2 * halo
+    out = np.empty((th, padded.shape[1] - 2 * halo), dtype = np.float32)
+
+    def run(y):
+        strip = padded[y:y + min(strip_height, th - y) + 2 * halo]
+        out[y:y + strip.shape[0] - 2 * halo] = function(strip, **parameters)
+
+    starts = range(0, th, strip_height)
+    if pool is None:
+        for y in starts:
+            run(y)
+    else:
+        for future in [pool.submit(run, y) for y in starts]:
+            future.result()
+
+    return out
+
+# The following class is a speckle-filtered band: its "readPixels" reads the
+# tile of the source band with a halo, filters it (strips of lines on
+# "threads" threads) and returns the filtered pixels. It can be a source of
+# the tiled block engine (e.g. feeding the index kernels directly), or of
+# "filter_band". Other methods are those of the source band. Unless given
+# (z98), the 98th percentile of Lee Sigma is estimated once for the band (see
+# "sample_percentile"):
+class FilteredBand:
+
+    def __init__(self, band, w, h, filter_name = 'Lee Sigma',
+                 threads = THREADS, strip_height = STRIP_HEIGHT, **parameters):
+
+        self.band = band
+        self.w, self.h = w, h
+        self.function = FILTERS[filter_name]
+        self.strip_height = strip_height
+        self.pool = ThreadPoolExecutor(threads) if threads > 1 else None
+
+        if 'nodata' not in parameters and band.isNoDataValueUsed():
+            parameters['nodata'] = band.getNoDataValue()
+        if self.function is lee_sigma and parameters.get('z98') is None:
+            parameters['z98'] = sample_percentile(band, w, h, 98,
+                                                  parameters.get('nodata'))
+        self.parameters = parameters
+
+    def __getattr__(self, name):
+        return getattr(self.band, name)
+
+    def readPixels(self, x, y, w, h, array = None):
+
+        if array is None:
+            array = np.empty(w * h, dtype = np.float32)
+
+        padded = read_padded(self.band, x, y, w, h, self.w, self.h)
+
+        out = np.asarray(array)[:w * h].reshape(h, w)
+        out[...] = filter_strips(padded, self.function, self.parameters,
+                                 self.strip_height, self.pool)
+
+        return array
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+# Function to write the speckle-filtered pixels of a band to another one
+# (e.g. a band of a new product), tile by tile:
+def filter_band(source, target, w, h, filter_name = 'Lee Sigma',
+                tile_height = TILE_HEIGHT, threads = THREADS, **parameters):
+
+    band = FilteredBand(source, w, h, filter_name, threads, **parameters)
+    try:
+        process_tiles([band], [target], lambda tile: tile, w, h, tile_height,
+                      None, 1)
+    finally:
+        band.close()
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to record where the processing time goes, scene by scene and
+stage by stage, in Scripts 03 (preprocessing), 04 (cropping) and 05 (SAR
+vegetation indices).
+    Inputs: the stages of each scene, wrapped in "with trace.stage(scene,
+    name, pixels)" blocks;
+    Outputs: a JSON-lines trace (a record per scene and stage: wall time, CPU
+    time, bytes read and written, peak resident memory and pixels processed)
+    and a summary table per stage at the end of the run.
+
+Worker processes (batch_processing.py) append their records to the same trace
+file, so the summary of a run covers all of them (records carry a run id).
+
+NOTE:
+    SNAP operators (GPF.createProduct) are lazy: creating them only builds the
+    processing graph, and their pixels are computed as the product is written.
+    So the time of the operator stages (orbit, noise removal, calibration,
+    speckle filtering, terrain correction, subset) is their setup time, and
+    the computation of the whole chain is in the 'write' stage.
+
+CPU time is the one of the whole process (Python and the Java Virtual Machine
+threads of snappy), and can exceed the wall time. Bytes read and written are
+those of the process to the storage (psutil if installed, "/proc/self/io"
+on Linux, block counts otherwise). The peak resident memory is reset at each
+stage where the system allows it (Linux); elsewhere it is the peak of the
+process so far.
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories, files and processes:
+import os
+# For writing and reading the trace:
+import json
+# To known processing time and to date the records:
+import time
+import datetime
+# To make the stages "with" blocks:
+import contextlib
+# Process resources (peak memory and block counts), not on Windows:
+try:
+    import resource
+except ImportError:
+    resource = None
+# Process counters on any system, if installed:
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+#%% PROCESS COUNTERS
+
+# Function to get the bytes read and written by the process to the storage
+# (None if unknown):
+def io_bytes():
+
+    if psutil is not None:
+        counters = psutil.Process().io_counters()
+        return counters.read_bytes, counters.write_bytes
+
+    try:
+        with open('/proc/self/io') as io_file:
+            fields = dict(line.split(':') for line in io_file)
+        return int(fields['read_bytes']), int(fields['write_bytes'])
+    except (OSError, KeyError, ValueError):
+        pass
+
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_inblock * 512, usage.ru_oublock * 512
+
+    return None, None
+
+# Function to reset the peak resident memory of the process (Linux only). It
+# returns whether it was reset:
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as refs_file:
+            refs_file.write('5')
+        return True
+    except OSError:
+        return False
+
+# Function to get the peak resident memory (MB) of the process (since the last
+# reset, on Linux):
+def peak_rss_mb():
+
+    try:
+        with open('/proc/self/status') as status_file:
+            for line in status_file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss) / 2**20
+    if resource is not None:
+        # ru_maxrss is in KB on Linux:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    return None
+
+#%% TRACE
+
+# Function to get a new run id (the date and the process id):
+def new_run_id():
+    return datetime.datetime.now().strftime('%Y%m%dT%H%M%S') + \
+        '-%d' % os.getpid()
+
+# The following class is the stage trace of a run: the records of its stages,
+# kept in memory and appended to the trace file (JSON lines), if any. It can
+# be given to worker processes, which append their records to the same file:
+class StageTrace:
+
+    def __init__(self, path = None, script = None, run = None):
+
+        self.path = None if path is None else os.path.abspath(str(path))
+        self.script = script
+        self.run = run or new_run_id()
+        self.records = []
+
+    # Function to record a stage of a scene, as a "with" block. The record is
+    # given to the block, so the pixels (or other fields) can be set within
+    # it. A stage raising an error is recorded too (status 'error'):
+    @contextlib.contextmanager
+    def stage(self, scene, name, pixels = None, **fields):
+
+        record = dict(fields, run = self.run, script = self.script,
+                      scene = os.path.basename(str(scene)), stage = name,
+                      pid = os.getpid(), pixels = pixels,
+                      started = datetime.datetime.now().isoformat(
+                          timespec = 'seconds'))
+
+        reset_peak_rss()
+        read_before, written_before = io_bytes()
+        cpu_before = time.process_time()
+        wall_before = time.perf_counter()
+
+        try:
+            yield record
+            record['status'] = 'ok'
+        except BaseException as error:
+            record['status'] = 'error: %s' % type(error).__name__
+            raise
+        finally:
+            record['wall_s'] = time.perf_counter() - wall_before
+            record['cpu_s'] = time.process_time() - cpu_before
+            read_after, written_after = io_bytes()
+            if read_before is not None:
+                record['read_bytes'] = read_after - read_before
+                record['written_bytes'] = written_after - written_before
+            record['peak_rss_mb'] = peak_rss_mb()
+            if record['pixels'] and record['wall_s'] > 0:
+                record['mpixel_s'] = record['pixels'] / record['wall_s'] / 1e6
+            self.add(record)
+
+    # Function to keep a record and to append it to the trace file (a single
+    # write of a whole line, so the records of several processes are not
+    # mixed):
+    def add(self, record):
+
+        self.records.append(record)
+        if self.path is None:
+            return
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok = True)
+        with open(self.path, 'a') as trace_file:
+            trace_file.write(json.dumps(record) + '\n')
+
+    # Function to get the records of the run: from the trace file (those of
+    # every process; none if no stage was recorded yet), or the ones kept in
+    # memory without a file:
+    def run_records(self):
+        if self.path is None:
+            return list(self.records)
+        if not os.path.exists(self.path):
+            return []
+        return read_trace(self.path, self.run)
+
+    def print_summary(self):
+        records = self.run_records()
+        if not records:
+            print("No stages recorded in this run.")
+            return
+        print(summary_table(records))
+
+# Function to record a stage with a trace that may be None (no recording):
+def trace_stage(trace, scene, name, pixels = None, **fields):
+    if trace is None:
+        return contextlib.nullcontext({})
+    return trace.stage(scene, name, pixels, **fields)
+
+# Function to read the records of a trace file (of a run only, if given):
+def read_trace(path, run = None):
+
+    records = []
+    with open(path) as trace_file:
+        for line in trace_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if run is None or record.get('run') == run:
+                records.append(record)
+
+    return records
+
+#%% SUMMARY
+
+# Function to summarize records per stage (in the order they first appear):
+# number of records, total and mean wall time, total CPU time, MB read and
+# written, maximum peak resident memory, throughput (Mpixel/s over the stages
+# with pixels) and share of the total wall time:
+def summarize(records):
+
+    stages = {}
+    for record in records:
+        stage = stages.setdefault(record['stage'], {
+            'stage': record['stage'], 'count': 0, 'errors': 0,
+            'wall_s': 0.0, 'cpu_s': 0.0, 'read_mb': 0.0, 'written_mb': 0.0,
+            'peak_rss_mb': 0.0, 'pixels': 0, 'pixel_wall_s': 0.0})
+        stage['count'] += 1
+        stage['errors'] += record.get('status', 'ok') != 'ok'
+        stage['wall_s'] += record['wall_s']
+        stage['cpu_s'] += record['cpu_s']
+        stage['read_mb'] += (record.get('read_bytes') or 0) / 2**20
+        stage['written_mb'] += (record.get('written_bytes') or 0) / 2**20
+        stage['peak_rss_mb'] = max(stage['peak_rss_mb'],
+                                   record.get('peak_rss_mb') or 0)
+        if record.get('pixels'):
+            stage['pixels'] += record['pixels']
+            stage['pixel_wall_s'] += record['wall_s']
+
+    total = sum(stage['wall_s'] for stage in stages.values()) or 1.0
+    for stage in stages.values():
+        stage['mean_wall_s'] = stage['wall_s'] / stage['count']
+        stage['share'] = stage['wall_s'] / total
+        stage['mpixel_s'] = stage['pixels'] / stage['pixel_wall_s'] / 1e6 \
+            if stage['pixel_wall_s'] > 0 else None
+
+    return list(stages.values())
+
+# Function to format the summary of records as a table:
+def summary_table(records):
+
+    lines = ["%-20s %5s %10s %9s %10s %10s %10s %9s %9s %6s"
+             % ('stage', 'n', 'wall (s)', 'mean (s)', 'CPU (s)', 'read (MB)',
+                'write (MB)', 'peak (MB)', 'Mpixel/s', 'share')]
+    for stage in summarize(records):
+        mpixel_s = '%9.2f' % stage['mpixel_s'] \
+            if stage['mpixel_s'] is not None else '%9s' % '-'
+        lines.append("%-20s %5d %10.2f %9.2f %10.2f %10.1f %10.1f %9.1f %s "
+                     "%5.1f%%"
+                     % (stage['stage'][:20], stage['count'], stage['wall_s'],
+                        stage['mean_wall_s'], stage['cpu_s'],
+                        stage['read_mb'], stage['written_mb'],
+                        stage['peak_rss_mb'], mpixel_s, 100 * stage['share']))
+        if stage['errors']:
+            lines[-1] += "  (%d failed)" % stage['errors']
+
+    scenes = len(set(record['scene'] for record in records))
+    lines.append("%d record(s) of %d scene(s)" % (len(records), scenes))
+
+    return '\n'.join(lines)
+
+#%% PRINTING THE SUMMARY OF A TRACE FILE
+
+# python stage_telemetry.py path_to/trace.jsonl (all runs, or --run <id>):
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = __doc__.split('\n')[2])
+    parser.add_argument('trace', help = "JSON-lines trace file")
+    parser.add_argument('--run', default = None,
+                        help = "run id (all runs by default)")
+    args = parser.parse_args()
+
+    print(summary_table(read_trace(args.trace, args.run)))
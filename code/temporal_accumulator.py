@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to keep per-pixel seasonal statistics of the SAR vegetation
+indices up to date as new Sentinel-1 dates arrive, without aggregating the
+whole season again.
+    Inputs: the index bands of each new scene (e.g. DPSVIm and DPRVIc of the
+    "_VIs.dim" products written by Script 05);
+    Outputs: the accumulator state, a BEAM-DIMAP product ("season-
+    statistics.dim", next to the index products) holding for each index band
+    the count of valid observations, the running mean and sum of squared
+    deviations (Welford's algorithm) and the running minimum and maximum,
+    plus the list of scenes already accumulated ("season-statistics.
+    scenes.json").
+
+A new scene updates the state in a single streaming pass, tile by tile: only
+the index bands of that scene and the state are read, so the cost of an update
+is the one of a scene, whatever the number of dates accumulated before. A
+scene already accumulated is not added twice.
+
+The sample variance and standard deviation are derived from the state (see
+"TemporalAccumulator.statistics"). Mean and squared deviations are kept in
+float64, so many dates do not lose precision.
+
+NOTE:
+    An update interrupted half-way (e.g. a crash) leaves the state partly
+    updated; it is detected the next time the state is opened, and the state
+    must then be built again from the index products ("rebuild = True").
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+# For the list of accumulated scenes:
+import json
+# To date the records:
+import datetime
+# Fast arrays computation:
+import numpy as np
+# Tiles of the rasters (the same ones as the tiled block engine):
+from sar_vi_engine import FILL_VALUE, TILE_HEIGHT, iter_tiles, read_tile
+# BEAM-DIMAP products memory-mapped with NumPy (the accumulator state):
+from dimap_io import create_product, open_product
+
+#%% DEFAULT PARAMETERS
+
+# Accumulated statistics of each index band and their data types:
+STATISTICS = ('count', 'mean', 'm2', 'min', 'max')
+STATISTIC_TYPES = {'count': 'int32', 'mean': 'float64', 'm2': 'float64',
+                   'min': 'float32', 'max': 'float32'}
+
+#%% DEFINING FUNCTIONS
+
+# Function to get the name of a state band (e.g. "DPSVIm_mean"):
+def state_band_name(band, statistic):
+    return band + '_' + statistic
+
+# Function to get the file listing the accumulated scenes of a state:
+def scenes_path(path):
+    return os.path.splitext(str(path))[0] + '.scenes.json'
+
+# Function to update running statistics with the values of a new date
+# (Welford's algorithm; NaN values are not observations). The state arrays
+# (count, mean, m2, min and max) are updated in place:
+def welford_update(values, count, mean, m2, minimum, maximum):
+
+    values = np.asarray(values, dtype = np.float64)
+    valid = np.isfinite(values)
+
+    new_count = count + valid
+    old_mean = np.asarray(mean, dtype = np.float64)
+    delta = np.where(valid, values - old_mean, 0.0)
+    new_mean = old_mean + np.divide(delta, new_count,
+                                    out = np.zeros_like(delta),
+                                    where = valid)
+
+    m2[...] = m2 + delta * np.where(valid, values - new_mean, 0.0)
+    mean[...] = new_mean
+    count[...] = new_count
+    minimum[...] = np.fmin(minimum, values)
+    maximum[...] = np.fmax(maximum, values)
+
+# The following class is the accumulator state of some index bands: a
+# BEAM-DIMAP product on the grid of the index products, with a band per
+# statistic of each index band, and the list of scenes accumulated. It is
+# created on the grid of "like" (an index product) when it does not exist:
+class TemporalAccumulator:
+
+    def __init__(self, path, bands = None, like = None, rebuild = False):
+
+        self.path = os.path.abspath(str(path))
+        self.scenes_path = scenes_path(self.path)
+
+        if rebuild or not os.path.exists(self.path):
+            if bands is None or like is None:
+                raise ValueError("The index bands and a product on their "
+                                 "grid are needed to create %s" % self.path)
+            self.create(bands, like)
+            return
+
+        with open(self.scenes_path) as scenes_file:
+            log = json.load(scenes_file)
+        if log.get('updating'):
+            raise RuntimeError("The update of %s with %s was interrupted: "
+                               "build the state again (rebuild = True)"
+                               % (self.path, log['updating']))
+
+        self.bands = log['bands']
+        self.scenes = log['scenes']
+        self.product = open_product(self.path)
+        for band in self.product.bands.values():
+            band.writable = True
+
+    # Function to create an empty state (no observation: count, mean and m2
+    # zero; minimum and maximum NaN):
+    def create(self, bands, like):
+
+        self.bands = list(bands)
+        self.scenes = {}
+        self.product = create_product(self.path, like)
+
+        for band in self.bands:
+            for statistic in STATISTICS:
+                state = self.product.add_band(
+                    state_band_name(band, statistic),
+                    STATISTIC_TYPES[statistic],
+                    no_data_value = None if statistic == 'count'
+                    else FILL_VALUE)
+                if statistic in ('min', 'max'):
+                    state.array[...] = FILL_VALUE
+
+        self.product.save()
+        self.save_scenes()
+
+    def save_scenes(self, updating = None):
+
+        temporary = self.scenes_path + '.%d.tmp' % os.getpid()
+        with open(temporary, 'w') as scenes_file:
+            json.dump({'bands': self.bands, 'scenes': self.scenes,
+                       'updating': updating}, scenes_file, indent = 1)
+        os.replace(temporary, self.scenes_path)
+
+    def has(self, scene):
+        return os.path.basename(str(scene)) in self.scenes
+
+    # Function to get the (h, w) windows of the state arrays of a band:
+    def state_windows(self, band, x, y, w, h):
+        return [self.product.getBand(state_band_name(band, statistic))
+                .array[y:y + h, x:x + w] for statistic in STATISTICS]
+
+    # Function to add a scene to the state: "sources" maps each index band to
+    # the band of the scene holding it (snappy or dimap_io). They are read
+    # tile by tile, and the state is saved at the end. "date" and "recipes"
+    # (e.g. the recipe hashes of the run manifest) are recorded with the
+    # scene. It returns False when the scene was already accumulated:
+    def add_scene(self, scene, sources, date = None, recipes = None,
+                  tile_height = TILE_HEIGHT):
+
+        scene = os.path.basename(str(scene))
+        if scene in self.scenes:
+            return False
+
+        missing = [band for band in self.bands if band not in sources]
+        if missing:
+            raise ValueError("%s has no %s band(s)" % (scene,
+                                                       ', '.join(missing)))
+
+        w = self.product.getSceneRasterWidth()
+        h = self.product.getSceneRasterHeight()
+        for band, source in sources.items():
+            if (source.getRasterWidth(), source.getRasterHeight()) != (w, h):
+                raise ValueError("The %s band of %s is not on the grid of %s"
+                                 % (band, scene, self.path))
+
+        self.save_scenes(updating = scene)
+
+        buffer = np.empty(w * min(tile_height or h, h), dtype = np.float32)
+        for band in self.bands:
+            for x, y, tw, th in iter_tiles(w, h, tile_height, None):
+                values = read_tile(sources[band], x, y, tw, th, buffer)
+                welford_update(values, *self.state_windows(band, x, y,
+                                                           tw, th))
+
+        self.product.save()
+        self.scenes[scene] = {
+            'date': None if date is None else str(date),
+            'recipes': recipes,
+            'added': datetime.datetime.now().isoformat(timespec = 'seconds')}
+        self.save_scenes()
+
+        return True
+
+    # Function to get the statistics of a band within a window (the whole
+    # grid by default): count, mean, sample variance and standard deviation
+    # (NaN with less than two observations), minimum and maximum:
+    def statistics(self, band, x = 0, y = 0, w = None, h = None):
+
+        w = self.product.getSceneRasterWidth() - x if w is None else w
+        h = self.product.getSceneRasterHeight() - y if h is None else h
+        count, mean, m2, minimum, maximum = [
+            np.array(array) for array in self.state_windows(band, x, y, w, h)]
+
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            variance = np.where(count > 1, m2 / (count - 1), np.nan)
+
+        return {'count': count,
+                'mean': np.where(count > 0, mean, np.nan),
+                'variance': variance, 'std': np.sqrt(variance),
+                'min': minimum, 'max': maximum}
+
+    def dispose(self):
+        self.product.dispose()
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to index where a scene has data, so the tiled block engine can
+skip the no-data parts of it.
+    Inputs: the source bands of a scene (Sigma0_VH and Sigma0_VV) and their
+    no-data value;
+    Output: the number of valid pixels (valid in every source band: finite
+    and not no-data, and within the AOI polygon, if any) of each block of the
+    scene grid, from which any tile is classified as empty, partial or full.
+
+Terrain-corrected GRD scenes are rotated swaths within a rectangular grid, so
+a large part of each raster is no-data. The engine writes empty tiles as
+no-data without reading them, and computes partial tiles over their valid
+pixels only. The same is done outside an AOI polygon (see aoi_windows.py),
+given as the "region" of the index.
+
+The index is built once per scene and cached next to the product
+("<product>.valid.npz"), keyed by the band files (path, size and modification
+time), as the band statistics.
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+# For storing the band identities in the cache:
+import json
+# Fast arrays computation:
+import numpy as np
+# Tiled block engine (tile reading and tile states), band file identities
+# and the default no-data value:
+from sar_vi_engine import EMPTY, FULL, PARTIAL, iter_tiles, read_tile
+from band_statistics import NODATA, file_identity
+
+#%% DEFAULT PARAMETERS
+
+# Size (lines and columns) of the blocks of the index:
+VALIDITY_BLOCK = 64
+
+#%% DEFINING FUNCTIONS
+
+# Function to get the mask of the pixels valid in every block (finite and,
+# if "nodata" is not None, different from it). "out" and "scratch" are
+# boolean buffers of the block shape, reused between tiles:
+def valid_mask(blocks, nodata = NODATA, out = None, scratch = None):
+
+    if out is None:
+        out = np.empty(blocks[0].shape, dtype = bool)
+    if scratch is None:
+        scratch = np.empty(blocks[0].shape, dtype = bool)
+
+    out[...] = True
+    for block in blocks:
+        np.logical_and(out, np.isfinite(block, out = scratch), out = out)
+        if nodata is not None:
+            np.logical_and(out, np.not_equal(block, nodata, out = scratch),
+                           out = out)
+
+    return out
+
+# The following class is the validity index of a scene: the number of valid
+# pixels of each (block x block) cell of the grid. A "region" (an object with
+# a "rasterize(x, y, tw, th, out)" method, as the AOI masks of aoi_windows.py)
+# restricts the valid pixels to those inside it:
+class ValidityIndex:
+
+    def __init__(self, counts, w, h, block = VALIDITY_BLOCK, nodata = NODATA,
+                 region = None):
+
+        self.counts = np.asarray(counts, dtype = np.int64)
+        self.w, self.h = int(w), int(h)
+        self.block = int(block)
+        self.nodata = nodata
+        self.region = region
+
+        # Number of pixels of each cell (smaller at the right and bottom
+        # edges):
+        rows = np.minimum(self.block, self.h - self.block *
+                          np.arange(self.counts.shape[0]))
+        cols = np.minimum(self.block, self.w - self.block *
+                          np.arange(self.counts.shape[1]))
+        self.sizes = rows[:, None] * cols[None, :]
+
+    # Function to classify a tile: EMPTY (no valid pixel in the cells it
+    # overlaps), FULL (every pixel of these cells is valid) or PARTIAL:
+    def state(self, x, y, tw, th):
+
+        b = self.block
+        cells = (slice(y // b, (y + th - 1) // b + 1),
+                 slice(x // b, (x + tw - 1) // b + 1))
+        counts = self.counts[cells]
+
+        if not counts.any():
+            return EMPTY
+        if np.array_equal(counts, self.sizes[cells]):
+            return FULL
+        return PARTIAL
+
+    # Function to get the mask of the valid pixels of a tile at x, y (see
+    # "valid_mask"):
+    def mask(self, blocks, out = None, scratch = None, x = 0, y = 0):
+
+        out = valid_mask(blocks, self.nodata, out, scratch)
+        if self.region is not None:
+            th, tw = out.shape
+            np.logical_and(out, self.region.rasterize(x, y, tw, th, scratch),
+                           out = out)
+
+        return out
+
+    # Function to get the fraction of valid pixels of the scene:
+    def valid_fraction(self):
+        return float(self.counts.sum()) / (self.w * self.h)
+
+    # Function to summarize the work skipped over a list of tiles: number of
+    # empty, partial and full tiles, and fraction of pixels not computed
+    # (empty tiles and the invalid pixels of partial tiles):
+    def summary(self, tiles):
+
+        states = [self.state(*tile) for tile in tiles]
+
+        return {'tiles': len(states),
+                'empty': states.count(EMPTY),
+                'partial': states.count(PARTIAL),
+                'full': states.count(FULL),
+                'skipped_fraction': 1.0 - self.valid_fraction()}
+
+# Function to build the validity index of a scene, reading the source bands
+# in strips of "block" lines (one strip buffer per band):
+def build_validity_index(sources, w, h, nodata = NODATA,
+                         block = VALIDITY_BLOCK, region = None):
+
+    rows, cols = -(-h // block), -(-w // block)
+    counts = np.zeros((rows, cols), dtype = np.int64)
+    buffers = [None for _ in sources]
+
+    for x, y, tw, th in iter_tiles(w, h, block, None):
+
+        if buffers[0] is None:
+            buffers = [np.empty(tw * th, dtype = np.float32) for _ in sources]
+        blocks = [read_tile(band, x, y, tw, th, buffer)
+                  for band, buffer in zip(sources, buffers)]
+        mask = valid_mask(blocks, nodata)
+        if region is not None:
+            mask &= region.rasterize(x, y, tw, th)
+
+        # Valid pixels of each cell of the strip (columns padded to a
+        # multiple of the block):
+        per_column = np.count_nonzero(mask, axis = 0)
+        padded = np.zeros(cols * block, dtype = np.int64)
+        padded[:tw] = per_column
+        counts[y // block] = padded.reshape(cols, block).sum(axis = 1)
+
+    return ValidityIndex(counts, w, h, block, nodata, region)
+
+#%% VALIDITY INDEX CACHE
+
+# Function to get the sidecar cache file of a product ("scene.dim" ->
+# "scene.valid.npz"):
+def validity_cache_path(product_path):
+    return os.path.splitext(str(product_path))[0] + '.valid.npz'
+
+# Function to get the validity index of a scene: from the cache next to the
+# product when its band files have not changed (and the block size and
+# no-data value are the same), or by building it otherwise. Without a product
+# path, or with a region (AOI windows are built quickly), it just builds it:
+def get_validity_index(sources, w, h, product_path = None,
+                       band_names = ('Sigma0_VH', 'Sigma0_VV'),
+                       nodata = NODATA, block = VALIDITY_BLOCK,
+                       region = None):
+
+    if product_path is None or region is not None:
+        return build_validity_index(sources, w, h, nodata, block, region)
+
+    key = json.dumps({'bands': [file_identity(product_path, band_name)
+                                for band_name in band_names],
+                      'nodata': nodata, 'block': block,
+                      'size': [w, h]}, sort_keys = True)
+    path = validity_cache_path(product_path)
+
+    try:
+        with np.load(path) as cache:
+            if str(cache['key']) == key:
+                return ValidityIndex(cache['counts'], w, h, block, nodata)
+    except (OSError, KeyError, ValueError):
+        pass
+
+    index = build_validity_index(sources, w, h, nodata, block)
+
+    # Written to a temporary file first, so a crash never leaves a broken
+    # cache:
+    temporary = path + '.%d.tmp.npz' % os.getpid()
+    np.savez_compressed(temporary, key = key, counts = index.counts)
+    os.replace(temporary, path)
+
+    return index
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+
+Code written to cache the pixel windows of Areas of Interest (AOIs) and their
+rasterized masks, so the scenes sharing a grid do not put the AOIs on it again.
+    Inputs: a product (snappy or dimap_io) and the AOI polygons (see
+    "read_aoi" in aoi_windows.py);
+    Outputs: the pixel window (x, y, w, h) of the AOI on the grid of the
+    product and the mask of its polygons over the window, from the cache
+    directory ("<key>.npz" files) when already computed for that grid.
+
+An entry is keyed by the grid (map CRS, image-to-map transform and raster
+size, see "grid_key" in aoi_windows.py), the hash of the AOI polygons and the
+window margin. The terrain-corrected scenes of Script 03 share the projection
+and pixel size, so scenes of the same footprint (e.g. the repeat passes of a
+relative orbit) hit the same entries and SNAP (or pyproj) is never called for
+them. Products without a map geocoding are not cached.
+
+The directory is a least recently used (LRU) cache: reading an entry touches
+its file, and the entries least recently used are deleted when the directory
+holds more than "max_entries" entries or "max_mb" MB.
+
+Created on Sun Oct 18, 2026
+Last updated on: Sun Oct 18, 2026
+
+This code is part of the Erli's Ph.D. thesis
+
+Author: Erli Pinto dos Santos
+Contact-me on: erlipinto@gmail.com or erli.santos@ufv.br
+
+"""
+
+#%% REQUESTED MODULES
+
+# For dealing with directories and files:
+import os
+# For the cache keys:
+import json
+import hashlib
+# Fast arrays computation:
+import numpy as np
+# Area of Interest windows and masks:
+from aoi_windows import aoi_hash, grid_key, pixel_polygons, window_and_mask
+
+#%% DEFAULT PARAMETERS
+
+# Entries and size (MB) of the cache directory before the least recently used
+# entries are deleted:
+MAX_ENTRIES = 4096
+MAX_MB = 512
+
+#%% DEFINING FUNCTIONS
+
+# Function to get the key of a window: the hash of the grid key, of the AOI
+# polygons and of the margin:
+def window_key(grid, polygons, margin = 0):
+    text = json.dumps([grid, aoi_hash(polygons), margin])
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+# The following class is a rasterized AOI mask (boolean, h x w, on the window
+# grid), with the "rasterize" method of "AoiMask", so both are the "region"
+# of a validity index (see tile_validity.py):
+class RasterMask:
+
+    def __init__(self, array):
+        self.array = np.asarray(array, dtype = bool)
+
+    def rasterize(self, x, y, tw, th, out = None):
+        if out is None:
+            return np.array(self.array[y:y + th, x:x + tw])
+        out[...] = self.array[y:y + th, x:x + tw]
+        return out
+
+# The following class is the cache directory of the AOI windows (see the
+# module notes):
+class WindowCache:
+
+    def __init__(self, directory, max_entries = MAX_ENTRIES, max_mb = MAX_MB):
+
+        self.directory = os.path.abspath(str(directory))
+        self.max_entries = max_entries
+        self.max_mb = max_mb
+        self.hits = self.misses = 0
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, exist_ok = True)
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    # Function to read an entry (None when missing or broken), touching its
+    # file as the most recently used:
+    def load(self, key):
+
+        path = self.entry_path(key)
+        try:
+            with np.load(path) as entry:
+                window = tuple(int(k) for k in entry['window'])
+                shape = tuple(int(k) for k in entry['shape'])
+                bits = entry['mask']
+        except (OSError, KeyError, ValueError):
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        if not window:
+            return None, None
+        mask = np.unpackbits(bits, count = shape[0] * shape[1])
+        return window, RasterMask(mask.reshape(shape).astype(bool))
+
+    # Function to write an entry (to a temporary file first, so a crash never
+    # leaves a broken entry), then to evict the least recently used ones:
+    def store(self, key, window, mask):
+
+        shape = (0, 0) if window is None else mask.array.shape
+        bits = np.packbits(np.zeros(0, dtype = bool) if window is None
+                           else mask.array)
+
+        temporary = self.entry_path(key) + '.%d.tmp.npz' % os.getpid()
+        np.savez(temporary, window = np.array(window or (), dtype = np.int64),
+                 shape = np.array(shape, dtype = np.int64), mask = bits)
+        os.replace(temporary, self.entry_path(key))
+
+        self.evict()
+
+    # Function to delete the least recently used entries beyond the limits:
+    def evict(self):
+
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz') or '.tmp' in name:
+                continue
+            try:
+                status = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((status.st_mtime, status.st_size, name))
+
+        entries.sort(reverse = True)
+        count = size = 0
+        for _, entry_size, name in entries:
+            count += 1
+            size += entry_size
+            if count > self.max_entries or size > self.max_mb * 1024 ** 2:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    # Function to get the window of AOI polygons (WGS84) on the grid of a
+    # product and their mask (a RasterMask), as "aoi_window": from the cache,
+    # or put on the grid and cached. It returns None, None when the AOI is
+    # out of the scene:
+    def window(self, product, polygons, margin = 0):
+
+        w = product.getSceneRasterWidth()
+        h = product.getSceneRasterHeight()
+
+        grid = grid_key(product)
+        if grid is None:
+            return window_and_mask(pixel_polygons(product, polygons), w, h,
+                                   margin)
+
+        key = window_key(grid, polygons, margin)
+        entry = self.load(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        window, mask = window_and_mask(pixel_polygons(product, polygons),
+                                       w, h, margin)
+        if window is not None:
+            mask = RasterMask(mask.rasterize(0, 0, window[2], window[3]))
+        self.store(key, window, mask)
+
+        return window, mask